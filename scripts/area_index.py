@@ -0,0 +1,216 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import unicodedata
+from artifact_cache import CACHE_DIR, disk_cached, file_digest, versioned_lru_cache
+from dataset_store import find_period_files
+
+# --- Índex canònic de barris i districtes de Barcelona ---
+# Els identificadors són els codis oficials (Codi_Barri 1..73, Codi_Districte 1..10)
+# del fitxer de població, que és la font amb els 73 barris complets.
+DIR_AREES = "dataset/Datasets Barcelona"
+# Un fitxer de població per any; és el conjunt 'poblacio' del magatzem de períodes
+PATRO_POBLACIO = r'^Densitat Poblacio Barcelona (?P<any>\d{4})\.xlsx$'
+
+
+def _fitxer_arees():
+    """
+    (any, ruta) del fitxer de població més recent, el mateix que analitza la pestanya de
+    cobertura: l'índex i la població no poden venir d'anys diferents. Es resol en arrencar.
+    """
+    fitxers = find_period_files(DIR_AREES, PATRO_POBLACIO)
+    if not fitxers:
+        return None, os.path.join(DIR_AREES, "Densitat Poblacio Barcelona 2021.xlsx")
+    return max(fitxers), fitxers[max(fitxers)]
+
+
+ANY_AREES, FILE_AREES = _fitxer_arees()
+
+# Seqüències mal codificades que la reparació genèrica no resol
+MOJIBAKE = {
+    'íç': 'ç',
+}
+
+# Àlies curats (ja normalitzats) -> nom canònic normalitzat
+ALIES_BARRIS = {
+    'poblesec': 'el poble sec',
+    'la marina del prat vermell aei zona franca': 'la marina del prat vermell',
+    'el putxet': 'el putxet i el farro',
+    'vila olimpica': 'la vila olimpica del poblenou',
+    'el camp de l arpa': 'el camp de l arpa del clot',
+}
+ALIES_DISTRICTES = {
+    'sants': 'sants montjuic',
+    'sarria': 'sarria sant gervasi',
+    'horta': 'horta guinardo',
+}
+
+logger = logging.getLogger(__name__)
+
+# Noms que no s'han pogut assignar: un registre per font, nivell i contingut del fitxer
+# (i de l'índex). Es desa al costat de la caché de disc perquè, quan un resultat es
+# llegeix de la caché i assign_area_ids no s'executa, l'avís continuï disponible.
+DIR_NO_TROBADES = os.path.join(CACHE_DIR, "arees_no_trobades")
+
+
+def _repara_mojibake(nom):
+    """
+    Repara text UTF-8 llegit com a Latin-1 on el primer byte (0xC3) ha quedat com a 'í' o 'à'
+    (p. ex. 'Famí\\xadlia' -> 'Família', 'Grí\\xa0cia' -> 'Gràcia', 'Congrí©s' -> 'Congrés').
+    """
+    nom = re.sub(r'[íà]([\x80-\xbf])', lambda m: chr(0xC0 | (ord(m.group(1)) & 0x3F)), nom)
+    for dolent, bo in MOJIBAKE.items():
+        nom = nom.replace(dolent, bo)
+    return nom
+
+
+def clean_area_name(nom):
+    """Nom llegible: repara la codificació i treu guions tous i espais no separables."""
+    if pd.isna(nom):
+        return nom
+    nom = _repara_mojibake(str(nom)).replace('\xad', '').replace('\xa0', ' ')
+    nom = re.sub(r'\s+-(?=\S)', '-', nom)
+    return re.sub(r'\s+', ' ', nom).strip()
+
+
+def normalize_area_name(nom):
+    """
+    Clau de comparació d'un nom d'àrea: sense accents, guions, apòstrofs ni majúscules.
+    'Sarrià\\xa0-Sant Gervasi' i 'Sarrià-Sant Gervasi' donen 'sarria sant gervasi'.
+    """
+    if pd.isna(nom):
+        return None
+    nom = unicodedata.normalize('NFKD', clean_area_name(nom))
+    nom = ''.join(c for c in nom if not unicodedata.combining(c))
+    nom = re.sub(r"[-'’,.]", ' ', nom.lower())
+    return re.sub(r'\s+', ' ', nom).strip()
+
+
+@versioned_lru_cache(FILE_AREES)
+@disk_cached(FILE_AREES)
+def load_area_index():
+    """
+    Construeix l'índex canònic una sola vegada.
+
+    Retorna un diccionari amb:
+      - 'barris': DataFrame indexat per ID_Barri amb ID_Districte, Nom_Barri i Nom_Districte nets
+      - 'districtes': Series ID_Districte -> Nom_Districte
+      - 'barri_per_nom' / 'districte_per_nom': clau normalitzada -> ID
+    """
+    # L'únic full té el nom del fitxer truncat a 31 caràcters
+    df = pd.read_excel(FILE_AREES, sheet_name=0)
+    barris = pd.DataFrame({
+        'ID_Barri': df['Codi_Barri'].astype(np.int16),
+        'ID_Districte': df['Codi_Districte'].astype(np.int16),
+        'Nom_Barri': df['Nom_Barri'].map(clean_area_name),
+        'Nom_Districte': df['Nom_Districte'].map(clean_area_name),
+    }).set_index('ID_Barri')
+
+    districtes = barris.groupby('ID_Districte')['Nom_Districte'].first()
+
+    barri_per_nom = {normalize_area_name(nom): id_ for id_, nom in barris['Nom_Barri'].items()}
+    districte_per_nom = {normalize_area_name(nom): id_ for id_, nom in districtes.items()}
+    for alies, canonic in ALIES_BARRIS.items():
+        if canonic in barri_per_nom:
+            barri_per_nom.setdefault(alies, barri_per_nom[canonic])
+    for alies, canonic in ALIES_DISTRICTES.items():
+        if canonic in districte_per_nom:
+            districte_per_nom.setdefault(alies, districte_per_nom[canonic])
+
+    return {
+        'barris': barris,
+        'districtes': districtes,
+        'barri_per_nom': barri_per_nom,
+        'districte_per_nom': districte_per_nom,
+    }
+
+
+def area_id(nom, nivell='barri'):
+    """ID d'un únic nom de barri o districte, o None si no es troba."""
+    index = load_area_index()
+    return index[f'{nivell}_per_nom'].get(normalize_area_name(nom))
+
+
+def assign_area_ids(noms, codis=None, nivell='barri', font=None):
+    """
+    Assigna l'ID enter d'àrea a cada fila.
+
+    Parameters:
+    -----------
+    noms : pd.Series
+        Noms de barri o districte tal com venen al fitxer.
+    codis : pd.Series, optional
+        Codis oficials del fitxer (si n'hi ha). Tenen prioritat sobre el nom.
+    nivell : str
+        'barri' o 'districte'.
+    font : str, optional
+        Nom de la font. Els noms que no s'han pogut assignar queden registrats per a
+        aquesta font (vegeu report_unmatched_areas) i s'escriuen al log.
+
+    Returns:
+    --------
+    pd.Series d'enters (Int16, nul·lable) alineada amb 'noms'.
+    """
+    index = load_area_index()
+    per_nom = index[f'{nivell}_per_nom']
+    valids = index['barris'].index if nivell == 'barri' else index['districtes'].index
+
+    # Només es normalitza cada nom diferent una vegada
+    unics = pd.Series(noms.dropna().unique())
+    mapa = dict(zip(unics, unics.map(lambda nom: per_nom.get(normalize_area_name(nom)))))
+    ids = noms.map(mapa).astype('Int16')
+
+    if codis is not None:
+        codis = pd.to_numeric(codis, errors='coerce').astype('Int16')
+        codis = codis.where(codis.isin(valids))
+        ids = codis.fillna(ids)
+
+    no_trobats = sorted(set(noms[ids.isna() & noms.notna()].unique()))
+    if font is not None:
+        _desa_no_trobats(font, nivell, no_trobats)
+    if no_trobats:
+        logger.warning("%d noms de %s sense assignar a '%s': %s", len(no_trobats), nivell, font or nivell, no_trobats)
+
+    return ids
+
+
+def _registre_no_trobats(font, nivell):
+    clau = f"{font}|{nivell}|{file_digest(font)}|{file_digest(FILE_AREES)}"
+    return os.path.join(DIR_NO_TROBADES, hashlib.sha256(clau.encode()).hexdigest() + ".json")
+
+
+def _desa_no_trobats(font, nivell, noms):
+    """Substitueix (no acumula) el registre d'aquesta versió de la font i nivell."""
+    os.makedirs(DIR_NO_TROBADES, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=DIR_NO_TROBADES, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'font': font, 'nivell': nivell, 'noms': list(noms)}, f, ensure_ascii=False)
+    os.replace(tmp, _registre_no_trobats(font, nivell))
+
+
+def unmatched_areas(font, nivell='barri'):
+    """
+    Noms de la versió actual del fitxer 'font' que no s'han pogut assignar, o None si la
+    font encara no s'ha processat.
+    """
+    try:
+        with open(_registre_no_trobats(font, nivell), encoding='utf-8') as f:
+            return json.load(f)['noms']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def report_unmatched_areas(*fonts):
+    """Resum en text dels noms sense assignar de les fonts indicades, font per font."""
+    parts = []
+    for font in fonts:
+        for nivell in ('barri', 'districte'):
+            noms = unmatched_areas(font, nivell)
+            if noms:
+                parts.append(f"Noms de {nivell} sense assignar a '{os.path.basename(font)}': {', '.join(noms)}.")
+    return " ".join(parts)
@@ -0,0 +1,317 @@
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from concurrency import dataset_version
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Caché d'artefactes a disc, compartida entre processos ---
+# Tots els workers del mode multi-procés apunten al mateix directori. Cada entrada es
+# guarda sota el hash del contingut dels fitxers d'entrada + funció + arguments.
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR", ".dashboard_cache")
+CACHE_ENABLED = os.environ.get("DASHBOARD_DISK_CACHE", "1") != "0"
+
+# Fitxers retornats pels handlers que es copien dins de l'entrada de caché
+ARTEFACT_EXTS = ('.png', '.html', '.csv')
+
+# Fitxers de vida curta dels handlers (PNG, mapes HTML) abans que Gradio els copiï a la
+# seva caché. Cada fitxer té un nom únic i s'esborra quan supera SCRATCH_MAX_AGE segons.
+SCRATCH_DIR = os.path.join(CACHE_DIR, "tmp")
+SCRATCH_MAX_AGE = int(os.environ.get("DASHBOARD_SCRATCH_MAX_AGE", "3600"))
+
+# Les entrades de disk_cached van per versió de les dades: cada actualització o canvi de
+# mode dels gràfics en deixa de noves. Les que fa més de CACHE_MAX_AGE segons que no
+# es fan servir, o les més antigues si el total supera CACHE_MAX_BYTES, s'esborren.
+CACHE_MAX_AGE = int(os.environ.get("DASHBOARD_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(float(os.environ.get("DASHBOARD_CACHE_MAX_MB", "2048")) * 1024 ** 2)
+
+# Digest del contingut per (ruta, mtime, mida): cada fitxer només es llegeix un cop
+_DIGESTS = {}
+
+
+def file_digest(path):
+    """SHA-256 del contingut d'un fitxer (o 'missing' si no existeix)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 'missing'
+    clau = (path, st.st_mtime_ns, st.st_size)
+    if clau not in _DIGESTS:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for bloc in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloc)
+        _DIGESTS[clau] = h.hexdigest()
+    return _DIGESTS[clau]
+
+
+def artifact_key(namespace, args, kwargs, paths):
+    """Clau adreçada per contingut d'un artefacte."""
+    h = hashlib.sha256()
+    h.update(namespace.encode())
+    h.update(repr(args).encode())
+    h.update(repr(sorted(kwargs.items())).encode())
+    for path in paths:
+        h.update(file_digest(path).encode())
+    return h.hexdigest()
+
+
+def _evict(elements, max_age, max_bytes, remove):
+    """
+    Esborra amb 'remove' els elements (mtime, mida, ruta) anteriors a 'max_age' segons i,
+    si el total encara supera 'max_bytes', els més antics fins a quedar-hi per sota.
+    """
+    elements.sort()
+    limit = time.time() - max_age if max_age is not None else None
+    total = sum(mida for _, mida, _ in elements)
+    for mtime, mida, path in elements:
+        antic = limit is not None and mtime < limit
+        if not antic and (max_bytes is None or total <= max_bytes):
+            continue
+        try:
+            remove(path)
+            total -= mida
+        except OSError:
+            # Un altre procés l'ha esborrat o encara l'està escrivint
+            pass
+
+
+def evict_files(directory, max_age=None, max_bytes=None, skip=()):
+    """
+    Esborra els fitxers de 'directory' modificats fa més de 'max_age' segons i, si el total
+    encara supera 'max_bytes', els més antics fins a quedar-hi per sota. Els fitxers que
+    acaben amb algun sufix de 'skip' (p. ex. els '.lock') no es toquen.
+    """
+    fitxers = []
+    try:
+        entrades = list(os.scandir(directory))
+    except OSError:
+        return
+    for entrada in entrades:
+        try:
+            if entrada.is_file() and not entrada.name.endswith(tuple(skip)):
+                st = entrada.stat()
+                fitxers.append((st.st_mtime, st.st_size, entrada.path))
+        except OSError:
+            pass
+    _evict(fitxers, max_age, max_bytes, os.remove)
+
+
+def _entry_groups():
+    """Subdirectoris de CACHE_DIR amb entrades de disk_cached (els 2 primers caràcters de la clau)."""
+    try:
+        entrades = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return []
+    return [e.path for e in entrades
+            if len(e.name) == 2 and all(c in '0123456789abcdef' for c in e.name) and e.is_dir()]
+
+
+def _remove_entry(entry_dir):
+    shutil.rmtree(entry_dir)
+    try:
+        os.remove(entry_dir + '.lock')
+    except OSError:
+        pass
+
+
+def evict_entries(max_age=None, max_bytes=None, keep=()):
+    """
+    Esborra les entrades de disk_cached (directori i '.lock') que fa més de 'max_age'
+    segons que no es llegeixen i, si el total encara supera 'max_bytes', les més antigues.
+    L'últim ús és el mtime de 'result.pkl', que _load actualitza a cada lectura. Les
+    entrades de 'keep' (la que s'acaba de desar) no es toquen, i tampoc els '.lock' dels
+    càlculs en curs, que encara no tenen directori.
+    """
+    entrades = []
+    orfes = []
+    for grup in _entry_groups():
+        try:
+            fills = list(os.scandir(grup))
+        except OSError:
+            continue
+        for fill in fills:
+            try:
+                if fill.is_dir():
+                    if fill.path in keep:
+                        continue
+                    fitxers = [f.stat() for f in os.scandir(fill.path) if f.is_file()]
+                    pkl = os.path.join(fill.path, 'result.pkl')
+                    mtime = os.stat(pkl).st_mtime if os.path.exists(pkl) else fill.stat().st_mtime
+                    entrades.append((mtime, sum(f.st_size for f in fitxers), fill.path))
+                elif fill.name.endswith('.lock') and not os.path.isdir(fill.path[:-len('.lock')]):
+                    # Bloquejos de resultats que no es van desar (errors)
+                    orfes.append((fill.stat().st_mtime, 0, fill.path))
+            except OSError:
+                pass
+    _evict(entrades, max_age, max_bytes, _remove_entry)
+    _evict(orfes, max_age, None, os.remove)
+
+
+def scratch_file(prefix, suffix):
+    """
+    Ruta única dins SCRATCH_DIR per a un fitxer generat per una petició. Abans de crear-la
+    s'esborren els fitxers que ja han superat SCRATCH_MAX_AGE, així el directori no creix
+    sense límit amb la concurrència.
+    """
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    evict_files(SCRATCH_DIR, SCRATCH_MAX_AGE)
+    fd, path = tempfile.mkstemp(dir=SCRATCH_DIR, prefix=prefix, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+@contextmanager
+def file_lock(path):
+    """Bloqueig exclusiu entre processos sobre un fitxer '.lock'."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def is_cacheable(result):
+    """
+    Els handlers retornen els errors com a valors (None, missatge 'Error...', {}),
+    i aquests no s'han de desar.
+    """
+    valors = result if isinstance(result, tuple) else (result,)
+    for valor in valors:
+        if valor is None:
+            return False
+        if isinstance(valor, dict) and not valor:
+            return False
+        if isinstance(valor, str) and valor.lstrip('*').startswith('Error'):
+            return False
+    return True
+
+
+def _store(entry_dir, result):
+    """Copia els fitxers retornats dins l'entrada i desa el resultat de forma atòmica."""
+    os.makedirs(entry_dir, exist_ok=True)
+    valors = list(result) if isinstance(result, tuple) else [result]
+    for i, valor in enumerate(valors):
+        if isinstance(valor, str) and valor.endswith(ARTEFACT_EXTS) and os.path.isfile(valor):
+            desti = os.path.join(entry_dir, f"{i}{os.path.splitext(valor)[1]}")
+            shutil.copyfile(valor, desti)
+            valors[i] = desti
+    result = tuple(valors) if isinstance(result, tuple) else valors[0]
+
+    fd, tmp = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, os.path.join(entry_dir, 'result.pkl'))
+    return result
+
+
+def _load(entry_dir):
+    path = os.path.join(entry_dir, 'result.pkl')
+    try:
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        # Es marca com a usada perquè evict_entries comença per les més antigues
+        os.utime(path)
+        return result
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def disk_cached(*paths, should_cache=is_cacheable, version=None):
+    """
+    Decorador: desa el resultat de la funció a CACHE_DIR, compartit entre processos.
+
+    Només un procés calcula cada artefacte: la resta esperen el bloqueig del fitxer i
+    llegeixen el resultat ja desat. Les rutes de fitxers (.png, .html, .csv) del resultat
+    es copien a la caché i es retornen apuntant a la còpia. Cada entrada nova esborra les
+    que superen CACHE_MAX_AGE o CACHE_MAX_BYTES (evict_entries).
+
+    Parameters:
+    -----------
+    *paths : str
+        Fitxers de dades dels quals depèn el resultat (el seu contingut forma part de la clau).
+    should_cache : callable, optional
+        Decideix si un resultat es desa (per defecte, no es desen els errors).
+    version : str, optional
+        Variant del format del resultat (p. ex. el mode dels gràfics); forma part de la clau.
+
+    La clau només és correcta si el resultat depèn exclusivament dels arguments i del
+    contingut de 'paths'. Cap funció cridada per dins pot guardar resultats per a tota la
+    vida del procés (un lru_cache sense versió): si el fitxer canvia, retornaria dades
+    antigues i aquí es desarien sota la clau del contingut nou. Les càrregues internes
+    han de fer servir versioned_lru_cache amb els seus fitxers o rebre la versió com a
+    argument.
+    """
+    def decorator(fn):
+        namespace = f"{fn.__module__}.{fn.__qualname__}"
+        if version is not None:
+            namespace += f"@{version}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return fn(*args, **kwargs)
+
+            key = artifact_key(namespace, args, kwargs, paths)
+            entry_dir = os.path.join(CACHE_DIR, key[:2], key)
+            result = _load(entry_dir)
+            if result is not None:
+                return result
+
+            with file_lock(entry_dir + '.lock'):
+                # Un altre procés pot haver acabat el càlcul mentre esperàvem
+                result = _load(entry_dir)
+                if result is not None:
+                    return result
+                result = fn(*args, **kwargs)
+                if should_cache is None or should_cache(result):
+                    result = _store(entry_dir, result)
+                    evict_entries(CACHE_MAX_AGE, CACHE_MAX_BYTES, keep=(entry_dir,))
+                return result
+
+        return wrapper
+    return decorator
+
+
+def versioned_lru_cache(*paths, maxsize=1):
+    """
+    Decorador: lru_cache en memòria del procés amb la versió dels fitxers 'paths'
+    (dataset_version) com a part de la clau. Quan un fitxer canvia, la crida següent
+    torna a calcular el resultat en lloc de retornar el de la versió anterior.
+
+    Es combina amb disk_cached (a sota) perquè els altres processos no hagin de
+    recalcular-lo.
+    """
+    def decorator(fn):
+        @functools.lru_cache(maxsize=maxsize)
+        def cached(versio, *args, **kwargs):
+            return fn(*args, **kwargs)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return cached(dataset_version(*paths), *args, **kwargs)
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+    return decorator
@@ -0,0 +1,352 @@
+import gradio as gr
+import pandas as pd
+import numpy as np
+import os
+import time
+
+import geopandas as gpd
+
+from area_index import FILE_AREES, load_area_index
+from cobertura_dashboard import FILE_POBLACIO, load_poblacio_barris, coverage_kpis, coverage_report
+from concurrency import coalesced, MAX_WORKERS
+from charts import CHART_MODE, CHART_LOCK, bar_plot
+from artifact_cache import disk_cached, versioned_lru_cache, CACHE_DIR
+from paged_table import register_table_source, table_ref, paged_table
+from export_service import export_panel
+
+# --- 1. Definir noms de fitxers ---
+FILE_PARADES_BUS = "dataset/Datasets Barcelona/Parades Bus Barcelona.xlsx"
+FILE_ESTACIONS_BUS = "dataset/Datasets Barcelona/Estacions Bus Barcelona.xlsx"
+# Límits oficials dels barris (opcional; no es distribueix amb les dades). Si hi és, cada
+# parada s'assigna pel polígon que la conté. Qualsevol format que llegeixi geopandas amb
+# una columna 'codi_barri' (p. ex. el GeoJSON d'Open Data BCN).
+FILE_BARRIS_GEO = "dataset/Datasets Barcelona/Barris Barcelona.geojson"
+
+# Totes les coordenades del dataset són UTM 31N ETRS89
+CRS = "EPSG:25831"
+# Amb els polígons oficials: les parades fora de tots els polígons (a tocar de la costa o
+# del límit municipal) s'assignen al barri més proper si és a menys d'aquesta distància (m)
+MAX_DISTANCIA_BARRI = 250
+# Sense polígons: una parada de 'Parades Bus' (sense barri) pren l'etiqueta de l'estació
+# de l'Estacions Bus que és al mateix lloc, a menys d'aquesta distància (m)
+MAX_DISTANCIA_ETIQUETA = 10
+
+FONTS_PARADES = ["Parades Bus", "Estacions Bus"]
+
+# Fitxers dels quals depèn cada nivell de càlcul (claus de les caché en memòria i a disc)
+FITXERS_GEO = (FILE_BARRIS_GEO, FILE_AREES)
+FITXERS_PARADES = (FILE_PARADES_BUS, FILE_ESTACIONS_BUS) + FITXERS_GEO
+FITXERS_BUS = (FILE_POBLACIO,) + FITXERS_PARADES
+
+
+# --- 2. Geometria dels barris ---
+@versioned_lru_cache(*FITXERS_GEO)
+@disk_cached(*FITXERS_GEO)
+def load_barris_geo():
+    """
+    GeoDataFrame amb el polígon oficial de cada barri (indexat per ID_Barri), o None si
+    FILE_BARRIS_GEO no hi és.
+    """
+    if not os.path.exists(FILE_BARRIS_GEO):
+        return None
+    barris = gpd.read_file(FILE_BARRIS_GEO).to_crs(CRS)
+    barris.columns = [c.lower() for c in barris.columns]
+    barris = gpd.GeoDataFrame(geometry=barris.geometry.values,
+                              index=barris['codi_barri'].astype('int16'), crs=CRS)
+    barris.index.name = 'ID_Barri'
+    return barris
+
+
+# --- 3. Parades i assignació de barri ---
+def _a_float(col):
+    # 'UTM X' / 'UTM Y' venen com a text amb coma decimal ("433034,9710")
+    return pd.to_numeric(col.str.replace(',', '.', regex=False), errors='coerce')
+
+
+def load_parades_bus():
+    """Parades del municipi de Barcelona com a GeoDataFrame (una fila per parada)."""
+    df = pd.read_excel(FILE_PARADES_BUS, sheet_name='Tabla1', dtype=str)
+    df = df[df['Municipio / Municipi'].str.strip() == 'Barcelona']
+    linies = df['Líneas / Línies'].fillna('').str.split(r'\s*-\s*')
+    parades = pd.DataFrame({
+        'Codi_Parada': df['Código de parada / Codi de parada'].str.strip(),
+        'Parada': df['Nombre / Nom'].str.strip(),
+        'Linies': linies.map(lambda ls: [l for l in ls if l]),
+        'X': _a_float(df['UTM X']),
+        'Y': _a_float(df['UTM Y']),
+    }).dropna(subset=['X', 'Y'])
+    return gpd.GeoDataFrame(parades.drop(columns=['X', 'Y']),
+                            geometry=gpd.points_from_xy(parades['X'], parades['Y']), crs=CRS)
+
+
+def load_estacions_bus():
+    """
+    Estacions de bus com a GeoDataFrame. El fitxer repeteix la parada per cada capa
+    (diürn, nocturn...), així que s'ajunten per coordenades. Cada estació porta el codi de
+    barri del fitxer ('BARRI_Etiquetat').
+    """
+    df = pd.read_excel(FILE_ESTACIONS_BUS)
+    df['Linies'] = df['EQUIPAMENT'].str.replace('BUS', '', regex=False).str.split('-').map(
+        lambda ls: [l.strip() for l in ls if l.strip()])
+    estacions = df.groupby(['ETRS89_COORD_X', 'ETRS89_COORD_Y'], sort=False).agg(
+        Parada=('EQUIPAMENT', 'first'),
+        Linies=('Linies', lambda s: sorted(set().union(*s))),
+        BARRI_Etiquetat=('BARRI', 'first'),
+    ).reset_index()
+    estacions['BARRI_Etiquetat'] = estacions['BARRI_Etiquetat'].astype('Int16')
+    return gpd.GeoDataFrame(estacions.drop(columns=['ETRS89_COORD_X', 'ETRS89_COORD_Y']),
+                            geometry=gpd.points_from_xy(estacions['ETRS89_COORD_X'], estacions['ETRS89_COORD_Y']),
+                            crs=CRS)
+
+
+def assign_barris(punts, barris):
+    """
+    Assigna cada punt al barri que el conté amb l'índex STRtree dels polígons
+    (point-in-polygon vectoritzat). Els punts que no cauen dins de cap polígon
+    van al barri més proper, fins a MAX_DISTANCIA_BARRI.
+
+    Retorna (Series Int16 amb l'ID_Barri alineada amb 'punts', nombre de punts per proximitat).
+    """
+    ids = np.full(len(punts), -1, dtype='int32')
+    idx_punts, idx_barris = barris.sindex.query(punts.geometry, predicate='within')
+    ids[idx_punts] = barris.index.to_numpy()[idx_barris]
+
+    fora = np.flatnonzero(ids < 0)
+    per_proximitat = 0
+    if len(fora):
+        idx_fora, idx_barris = barris.sindex.nearest(punts.geometry.iloc[fora], max_distance=MAX_DISTANCIA_BARRI,
+                                                     return_all=False)
+        ids[fora[idx_fora]] = barris.index.to_numpy()[idx_barris]
+        per_proximitat = len(idx_fora)
+    return pd.Series(ids, index=punts.index, dtype='Int16').mask(ids < 0), per_proximitat
+
+
+def assign_barris_coincidents(punts, etiquetats, max_distance=MAX_DISTANCIA_ETIQUETA):
+    """
+    Assigna a cada punt el 'BARRI_Etiquetat' del punt de 'etiquetats' que és al mateix lloc
+    (el més proper, a menys de 'max_distance' metres, amb l'índex STRtree). Els punts sense
+    cap punt etiquetat a prop queden sense barri: no s'endevina el barri per proximitat.
+
+    Retorna una Series Int16 amb l'ID_Barri alineada amb 'punts'.
+    """
+    ids = pd.Series(pd.NA, index=punts.index, dtype='Int16')
+    idx_punts, idx_etiquetats = etiquetats.sindex.nearest(punts.geometry, max_distance=max_distance,
+                                                          return_all=False)
+    ids.iloc[idx_punts] = etiquetats['BARRI_Etiquetat'].to_numpy()[idx_etiquetats]
+    return ids
+
+
+@versioned_lru_cache(*FITXERS_PARADES)
+@disk_cached(*FITXERS_PARADES)
+def load_bus_store():
+    """
+    Carrega les dues fonts de parades i n'assigna el barri i el districte una sola vegada:
+    amb els polígons oficials (si n'hi ha), pel join espacial; si no, amb l'etiqueta de
+    barri de l'Estacions Bus (directament o de l'estació al mateix lloc). Desa les
+    estadístiques (mètode, temps, parades sense barri i coincidència amb les etiquetes).
+    """
+    barris = load_barris_geo()
+    districte_per_barri = load_area_index()['barris']['ID_Districte']
+    estacions = load_estacions_bus()
+    store = {'origen_barris': 'oficial' if barris is not None else 'etiquetes'}
+    for font, carregar in zip(FONTS_PARADES, [load_parades_bus, load_estacions_bus]):
+        parades = carregar()
+        inici = time.perf_counter()
+        per_proximitat = 0
+        if barris is not None:
+            ids, per_proximitat = assign_barris(parades, barris)
+            metode = 'join espacial STRtree amb els polígons oficials'
+        elif 'BARRI_Etiquetat' in parades:
+            ids = parades['BARRI_Etiquetat'].where(parades['BARRI_Etiquetat'].isin(districte_per_barri.index))
+            metode = 'codi de barri del fitxer'
+        else:
+            ids = assign_barris_coincidents(parades, estacions)
+            metode = f"codi de barri de l'estació etiquetada al mateix lloc, a menys de {MAX_DISTANCIA_ETIQUETA} m"
+        segons = time.perf_counter() - inici
+        parades['ID_Barri'] = ids
+        parades['ID_Districte'] = ids.map(districte_per_barri).astype('Int16')
+        estadistiques = {
+            'parades': len(parades),
+            'metode': metode,
+            'segons_join': segons,
+            'per_proximitat': per_proximitat,
+            'sense_barri': int(ids.isna().sum()),
+        }
+        if barris is not None and 'BARRI_Etiquetat' in parades:
+            etiquetats = parades['BARRI_Etiquetat'].notna() & ids.notna()
+            estadistiques['coincidencia'] = float(
+                (parades.loc[etiquetats, 'BARRI_Etiquetat'] == ids[etiquetats]).mean())
+        store[font] = {'parades': pd.DataFrame(parades.drop(columns='geometry')), 'estadistiques': estadistiques}
+    return store
+
+
+# --- 4. Anàlisi per a la interfície ---
+def _resum_join(font, estadistiques, origen):
+    text = (f"{estadistiques['parades']} parades ({font}) assignades a barri "
+            f"({estadistiques['metode']}) en {estadistiques['segons_join'] * 1000:.0f} ms; ")
+    if origen == 'oficial':
+        text += f"{estadistiques['per_proximitat']} per proximitat, "
+    text += f"{estadistiques['sense_barri']} sense barri (no compten als KPIs)."
+    if 'coincidencia' in estadistiques:
+        text += f" Coincidència amb el barri etiquetat: {estadistiques['coincidencia']:.1%}."
+    return text
+
+
+@versioned_lru_cache(*FITXERS_BUS, maxsize=len(FONTS_PARADES))
+def bus_kpi_table(font):
+    """Taula completa de KPIs de bus per barri (els 73 barris), ordenada per pressió."""
+    parades = load_bus_store()[font]['parades']
+    parades_per_barri = parades.groupby('ID_Barri').size().rename('Nombre_Parades_Bus')
+    df_final = coverage_kpis(load_poblacio_barris(), parades_per_barri, 'Poblacio_per_Parada', 'Parades_per_km2')
+    return df_final.sort_values(by='Poblacio_per_Parada', ascending=False).reset_index(drop=True)
+
+
+@versioned_lru_cache(*FITXERS_PARADES, maxsize=len(FONTS_PARADES))
+def bus_stops_table(font):
+    """Llistat de parades amb el barri i el districte assignats (vegeu load_bus_store)."""
+    parades = load_bus_store()[font]['parades']
+    index = load_area_index()
+    taula = pd.DataFrame({
+        'Parada': parades['Parada'],
+        'Linies': parades['Linies'].map(' - '.join),
+        'Nombre_Linies': parades['Linies'].map(len),
+        'Nom_Barri': parades['ID_Barri'].map(index['barris']['Nom_Barri']),
+        'Nom_Districte': parades['ID_Districte'].map(index['districtes']),
+    })
+    if 'Codi_Parada' in parades:
+        taula.insert(0, 'Codi_Parada', parades['Codi_Parada'])
+    return taula.reset_index(drop=True)
+
+
+register_table_source('bus_kpis', bus_kpi_table, *FITXERS_BUS)
+register_table_source('bus_parades', bus_stops_table, *FITXERS_PARADES)
+
+
+@disk_cached(*FITXERS_BUS, version=CHART_MODE)
+def analyze_bus(font=FONTS_PARADES[0]):
+    """
+    Cobertura de bus per barri i districte amb el mateix format que l'anàlisi de metro:
+    habitants per parada, parades per km² i els dos top 10.
+    """
+    try:
+        for path in (FILE_POBLACIO, FILE_PARADES_BUS, FILE_ESTACIONS_BUS):
+            if not os.path.exists(path):
+                return (None, None, None, None, None, None, None, f"Error: No s'ha trobat el fitxer {path}")
+        if font not in FONTS_PARADES:
+            return (None, None, None, None, None, None, None, f"Error: Font de parades desconeguda: {font}")
+
+        store = load_bus_store()
+        parades = store[font]['parades']
+
+        df_poblacio_clean = load_poblacio_barris()
+        df_final = bus_kpi_table(font)
+        resultats = coverage_report(df_final, 'Nombre_Parades_Bus', 'Poblacio_per_Parada', 'Parada de Bus')
+
+        # Resum per districte: parades, línies diferents i habitants per parada
+        districtes = load_area_index()['districtes']
+        per_districte = parades.dropna(subset=['ID_Districte']).groupby('ID_Districte').agg(
+            Nombre_Parades_Bus=('Linies', 'size'),
+            Linies_Diferents=('Linies', lambda s: len(set().union(*s))),
+        )
+        poblacio_districte = (df_poblacio_clean.assign(ID_Districte=df_poblacio_clean['ID_Barri'].map(
+            load_area_index()['barris']['ID_Districte'])).groupby('ID_Districte')['Població'].sum())
+        per_districte = per_districte.join(poblacio_districte, how='right').fillna(0)
+        per_districte['Poblacio_per_Parada'] = np.where(
+            per_districte['Nombre_Parades_Bus'] > 0,
+            per_districte['Població'] / per_districte['Nombre_Parades_Bus'],
+            np.inf
+        ).round(0)
+        per_districte.insert(0, 'Nom_Districte', per_districte.index.map(districtes))
+        per_districte = per_districte.astype({'Nombre_Parades_Bus': int, 'Linies_Diferents': int}).sort_values(
+            'Poblacio_per_Parada', ascending=False).reset_index(drop=True)
+
+        estat = f"Anàlisi completada amb èxit. {_resum_join(font, store[font]['estadistiques'], store['origen_barris'])}"
+        if not (df_final['Nombre_Parades_Bus'] == 0).any():
+            estat += " Tots els barris tenen alguna parada de bus: no n'hi ha cap sense bus."
+        # Les taules grans (KPIs i parades) es paginen al servidor: només viatja la referència
+        return resultats + (per_districte, table_ref('bus_kpis', font), table_ref('bus_parades', font), estat)
+
+    except Exception as e:
+        error_message = f"Error durant l'anàlisi: {str(e)}"
+        return (None, None, None, None, None, None, None, error_message)
+
+
+analyze_bus_async = coalesced(analyze_bus, *FITXERS_BUS, lock=CHART_LOCK)
+
+
+def build_bus_tab(parent_blocks=None):
+    """
+    Construeix la pestanya de cobertura de bus, integrada en el dashboard global.
+
+    Parameters:
+    -----------
+    parent_blocks : gr.Blocks, optional
+        El bloc pare (dashboard global) on s'integrarà aquesta pestanya.
+    """
+    with gr.Tab("🚌 Cobertura de Bus"):
+        gr.Markdown(
+            """
+            # 🚌 Cobertura de la Xarxa de Bus de Barcelona
+            Cada parada s'assigna al seu barri i districte: pel polígon oficial que la conté
+            (join espacial amb índex STRtree) si hi ha el fitxer de límits de barris, o si no
+            pel barri etiquetat de l'Estacions Bus.
+            Després es creua amb la població per barris amb els mateixos KPIs que l'anàlisi de metro.
+            """
+        )
+
+        with gr.Row():
+            font_radio = gr.Radio(choices=FONTS_PARADES, value=FONTS_PARADES[0], label="Font de parades")
+            btn_run = gr.Button("Executar Anàlisi de Bus", variant="primary", size="lg")
+
+        status_box = gr.Textbox(label="Estat de l'Anàlisi", interactive=False)
+
+        gr.Markdown("## Resultats de l'Anàlisi per Barris")
+
+        with gr.Tabs():
+            with gr.Tab("Barris amb Més Pressió de Demanda"):
+                gr.Markdown("Barris amb més habitants per cada parada de bus.")
+                with gr.Row():
+                    plot_pressure = bar_plot("Top 10 Barris: Més Població per Parada", "Nom_Barri", "Poblacio_per_Parada", sort="-y")
+                    data_pressure = gr.DataFrame(label="Dades: Barris amb Més Pressió")
+
+            with gr.Tab("Barris amb Dèficit de Cobertura (Sense Bus)"):
+                gr.Markdown("Barris més poblats sense cap parada de bus dins del seu polígon.")
+                with gr.Row():
+                    plot_sense_bus = bar_plot("Top 10 Barris: Més Població SENSE Bus", "Nom_Barri", "Població", sort="-y")
+                    data_sense_bus = gr.DataFrame(label="Dades: Barris Més Poblats Sense Bus")
+
+            with gr.Tab("🏘️ Per Districte"):
+                data_districtes = gr.DataFrame(label="Parades, línies i habitants per parada per districte")
+
+            with gr.Tab("🚏 Parades"):
+                gr.Markdown("Totes les parades amb el barri i el districte assignats (p. ex. filtre `Nom_Districte ~ gràcia; Nombre_Linies >= 3`).")
+                parades_ref = paged_table("Parades de Bus")
+                export_panel(parades_ref)
+
+            with gr.Tab("📥 Dataset Complet Resultant"):
+                gr.Markdown("Els 73 barris amb els KPIs de bus calculats, paginats al servidor i exportables.")
+                kpis_ref = paged_table("Dataset Complet: KPIs de Bus per Barri")
+                export_panel(kpis_ref)
+
+        btn_run.click(
+            fn=analyze_bus_async,
+            inputs=font_radio,
+            outputs=[
+                plot_pressure,
+                data_pressure,
+                plot_sense_bus,
+                data_sense_bus,
+                data_districtes,
+                kpis_ref,
+                parades_ref,
+                status_box
+            ],
+            api_name="analyze_bus",
+        )
+
+
+if __name__ == "__main__":
+    with gr.Blocks(title="Cobertura Bus BCN") as app:
+        build_bus_tab()
+    app.queue(default_concurrency_limit=MAX_WORKERS)
+    app.launch(share=False, inbrowser=False, allowed_paths=[CACHE_DIR])
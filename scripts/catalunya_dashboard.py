@@ -0,0 +1,410 @@
+import gradio as gr
+import pandas as pd
+import numpy as np
+import os
+from concurrency import coalesced, MAX_WORKERS
+from artifact_cache import disk_cached, versioned_lru_cache
+
+# --- 1. Definir noms de fitxers ---
+FILE_MUNICIPIS = "dataset/Datasets Catalunya/Municipis de les comarques.xlsx"
+FILE_FGC = "dataset/Datasets Catalunya/Demanda FGC estacions Barcelona-Valles 2023.xlsx"
+FILE_BUS_INTERURBA = "dataset/Datasets Catalunya/Viatgers Autobusos Interurbans Catalunya.xlsx"
+
+# Línies FGC tal com apareixen com a capçalera de bloc a cada full anual
+LINIES_FGC = ['Barcelona-Vallès', 'Llobregat-Anoia']
+
+# --- Municipi (codi Idescat de 6 dígits) de cada estació FGC ---
+# El fitxer de demanda només porta el nom de l'estació, així que l'assignació és manual.
+FGC_ESTACIO_MUNICIPI = {
+    # Barcelona-Vallès
+    'PL. CATALUNYA': 80193, 'PROVENÇA': 80193, 'GRÀCIA': 80193, 'SANT GERVASI': 80193,
+    'MUNTANER': 80193, 'LA BONANOVA': 80193, 'LES TRES TORRES': 80193, 'SARRIÀ': 80193,
+    'REINA ELISENDA': 80193, 'PL. MOLINA': 80193, 'PÀDUA': 80193, 'EL PUTXET': 80193,
+    'AV. TIBIDABO': 80193, 'PEU DEL FUNICULAR': 80193, 'CARRETERA DE LES AIGÜES': 80193,
+    'VALLVIDRERA SUPERIOR': 80193, 'BAIXADOR DE VALLVIDRERA': 80193, 'LES PLANES': 80193,
+    'LA FLORESTA': 82055, 'VALLDOREIX': 82055, 'SANT CUGAT': 82055, 'MIRA-SOL': 82055,
+    'HOSPITAL GENERAL': 82055, 'VOLPELLERES': 82055, 'SANT JOAN': 82055,
+    'RUBÍ': 81846,
+    'LES FONTS': 82798, 'TERRASSA RAMBLA': 82798, 'VALLPARADÍS UNIVERSITAT': 82798,
+    'TERRASSA ESTACIÓ DEL NORD': 82798, 'TERRASSA NACIONS UNIDES': 82798,
+    'BELLATERRA': 82665, 'UNIVERSITAT AUTÒNOMA': 82665,
+    'SANT QUIRZE': 82384,
+    'CAN FEU / GRÀCIA': 81878, 'SABADELL ESTACIÓ -  CAN FEU / GRÀCIA': 81878,
+    'SABADELL PL. MAJOR': 81878, 'SABADELL RAMBLA - SABADELL PL. MAJOR': 81878,
+    'LA CREU ALTA': 81878, 'SABADELL NORD': 81878, 'SABADELL PARC DEL NORD': 81878,
+    # Llobregat-Anoia
+    'PL. ESPANYA': 80193, 'MAGÒRIA LA CAMPANA': 80193,
+    'ILDEFONS CERDÀ': 81017, 'EUROPA / FIRA': 81017, 'GORNAL': 81017, 'SANT JOSEP': 81017,
+    "L'HOSPITALET AV.CARRILET": 81017,
+    'ALMEDA': 80734, 'CORNELLÀ RIERA': 80734,
+    'SANT BOI': 82009, 'MOLÍ NOU CIUTAT COOPERATIVA': 82009,
+    'COLÒNIA GÜELL': 82444, 'SANTA COLOMA DE CERVELLÓ': 82444,
+    'SANT VICENÇ DELS HORTS': 82634, 'CAN ROS': 82634,
+    'QUATRE CAMINS': 81574, 'PALLEJÀ': 81574,
+    'SANT ANDREU DE LA BARCA': 81960, 'EL PALAU': 81960,
+    'MARTORELL VILA / CASTELLBISBAL': 81141, 'MARTORELL CENTRAL': 81141, 'MARTORELL ENLLAÇ': 81141,
+    'ABRERA': 80018,
+    'OLESA DE MONTSERRAT': 81477,
+    'AERI DE MONTSERRAT': 81271, 'MONISTROL DE MONTSERRAT': 81271,
+    'CASTELLBELL I EL VILAR': 80538,
+    'SANT VICENÇ / CASTELLGALÍ': 82628,
+    'MANRESA VILADORDIS': 81136, 'MANRESA ALTA': 81136, 'MANRESA BAIXADOR': 81136,
+    'SANT ESTEVE SESROVIRES': 82080, 'LA BEGUDA': 82080,
+    'CAN PARELLADA': 81192, 'MASQUEFA': 81192,
+    'PIERA': 81614,
+    "VALLBONA D'ANOIA": 82922,
+    'CAPELLADES': 80446,
+    'LA POBLA DE CLARAMUNT': 81653,
+    'VILANOVA DEL CAMÍ': 83020,
+    'IGUALADA': 81022,
+}
+
+
+# --- 2. Càrrega i compactació de les dades ---
+def _to_category(series):
+    """Converteix una columna de text a 'category' amb les categories ordenades."""
+    return series.astype('string').str.strip().astype('category')
+
+
+def load_municipis():
+    """
+    Carrega la taula de municipis i comarques amb tipus compactes.
+    Retorna un DataFrame indexat per 'Codi_Municipi'.
+    """
+    df = pd.read_excel(FILE_MUNICIPIS)
+    df_mun = pd.DataFrame({
+        'Codi_Municipi': df['Codi municipi'].astype(np.int32),
+        'Municipi': _to_category(df['Municipi']),
+        'Codi_Comarca': df['Codi comarca'].astype(np.int8),
+        'Comarca': _to_category(df['Comarca']),
+        'Província': _to_category(df['Província']),
+    })
+    return df_mun.set_index('Codi_Municipi')
+
+
+def load_fgc_demanda():
+    """
+    Llegeix tots els fulls anuals del fitxer de demanda FGC i els passa a format llarg:
+    una fila per (Any, Línia, Estació, Mes) amb el nombre de viatges.
+    """
+    fulls = [s for s in pd.ExcelFile(FILE_FGC).sheet_names if s.strip().isdigit()]
+    blocs = []
+    for full in fulls:
+        df = pd.read_excel(FILE_FGC, sheet_name=full, header=None)
+        noms = df[1].astype('string').str.strip()
+
+        for linia in LINIES_FGC:
+            inici = noms[noms == linia].index
+            if inici.empty:
+                continue
+            # El bloc acaba a la fila 'Total ...' següent
+            totals = noms[(noms.index > inici[0]) & noms.str.startswith('Total', na=False)].index
+            fi = totals[0] if not totals.empty else len(df)
+
+            bloc = df.iloc[inici[0] + 1:fi, 1:14]
+            bloc = bloc[bloc[1].notna()]
+            mesos = bloc.iloc[:, 1:13].apply(pd.to_numeric, errors='coerce')
+            mesos.columns = range(1, 13)
+            mesos.index = bloc[1].astype(str).str.strip()
+
+            llarg = mesos.stack().rename('Viatges').reset_index()
+            llarg.columns = ['Estació', 'Mes', 'Viatges']
+            llarg['Línia'] = linia
+            llarg['Any'] = int(full)
+            blocs.append(llarg)
+
+    df_fgc = pd.concat(blocs, ignore_index=True)
+    df_fgc['Codi_Municipi'] = df_fgc['Estació'].map(FGC_ESTACIO_MUNICIPI).fillna(-1)
+
+    return pd.DataFrame({
+        'Any': df_fgc['Any'].astype(np.int16),
+        'Línia': df_fgc['Línia'].astype('category'),
+        'Estació': df_fgc['Estació'].astype('category'),
+        'Codi_Municipi': df_fgc['Codi_Municipi'].astype(np.int32),
+        'Mes': df_fgc['Mes'].astype(np.int8),
+        'Viatges': pd.to_numeric(df_fgc['Viatges'], downcast='unsigned'),
+    })
+
+
+def _parse_passatgers(valor):
+    """
+    La columna 'Passatgers' barreja text amb punts de milers ('1.697.947') i números que
+    Excel ha llegit amb el punt de milers com a decimal (254.033 -> 254033).
+    """
+    if pd.isna(valor):
+        return np.nan
+    if isinstance(valor, str):
+        return float(valor.replace('.', '').strip() or 'nan')
+    if isinstance(valor, float):
+        return round(valor * 1000)
+    return float(valor)
+
+
+def load_bus_interurba():
+    """
+    Carrega els viatgers anuals per línia d'autobús interurbà amb tipus compactes.
+    Els registres sense 'Passatgers' queden com a NaN (no es compten com a zero).
+    """
+    df = pd.read_excel(FILE_BUS_INTERURBA)
+    passatgers = df['Passatgers'].map(_parse_passatgers)
+
+    return pd.DataFrame({
+        'Any': df['Any'].astype(np.int16),
+        'Demarcació': _to_category(df['Demarcació']),
+        'Tipus': _to_category(df['Tipus de transport']),
+        'Línia': _to_category(df['Línia'].astype(str)),
+        'Codi_Municipi': df['Origen Línia [Codi Municipi]'].fillna(-1).astype(np.int32),
+        'Codi_Municipi_Final': df['Final Línia [Codi Municipi]'].fillna(-1).astype(np.int32),
+        'Operadora': _to_category(df['Operadora']),
+        'Passatgers': passatgers.astype(np.float64),
+    })
+
+
+def _memoria_mb(*dfs):
+    """Memòria ocupada (MB) per un conjunt de DataFrames."""
+    return sum(df.memory_usage(deep=True).sum() for df in dfs) / 1024 ** 2
+
+
+@versioned_lru_cache(FILE_MUNICIPIS, FILE_FGC, FILE_BUS_INTERURBA)
+@disk_cached(FILE_MUNICIPIS, FILE_FGC, FILE_BUS_INTERURBA)
+def load_catalunya_store():
+    """
+    Carrega i uneix les tres fonts de Catalunya una sola vegada i precalcula els
+    agregats per comarca, municipi i estació que fa servir la pestanya.
+
+    Retorna un diccionari amb les taules base i els agregats (per 'Any').
+    """
+    df_mun = load_municipis()
+    df_fgc = load_fgc_demanda()
+    df_bus = load_bus_interurba()
+
+    # Unió per codi de municipi (enter), sense passar per noms
+    geo = df_mun[['Municipi', 'Comarca']]
+    fgc = df_fgc.join(geo, on='Codi_Municipi')
+    bus = df_bus.join(geo, on='Codi_Municipi')
+
+    fgc_any = (fgc.groupby(['Any', 'Comarca', 'Municipi', 'Línia', 'Estació'], observed=True)['Viatges']
+               .sum().reset_index())
+    # Un municipi amb totes les línies sense dades queda com a NaN, no com a zero
+    bus_grups = bus.groupby(['Any', 'Comarca', 'Municipi'], observed=True)
+    bus_any = pd.DataFrame({
+        'Passatgers_Bus': bus_grups['Passatgers'].sum(min_count=1),
+        'Linies_Bus': bus_grups['Línia'].nunique(),
+    }).reset_index()
+
+    # Agregat per municipi: FGC (viatges i estacions) + bus interurbà (origen de línia)
+    fgc_mun = fgc_any.groupby(['Any', 'Comarca', 'Municipi'], observed=True).agg(
+        Viatges_FGC=('Viatges', 'sum'),
+        Estacions_FGC=('Estació', 'nunique'),
+    ).reset_index()
+    per_municipi = pd.merge(fgc_mun, bus_any, on=['Any', 'Comarca', 'Municipi'], how='outer')
+    # Els buits de la unió (sense FGC o sense bus) sí que són zeros
+    per_municipi.loc[per_municipi['Linies_Bus'].isna(), 'Passatgers_Bus'] = 0
+    for col in ['Viatges_FGC', 'Estacions_FGC', 'Linies_Bus']:
+        per_municipi[col] = pd.to_numeric(per_municipi[col].fillna(0), downcast='unsigned')
+    per_municipi['Comarca'] = per_municipi['Comarca'].astype(df_mun['Comarca'].dtype)
+    per_municipi['Municipi'] = per_municipi['Municipi'].astype(df_mun['Municipi'].dtype)
+
+    comarca_grups = per_municipi.groupby(['Any', 'Comarca'], observed=True)
+    per_comarca = comarca_grups.agg(
+        Municipis=('Municipi', 'nunique'),
+        Viatges_FGC=('Viatges_FGC', 'sum'),
+        Estacions_FGC=('Estacions_FGC', 'sum'),
+        Linies_Bus=('Linies_Bus', 'sum'),
+    )
+    per_comarca.insert(3, 'Passatgers_Bus', comarca_grups['Passatgers_Bus'].sum(min_count=1))
+    per_comarca = per_comarca.reset_index()
+    per_comarca['Total_Viatgers'] = per_comarca['Viatges_FGC'] + per_comarca['Passatgers_Bus']
+    per_comarca = per_comarca.sort_values(['Any', 'Total_Viatgers'], ascending=[True, False])
+
+    # Índexs de drill-down: cada selecció és una consulta directa a un diccionari
+    municipis_per_comarca = {
+        clau: grup.drop(columns=['Any', 'Comarca']).sort_values('Viatges_FGC', ascending=False)
+        for clau, grup in per_municipi.groupby(['Any', 'Comarca'], observed=True)
+    }
+    estacions_per_municipi = {
+        clau: grup[['Línia', 'Estació', 'Viatges']].sort_values('Viatges', ascending=False)
+        for clau, grup in fgc_any.groupby(['Any', 'Municipi'], observed=True)
+    }
+
+    return {
+        'municipis': df_mun,
+        'fgc': df_fgc,
+        'bus': df_bus,
+        'per_comarca': per_comarca,
+        'municipis_per_comarca': municipis_per_comarca,
+        'estacions_per_municipi': estacions_per_municipi,
+        'estacions_sense_municipi': sorted(df_fgc.loc[df_fgc['Codi_Municipi'] < 0, 'Estació'].unique()),
+        'linies_bus_sense_municipi': int((df_bus['Codi_Municipi'] < 0).sum()),
+        'linies_bus_sense_passatgers': int(df_bus['Passatgers'].isna().sum()),
+        'memoria_mb': _memoria_mb(df_mun, df_fgc, df_bus, per_municipi, per_comarca),
+    }
+
+
+# --- 3. Funcions per a la interfície ---
+def _anys_disponibles(store):
+    return sorted(store['per_comarca']['Any'].unique().tolist(), reverse=True)
+
+
+def analyze_catalunya(any_sel=None):
+    """
+    Retorna l'agregat per comarca de l'any seleccionat, les opcions d'any (les de les
+    dades carregades), les opcions de comarca per al drill-down i un resum de l'estat de
+    la càrrega. Sense any seleccionat es mostra el més recent.
+    """
+    try:
+        for fitxer in [FILE_MUNICIPIS, FILE_FGC, FILE_BUS_INTERURBA]:
+            if not os.path.exists(fitxer):
+                return (None, gr.update(), gr.update(choices=[], value=None), f"Error: No s'ha trobat el fitxer {fitxer}")
+
+        store = load_catalunya_store()
+        anys = _anys_disponibles(store)
+        any_sel = int(any_sel) if any_sel else anys[0]
+
+        df_comarques = store['per_comarca']
+        df_comarques = df_comarques[df_comarques['Any'] == any_sel].drop(columns=['Any'])
+        comarques = df_comarques['Comarca'].astype(str).tolist()
+
+        estat = (
+            f"Anàlisi completada amb èxit. {len(comarques)} comarques amb dades el {any_sel}. "
+            f"Memòria de les taules: {store['memoria_mb']:.2f} MB."
+        )
+        if store['estacions_sense_municipi']:
+            estat += f" Estacions FGC sense municipi: {', '.join(store['estacions_sense_municipi'])}."
+        if store['linies_bus_sense_municipi']:
+            estat += f" Registres de bus sense municipi d'origen: {store['linies_bus_sense_municipi']}."
+        if store['linies_bus_sense_passatgers']:
+            estat += (f" Registres de bus sense passatgers (no compten als totals): "
+                      f"{store['linies_bus_sense_passatgers']}.")
+
+        return (
+            df_comarques,
+            gr.update(choices=anys, value=any_sel),
+            gr.update(choices=comarques, value=comarques[0] if comarques else None),
+            estat
+        )
+
+    except Exception as e:
+        error_message = f"Error durant l'anàlisi: {str(e)}"
+        return (None, gr.update(), gr.update(choices=[], value=None), error_message)
+
+
+def drill_comarca(any_sel, comarca):
+    """
+    Municipis de la comarca seleccionada (consulta a l'agregat precalculat), les opcions
+    de municipi i un missatge d'estat.
+    """
+    try:
+        if not any_sel or not comarca:
+            return (None, gr.update(choices=[], value=None), gr.update())
+        store = load_catalunya_store()
+        df = store['municipis_per_comarca'].get((int(any_sel), comarca))
+        if df is None:
+            return (None, gr.update(choices=[], value=None), f"Sense dades per a {comarca} el {any_sel}.")
+        municipis = df['Municipi'].astype(str).tolist()
+        return (
+            df,
+            gr.update(choices=municipis, value=municipis[0] if municipis else None),
+            f"{comarca} ({any_sel}): {len(municipis)} municipis."
+        )
+    except Exception as e:
+        error_message = f"Error en el drill-down de comarca: {str(e)}"
+        return (None, gr.update(choices=[], value=None), error_message)
+
+
+def drill_municipi(any_sel, municipi):
+    """Estacions FGC del municipi seleccionat (consulta a l'agregat precalculat) i l'estat."""
+    try:
+        if not any_sel or not municipi:
+            return (None, gr.update())
+        store = load_catalunya_store()
+        df = store['estacions_per_municipi'].get((int(any_sel), municipi))
+        if df is None:
+            return (None, f"{municipi} ({any_sel}): sense estacions FGC.")
+        return (df, f"{municipi} ({any_sel}): {len(df)} estacions FGC.")
+    except Exception as e:
+        error_message = f"Error en el drill-down de municipi: {str(e)}"
+        return (None, error_message)
+
+
+# Punts d'entrada async: la càrrega inicial es fa fora del bucle i els clics idèntics es fusionen
+analyze_catalunya_async = coalesced(analyze_catalunya, FILE_MUNICIPIS, FILE_FGC, FILE_BUS_INTERURBA)
+drill_comarca_async = coalesced(drill_comarca, FILE_MUNICIPIS, FILE_FGC, FILE_BUS_INTERURBA)
+drill_municipi_async = coalesced(drill_municipi, FILE_MUNICIPIS, FILE_FGC, FILE_BUS_INTERURBA)
+
+
+def build_catalunya_tab(parent_blocks=None):
+    """
+    Construeix la pestanya de demanda de Catalunya (FGC i bus interurbà).
+
+    Parameters:
+    -----------
+    parent_blocks : gr.Blocks, optional
+        El bloc pare (dashboard global) on s'integrarà aquesta pestanya.
+    """
+    with gr.Tab("🚆 Demanda Catalunya"):
+        gr.Markdown(
+            """
+            # 🚆 Demanda de FGC i Autobusos Interurbans a Catalunya
+            Creua la demanda per estació de FGC (Barcelona-Vallès i Llobregat-Anoia) i els viatgers
+            de les línies d'autobús interurbà amb els municipis i comarques de Catalunya.
+
+            Seleccioneu un any i feu drill-down de comarca a municipi i a estació.
+            """
+        )
+
+        with gr.Row():
+            # Les opcions s'omplen amb els anys de les dades en executar l'anàlisi
+            any_dropdown = gr.Dropdown(
+                choices=[],
+                value=None,
+                label="📅 Any",
+                info="Els anys amb dades de FGC i de bus interurbà (per defecte, el més recent)"
+            )
+            btn_run = gr.Button("Executar Anàlisi de Catalunya", variant="primary", size="lg")
+
+        status_box = gr.Textbox(label="Estat de l'Anàlisi", interactive=False)
+
+        gr.Markdown("## Viatgers per Comarca")
+        data_comarques = gr.DataFrame(label="Dades: Agregat per Comarca")
+
+        with gr.Row():
+            with gr.Column():
+                comarca_dropdown = gr.Dropdown(choices=[], label="🗺️ Comarca")
+                data_municipis = gr.DataFrame(label="Dades: Municipis de la Comarca")
+            with gr.Column():
+                municipi_dropdown = gr.Dropdown(choices=[], label="🏘️ Municipi")
+                data_estacions = gr.DataFrame(label="Dades: Estacions FGC del Municipi")
+
+        # Interaccions
+        btn_run.click(
+            fn=analyze_catalunya_async,
+            inputs=any_dropdown,
+            outputs=[data_comarques, any_dropdown, comarca_dropdown, status_box],
+            api_name="analyze_catalunya"
+        )
+        # .input (només canvis de l'usuari): l'anàlisi mateixa actualitza el desplegable
+        any_dropdown.input(
+            fn=analyze_catalunya_async,
+            inputs=any_dropdown,
+            outputs=[data_comarques, any_dropdown, comarca_dropdown, status_box]
+        )
+        comarca_dropdown.change(
+            fn=drill_comarca_async,
+            inputs=[any_dropdown, comarca_dropdown],
+            outputs=[data_municipis, municipi_dropdown, status_box],
+            api_name="drill_comarca"
+        )
+        municipi_dropdown.change(
+            fn=drill_municipi_async,
+            inputs=[any_dropdown, municipi_dropdown],
+            outputs=[data_estacions, status_box]
+        )
+
+
+# Executar directament si aquest és l'script principal
+if __name__ == "__main__":
+    with gr.Blocks(title="Demanda Catalunya") as app:
+        build_catalunya_tab()
+    app.queue(default_concurrency_limit=MAX_WORKERS)
+    app.launch(share=False, inbrowser=False)
@@ -0,0 +1,56 @@
+import os
+
+import gradio as gr
+
+from concurrency import MATPLOTLIB_LOCK
+
+# --- Mode de renderització dels gràfics ---
+# 'client': el servidor només envia la taula agregada i el navegador dibuixa el gràfic
+#           (gr.BarPlot). L'ordenació, els tooltips i el canvi d'ordre no fan cap petició.
+# 'matplotlib': el servidor genera la figura o el PNG com abans. També és el que fan servir
+#           els informes exportats.
+CHART_MODE = os.environ.get("DASHBOARD_CHARTS", "client")
+CLIENT_CHARTS = CHART_MODE != "matplotlib"
+
+# En mode client cap handler toca pyplot, així que no cal serialitzar-los
+CHART_LOCK = None if CLIENT_CHARTS else MATPLOTLIB_LOCK
+
+
+def bar_plot(label, x, y, fallback=gr.Plot, fallback_kwargs=None, **kwargs):
+    """
+    Component per a un gràfic de barres segons CHART_MODE.
+
+    Parameters:
+    -----------
+    label : str
+        Etiqueta del component.
+    x, y : str
+        Columnes de la taula agregada (només en mode client).
+    fallback : type, optional
+        Component per a la sortida de matplotlib (gr.Plot per a figures, gr.Image per a PNG).
+    fallback_kwargs : dict, optional
+        Arguments addicionals del component de matplotlib.
+    **kwargs :
+        Arguments addicionals de gr.BarPlot (sort, x_title, y_title, height...).
+    """
+    if CLIENT_CHARTS:
+        kwargs.setdefault('tooltip', 'all')
+        kwargs.setdefault('x_label_angle', -45)
+        return gr.BarPlot(x=x, y=y, label=label, **kwargs)
+    return fallback(label=label, **(fallback_kwargs or {}))
+
+
+def line_plot(label, x, y, color=None, fallback=gr.Plot, fallback_kwargs=None, **kwargs):
+    """
+    Component per a un gràfic de línies segons CHART_MODE (gr.LinePlot en mode client).
+    Els arguments són els mateixos que bar_plot; 'color' és la columna que separa les sèries.
+    """
+    if CLIENT_CHARTS:
+        kwargs.setdefault('tooltip', 'all')
+        return gr.LinePlot(x=x, y=y, color=color, label=label, **kwargs)
+    return fallback(label=label, **(fallback_kwargs or {}))
+
+
+# Canvi d'ordre del gràfic en mode client: s'executa al navegador sense cap petició al
+# servidor i només actualitza la propietat 'sort' del gr.BarPlot.
+SORT_BAR_PLOT_JS = """(sort_order) => ({"__type__": "update", "sort": sort_order === "Ascendente" ? "y" : "-y"})"""
@@ -5,12 +5,21 @@ import numpy as np
 import os
 import folium
 from folium import plugins
+from area_index import (DIR_AREES, FILE_AREES, PATRO_POBLACIO, load_area_index, assign_area_ids,
+                        area_id, report_unmatched_areas)
+from concurrency import coalesced, dataset_version, MAX_WORKERS
+from charts import CHART_MODE, CHART_LOCK, CLIENT_CHARTS, bar_plot
+from artifact_cache import disk_cached, versioned_lru_cache, scratch_file, CACHE_DIR
+from paged_table import register_table_source, table_ref, paged_table
+from export_service import export_panel
+from dataset_store import register_dataset, latest_period_file, period_comparison_panel
+from scenarios import (build_baseline, new_scenario, fork_scenario, apply_change, top_pressure,
+                       top_without_stops, district_table, changes_table, scenario_delta)
 
 # --- 1. Definir noms de fitxers ---
 # Fem servir els noms de fitxer exactes que existeixen al directori
-FILE_POBLACIO = "dataset/Datasets Barcelona/Densitat Poblacio Barcelona 2021.xlsx"
 FILE_TRANSPORT = "dataset/Datasets Barcelona/Transport Public Barcelona.xlsx"
-OUTPUT_CSV = "analisis_transporte_poblacion.csv"
+FILE_AFORAMENTS = "dataset/Datasets Barcelona/Aforaments Barcelona 2024.xlsx"
 
 # --- Coordenadas aproximadas de los distritos de Barcelona ---
 DISTRITOS_COORDS = {
@@ -23,10 +32,182 @@ DISTRITOS_COORDS = {
     'Horta-Guinardó': [41.4278, 2.2145],
     'Nou Barris': [41.4351, 2.1886],
     'Sant Andreu': [41.4335, 2.1806],
-    'Sant Martí­': [41.4088, 2.2190]
+    'Sant Martí': [41.4088, 2.2190]
 }
 
 # --- 2. Funció principal de l'anàlisi ---
+def load_poblacio_barris(path=None):
+    """
+    Població, superfície i densitat per barri, amb l'ID canònic i els noms nets del barri
+    i del districte. Base comuna de les anàlisis de cobertura (metro i bus); per defecte
+    llegeix FILE_POBLACIO i 'path' permet llegir el fitxer d'un altre any (magatzem de
+    períodes).
+    """
+    path = path or FILE_POBLACIO
+    # L'únic full té el nom del fitxer truncat a 31 caràcters
+    df_poblacio = pd.read_excel(path, sheet_name=0)
+    areas = load_area_index()['barris']
+
+    # Seleccionem columnes rellevants
+    df_poblacio_clean = df_poblacio[['Població', 'Superfície (ha)', 'Densitat neta (hab/ha)']].copy()
+    df_poblacio_clean.insert(0, 'ID_Barri', assign_area_ids(df_poblacio['Nom_Barri'], df_poblacio['Codi_Barri'], font=path))
+    df_poblacio_clean.insert(1, 'Nom_Districte', df_poblacio_clean['ID_Barri'].map(areas['Nom_Districte']))
+    df_poblacio_clean.insert(2, 'Nom_Barri', df_poblacio_clean['ID_Barri'].map(areas['Nom_Barri']))
+    return df_poblacio_clean
+
+
+# Un fitxer de població per any: "Densitat Poblacio Barcelona AAAA.xlsx"
+register_dataset('poblacio', DIR_AREES, PATRO_POBLACIO,
+                 load_poblacio_barris, ['Nom_Districte', 'Nom_Barri'],
+                 {'Població': 'sum', 'Densitat neta (hab/ha)': 'mean', 'Superfície (ha)': 'sum'})
+
+# L'anàlisi fa servir l'any més recent del magatzem. Es resol en arrencar (les claus de
+# les caché depenen del fitxer): un any nou s'analitza després de reiniciar. L'índex
+# canònic de barris (FILE_AREES) es resol igual, de manera que és el mateix fitxer.
+ANY_POBLACIO, FILE_POBLACIO = latest_period_file('poblacio', default=FILE_AREES)
+# Fitxers dels quals depèn la taula de KPIs de metro (inclòs l'índex canònic de barris)
+FITXERS_METRO = tuple(dict.fromkeys((FILE_POBLACIO, FILE_TRANSPORT, FILE_AREES)))
+
+
+def coverage_kpis(df_poblacio_clean, recompte_per_barri, col_per_habitant, col_per_km2):
+    """
+    Uneix el recompte de parades per barri (Series indexada per ID_Barri) amb la població
+    i calcula els KPIs de cobertura: habitants per parada i parades per km².
+    """
+    col_recompte = recompte_per_barri.name
+
+    # Unim la població amb el recompte per ID enter de barri
+    # 'how=left' manté tots els barris, tinguin o no parades
+    df_final = df_poblacio_clean.join(recompte_per_barri, on='ID_Barri', how='left')
+
+    # Els barris sense parades tindran 'NaN' (Nul). Els canviem per 0.
+    df_final[col_recompte] = df_final[col_recompte].fillna(0).astype(int)
+    df_final = df_final.drop(columns=['ID_Barri'])
+
+    # KPI 1: Població per parada
+    # Usem np.where per evitar la divisió per zero
+    df_final[col_per_habitant] = np.where(
+        df_final[col_recompte] > 0,
+        df_final['Població'] / df_final[col_recompte],
+        np.inf  # Assignem 'infinit' als barris sense parades per identificar-los
+    )
+    # Arrodonim per claredat
+    df_final[col_per_habitant] = df_final[col_per_habitant].round(0)
+
+    # KPI 2: Parades per km² (densitat de la xarxa)
+    df_final[col_per_km2] = np.where(
+        df_final['Superfície (ha)'] > 0,
+        # Convertim 'ha' a 'km2' (100 ha = 1 km2)
+        df_final[col_recompte] / (df_final['Superfície (ha)'] / 100),
+        0
+    )
+    return df_final
+
+
+def coverage_report(df_final, col_recompte, col_per_habitant, unitat):
+    """
+    Top 10 de barris amb més pressió i top 10 més poblats sense cap parada, amb els seus
+    gràfics. El dataset complet no s'escriu aquí: l'exporta export_service quan es demana.
+
+    En mode client (CLIENT_CHARTS) els "gràfics" són les mateixes taules, que dibuixa
+    el navegador; amb matplotlib són figures. 'unitat' és el nom de la parada als títols
+    (p. ex. "Estació de Metro").
+    """
+    # Top 10 Barris amb MÉS pressió (excloent els que tenen 0 parades, que són 'inf')
+    df_pressure = df_final[df_final[col_per_habitant] != np.inf].sort_values(
+        by=col_per_habitant, ascending=False
+    ).head(10)
+
+    # Top 10 Barris MÉS POBLATS SENSE parades (on recompte == 0)
+    df_sense = df_final[df_final[col_recompte] == 0].sort_values(
+        by='Població', ascending=False
+    ).head(10)
+
+    taula_pressure = df_pressure[['Nom_Barri', 'Població', col_recompte, col_per_habitant]]
+    taula_sense = df_sense[['Nom_Barri', 'Població', col_recompte]]
+    fig1, fig2 = top10_charts(taula_pressure, taula_sense, col_per_habitant, unitat)
+    return (fig1, taula_pressure, fig2, taula_sense)
+
+
+def top10_charts(df_pressure, df_sense, col_per_habitant, unitat):
+    """
+    Gràfics dels dos top 10. En mode client són les mateixes taules (les dibuixa el
+    navegador); amb matplotlib, figures.
+    """
+    if CLIENT_CHARTS:
+        return (df_pressure, df_sense)
+
+    # Gràfic 1: Població per parada (Més pressió)
+    fig1, ax1 = plt.subplots(figsize=(10, 7))
+    ax1.barh(df_pressure['Nom_Barri'], df_pressure[col_per_habitant], color='tomato')
+    ax1.set_title(f'Top 10 Barris amb Més Població per {unitat}')
+    ax1.set_xlabel(f'Població per {unitat} (Habitants)')
+    ax1.set_ylabel('Barri')
+    ax1.invert_yaxis()  # Mostra el valor més alt a dalt
+    plt.tight_layout() # Ajusta el gràfic per evitar que es tallin les etiquetes
+
+    # Gràfic 2: Població SENSE parades
+    fig2, ax2 = plt.subplots(figsize=(10, 7))
+    ax2.barh(df_sense['Nom_Barri'], df_sense['Població'], color='skyblue')
+    ax2.set_title(f'Top 10 Barris Més Poblats SENSE {unitat}')
+    ax2.set_xlabel('Població Total')
+    ax2.set_ylabel('Barri')
+    ax2.invert_yaxis()
+    plt.tight_layout()
+
+    return (fig1, fig2)
+
+
+@versioned_lru_cache(*FITXERS_METRO)
+@disk_cached(*FITXERS_METRO)
+def metro_kpi_table():
+    """
+    Taula completa de KPIs de metro per barri (els 73 barris), ordenada per pressió.
+    És la base de l'anàlisi i la font de la taula paginada.
+    """
+    # Carregar Dades
+    df_transport = pd.read_excel(FILE_TRANSPORT, sheet_name='Parades Transport Public Barcel')
+
+    # --- Fase I: Processament i Neteja ---
+
+    # 1. Processar Transport (Filtrar per Metro)
+    # Usem 'contains' per incloure 'Metro' i 'Metro i línies urbanes FGC'
+    df_metro = df_transport[df_transport['NOM_CAPA'].str.contains('Metro', na=False)]
+
+    # 2. Agregar estacions per barri
+    # Assignem l'ID canònic del barri (codi oficial o nom normalitzat) i comptem per ID
+    df_metro = df_metro.assign(ID_Barri=assign_area_ids(df_metro['NOM_BARRI'], df_metro['BARRI'], font=FILE_TRANSPORT))
+    estacions_per_barri = df_metro.groupby('ID_Barri').size().rename('Nombre_Estacions_Metro')
+
+    # 3. Preparar dades de població i fusionar
+    # --- Fase II: Càlcul d'Indicadors (KPIs) ---
+    df_final = coverage_kpis(load_poblacio_barris(), estacions_per_barri,
+                             'Poblacio_per_Estacio', 'Estacions_per_km2')
+    return df_final.sort_values(by='Poblacio_per_Estacio', ascending=False).reset_index(drop=True)
+
+
+@versioned_lru_cache(FILE_AFORAMENTS)
+@disk_cached(FILE_AFORAMENTS)
+def load_aforaments():
+    """
+    Aforaments de trànsit de tot l'any: IMD (intensitat mitjana diària) per punt de mesura,
+    mes i tipus de dia (~50.000 files). Les mesures no disponibles queden com a NaN.
+    """
+    df = pd.read_excel(FILE_AFORAMENTS)
+    return pd.DataFrame({
+        'Any': pd.to_numeric(df['Any'], downcast='unsigned'),
+        'Id_aforament': df['Id_aforament'].astype(str).astype('category'),
+        'Mes': pd.to_numeric(df['Mes'], downcast='unsigned'),
+        'Tipus_dia': df['Desc_tipus_dia'].astype('category'),
+        'Valor_IMD': pd.to_numeric(df['Valor_IMD'], errors='coerce'),
+    })
+
+
+register_table_source('metro_kpis', metro_kpi_table, *FITXERS_METRO)
+register_table_source('aforaments', load_aforaments, FILE_AFORAMENTS)
+
+
+@disk_cached(*FITXERS_METRO, version=CHART_MODE)
 def analyze_data(dummy=None):
     """
     Funció principal que carrega les dades, les processa, calcula KPIs,
@@ -39,112 +220,181 @@ def analyze_data(dummy=None):
         if not os.path.exists(FILE_TRANSPORT):
             return (None, None, None, None, None, f"Error: No s'ha trobat el fitxer {FILE_TRANSPORT}")
 
-        # Carregar Dades
-        df_transport = pd.read_excel(FILE_TRANSPORT, sheet_name='Parades Transport Public Barcel')
-        df_poblacio = pd.read_excel(FILE_POBLACIO, sheet_name='Densitat Poblacio Barcelona 202')
+        df_final = metro_kpi_table()
 
-        # --- Fase I: Processament i Neteja ---
-        
-        # 1. Processar Transport (Filtrar per Metro)
-        # Usem 'contains' per incloure 'Metro' i 'Metro i línies urbanes FGC'
-        df_metro = df_transport[df_transport['NOM_CAPA'].str.contains('Metro', na=False)]
-        
-        # 2. Agregar estacions per barri
-        # Comptem quantes parades hi ha per 'NOM_BARRI'
-        estacions_per_barri = df_metro.groupby('NOM_BARRI').size().reset_index(name='Nombre_Estacions_Metro')
-
-        # 3. Preparar dades de població (seleccionem columnes rellevants)
-        df_poblacio_clean = df_poblacio[['Nom_Districte', 'Nom_Barri', 'Població', 'Superfície (ha)', 'Densitat neta (hab/ha)']].copy()
-
-        # 4. Fusionar Dades
-        # Unim la població amb el recompte d'estacions
-        # 'how=left' manté tots els barris, tinguin o no estacions
-        df_final = pd.merge(
-            df_poblacio_clean,
-            estacions_per_barri,
-            left_on='Nom_Barri',
-            right_on='NOM_BARRI',
-            how='left'
-        )
-        
-        # 5. Netejar dades fusionades
-        # Els barris sense metro tindran 'NaN' (Nul). Els canviem per 0.
-        df_final['Nombre_Estacions_Metro'] = df_final['Nombre_Estacions_Metro'].fillna(0).astype(int)
-        
-        # Eliminar columna redundant del merge
-        if 'NOM_BARRI' in df_final.columns:
-            df_final = df_final.drop(columns=['NOM_BARRI'])
+        # --- Fase III: Visualització ---
+        resultats = coverage_report(df_final, 'Nombre_Estacions_Metro', 'Poblacio_per_Estacio',
+                                    'Estació de Metro')
 
-        # --- Fase II: Càlcul d'Indicadors (KPIs) ---
-        
-        # KPI 1: Població per Estació
-        # Usem np.where per evitar la divisió per zero
-        df_final['Poblacio_per_Estacio'] = np.where(
-            df_final['Nombre_Estacions_Metro'] > 0,
-            df_final['Població'] / df_final['Nombre_Estacions_Metro'],
-            np.inf  # Assignem 'infinit' als barris sense metro per identificar-los
-        )
-        # Arrodonim per claredat
-        df_final['Poblacio_per_Estacio'] = df_final['Poblacio_per_Estacio'].round(0)
-
-        # KPI 2: Estacions per km² (densitat de la xarxa)
-        df_final['Estacions_per_km2'] = np.where(
-            df_final['Superfície (ha)'] > 0,
-            # Convertim 'ha' a 'km2' (100 ha = 1 km2)
-            df_final['Nombre_Estacions_Metro'] / (df_final['Superfície (ha)'] / 100),
-            0
-        )
+        # Retornar tots els elements per a la interfície de Gradio
+        # La taula completa no viatja sencera: només la referència per a la taula paginada
+        return resultats + (table_ref('metro_kpis'),
+                            f"Anàlisi completada amb èxit (població {ANY_POBLACIO}). "
+                            f"{report_unmatched_areas(FILE_POBLACIO, FILE_TRANSPORT)}".strip())
 
-        # --- Preparar Dades per Visualització ---
-        
-        # Top 10 Barris amb MÉS pressió (excloent els que tenen 0 estacions, que són 'inf')
-        df_pressure = df_final[df_final['Poblacio_per_Estacio'] != np.inf].sort_values(
-            by='Poblacio_per_Estacio', ascending=False
-        ).head(10)
+    except Exception as e:
+        # En cas d'error, el mostrem a l'usuari
+        error_message = f"Error durant l'anàlisi: {str(e)}"
+        return (None, None, None, None, None, error_message)
 
-        # Top 10 Barris MÉS POBLATS SENSE metro (on estacions == 0)
-        df_no_metro = df_final[df_final['Nombre_Estacions_Metro'] == 0].sort_values(
-            by='Població', ascending=False
-        ).head(10)
 
-        # --- Fase III: Visualització ---
+def show_aforaments(dummy=None):
+    """Referència a la taula d'aforaments per a la taula paginada."""
+    if not os.path.exists(FILE_AFORAMENTS):
+        return (None, f"Error: No s'ha trobat el fitxer {FILE_AFORAMENTS}")
+    try:
+        df = load_aforaments()
+    except Exception as e:
+        return (None, f"Error carregant els aforaments: {str(e)}")
+    return (table_ref('aforaments'),
+            f"{len(df):,} mesures de {df['Id_aforament'].nunique()} punts d'aforament carregades.")
 
-        # Gràfic 1: Població per Estació (Més pressió)
-        fig1, ax1 = plt.subplots(figsize=(10, 7))
-        ax1.barh(df_pressure['Nom_Barri'], df_pressure['Poblacio_per_Estacio'], color='tomato')
-        ax1.set_title('Top 10 Barris amb Més Població per Estació de Metro')
-        ax1.set_xlabel('Població per Estació (Habitants)')
-        ax1.set_ylabel('Barri')
-        ax1.invert_yaxis()  # Mostra el valor més alt a dalt
-        plt.tight_layout() # Ajusta el gràfic per evitar que es tallin les etiquetes
-
-        # Gràfic 2: Població SENSE Metro
-        fig2, ax2 = plt.subplots(figsize=(10, 7))
-        ax2.barh(df_no_metro['Nom_Barri'], df_no_metro['Població'], color='skyblue')
-        ax2.set_title('Top 10 Barris Més Poblats SENSE Estació de Metro')
-        ax2.set_xlabel('Població Total')
-        ax2.set_ylabel('Barri')
-        ax2.invert_yaxis()
-        plt.tight_layout()
 
-        # Guardar el dataset complet per descarregar
-        df_final.sort_values(by='Poblacio_per_Estacio', ascending=False).to_csv(OUTPUT_CSV, index=False)
+# --- Simulador d'escenaris (what-if) ---
+# Cada sessió guarda {'actiu': nom, 'escenaris': {nom: escenari}, 'versio': versió de les
+# dades}; els escenaris només contenen les files modificades i comparteixen la base (vegeu
+# scenarios.py). Les files es guarden per posició dins la base, així que una sessió creada
+# amb una altra versió de les dades no es pot continuar fent servir.
+MAX_ESCENARIS = 20
+ESCENARI_INICIAL = "Escenari 1"
 
-        # Retornar tots els elements per a la interfície de Gradio
-        return (
-            fig1, 
-            df_pressure[['Nom_Barri', 'Població', 'Nombre_Estacions_Metro', 'Poblacio_per_Estacio']], 
-            fig2, 
-            df_no_metro[['Nom_Barri', 'Població', 'Nombre_Estacions_Metro']], 
-            OUTPUT_CSV, 
-            "Anàlisi completada amb èxit."
-        )
 
+@versioned_lru_cache(*FITXERS_METRO)
+def metro_scenario_base():
+    """Base compartida dels escenaris de metro (dades reals)."""
+    return build_baseline(metro_kpi_table(), 'Nombre_Estacions_Metro',
+                          'Poblacio_per_Estacio', 'Estacions_per_km2')
+
+
+def _render_scenario(sessio, missatge):
+    """Sortides de la interfície per a l'escenari actiu de la sessió."""
+    base = metro_scenario_base()
+    escenari = sessio['escenaris'][sessio['actiu']]
+    taula_pressure = top_pressure(base, escenari)
+    taula_sense = top_without_stops(base, escenari)
+    fig1, fig2 = top10_charts(taula_pressure, taula_sense, 'Poblacio_per_Estacio', 'Estació de Metro')
+    delta = scenario_delta(base, escenari)
+    estat = (f"{missatge} · {sessio['actiu']}: {len(escenari['barris'])} barris modificats, "
+             f"{delta:+d} estacions respecte a les dades reals.")
+    return (sessio, gr.update(choices=list(sessio['escenaris']), value=sessio['actiu']),
+            fig1, taula_pressure, fig2, taula_sense,
+            district_table(base, escenari), changes_table(base, escenari), estat)
+
+
+def _scenario_error(sessio, missatge):
+    return (sessio,) + (gr.update(),) * 7 + (f"Error: {missatge}",)
+
+
+def _new_session():
+    return {'actiu': ESCENARI_INICIAL, 'escenaris': {ESCENARI_INICIAL: new_scenario()},
+            'versio': dataset_version(*FITXERS_METRO)}
+
+
+def _session_problem(sessio):
+    """Motiu pel qual la sessió no es pot fer servir amb la base actual, o None."""
+    if not sessio:
+        return "Obriu primer el simulador"
+    if sessio.get('versio') != dataset_version(*FITXERS_METRO):
+        return "Les dades reals han canviat des que es van crear els escenaris; torneu a obrir el simulador"
+    return None
+
+
+def start_scenarios(sessio=None):
+    """
+    Inicialitza el simulador a la sessió (la primera vegada) i retorna, a més de les
+    sortides de l'escenari actiu, la llista de barris per al selector.
+    """
+    try:
+        barris = sorted(metro_scenario_base()['barris'])
+        missatge = "Simulador preparat"
+        if _session_problem(sessio):
+            if sessio:
+                missatge = "Les dades reals han canviat: escenaris restablerts"
+            sessio = _new_session()
+        return _render_scenario(sessio, missatge) + (gr.update(choices=barris),)
+    except Exception as e:
+        return _scenario_error(sessio, f"No s'ha pogut carregar la base: {str(e)}") + (gr.update(),)
+
+
+def edit_scenario(sessio, barri, quantitat, signe=1):
+    """Afegeix (signe=1) o treu (signe=-1) 'quantitat' estacions hipotètiques al barri."""
+    problema = _session_problem(sessio)
+    if problema:
+        return _scenario_error(sessio, problema)
+    if not barri:
+        return _scenario_error(sessio, "Seleccioneu un barri")
+    try:
+        quantitat = int(quantitat or 1)
+        escenari = apply_change(metro_scenario_base(), sessio['escenaris'][sessio['actiu']],
+                                barri, signe * quantitat)
     except Exception as e:
-        # En cas d'error, el mostrem a l'usuari
-        error_message = f"Error durant l'anàlisi: {str(e)}"
-        return (None, None, None, None, None, error_message)
+        return _scenario_error(sessio, str(e))
+    # Sessió nova (no es modifica la que té Gradio): només canvia l'escenari actiu
+    sessio = {**sessio, 'escenaris': {**sessio['escenaris'], sessio['actiu']: escenari}}
+    accio = "Afegides" if signe > 0 else "Tretes"
+    return _render_scenario(sessio, f"{accio} {quantitat} estacions a {barri}")
+
+
+def add_stations(sessio, barri, quantitat):
+    return edit_scenario(sessio, barri, quantitat, signe=1)
+
+
+def remove_stations(sessio, barri, quantitat):
+    return edit_scenario(sessio, barri, quantitat, signe=-1)
+
+
+def create_scenario(sessio, nom, copiar=True):
+    """Crea un escenari nou, buit o copiat de l'actiu, i el fa actiu."""
+    problema = _session_problem(sessio)
+    if problema:
+        return _scenario_error(sessio, problema)
+    nom = (nom or "").strip() or f"Escenari {len(sessio['escenaris']) + 1}"
+    if nom in sessio['escenaris']:
+        return _scenario_error(sessio, f"Ja existeix un escenari anomenat '{nom}'")
+    if len(sessio['escenaris']) >= MAX_ESCENARIS:
+        return _scenario_error(sessio, f"Com a màxim hi pot haver {MAX_ESCENARIS} escenaris per sessió")
+    escenari = fork_scenario(sessio['escenaris'][sessio['actiu']]) if copiar else new_scenario()
+    sessio = {**sessio, 'actiu': nom, 'escenaris': {**sessio['escenaris'], nom: escenari}}
+    return _render_scenario(sessio, f"Escenari '{nom}' creat")
+
+
+def create_empty_scenario(sessio, nom):
+    return create_scenario(sessio, nom, copiar=False)
+
 
+def select_scenario(sessio, nom):
+    """Canvia l'escenari actiu."""
+    problema = _session_problem(sessio)
+    if problema:
+        return _scenario_error(sessio, problema)
+    if nom not in sessio['escenaris']:
+        return _scenario_error(sessio, f"Escenari desconegut: {nom}")
+    return _render_scenario({**sessio, 'actiu': nom}, f"Escenari '{nom}' seleccionat")
+
+
+def delete_scenario(sessio):
+    """Elimina l'escenari actiu (sempre en queda almenys un)."""
+    problema = _session_problem(sessio)
+    if problema:
+        return _scenario_error(sessio, problema)
+    if len(sessio['escenaris']) == 1:
+        return _scenario_error(sessio, "No es pot eliminar l'únic escenari; restabliu-lo")
+    escenaris = {nom: e for nom, e in sessio['escenaris'].items() if nom != sessio['actiu']}
+    eliminat = sessio['actiu']
+    return _render_scenario({**sessio, 'actiu': next(iter(escenaris)), 'escenaris': escenaris},
+                            f"Escenari '{eliminat}' eliminat")
+
+
+def reset_scenario(sessio):
+    """Descarta tots els canvis de l'escenari actiu."""
+    problema = _session_problem(sessio)
+    if problema:
+        return _scenario_error(sessio, problema)
+    sessio = {**sessio, 'escenaris': {**sessio['escenaris'], sessio['actiu']: new_scenario()}}
+    return _render_scenario(sessio, f"Escenari '{sessio['actiu']}' restablert")
+
+
+@disk_cached(FILE_TRANSPORT, FILE_AREES, version=CHART_MODE)
 def analyze_estaciones_por_distrito(dummy=None):
     """
     Funció que analitza les estacions de metro per districte i retorna visualitzacions.
@@ -163,10 +413,20 @@ def analyze_estaciones_por_distrito(dummy=None):
         if df_metro.empty:
             return (None, None, None, "Error: No s'han trobat dades de metro")
         
-        # Contar estacions per districte
-        estacions_per_distrito = df_metro.groupby('NOM_DISTRICTE').size().reset_index(name='Nombre_Estaciones')
+        # Contar estacions per districte (per ID canònic, amb el nom net del districte)
+        df_metro['ID_Districte'] = assign_area_ids(df_metro['NOM_DISTRICTE'], df_metro['DISTRICTE'], nivell='districte', font=FILE_TRANSPORT)
+        estacions_per_distrito = df_metro.groupby('ID_Districte').size().reset_index(name='Nombre_Estaciones')
+        estacions_per_distrito.insert(0, 'NOM_DISTRICTE', estacions_per_distrito.pop('ID_Districte').map(load_area_index()['districtes']))
         estacions_per_distrito = estacions_per_distrito.sort_values('Nombre_Estaciones', ascending=False)
-        
+        estat = f"Anàlisi completada amb èxit. {report_unmatched_areas(FILE_TRANSPORT)}".strip()
+
+        if CLIENT_CHARTS:
+            # El navegador dibuixa les barres; el gràfic circular passa a barres de percentatge
+            distribucio = estacions_per_distrito.assign(
+                Percentatge=(100 * estacions_per_distrito['Nombre_Estaciones']
+                             / estacions_per_distrito['Nombre_Estaciones'].sum()).round(1))
+            return (estacions_per_distrito, distribucio, estacions_per_distrito, estat)
+
         # Gràfic 1: Barres amb número de estacions per districte
         fig1, ax1 = plt.subplots(figsize=(12, 7))
         colors = plt.cm.Set3(np.linspace(0, 1, len(estacions_per_distrito)))
@@ -210,13 +470,14 @@ def analyze_estaciones_por_distrito(dummy=None):
             fig1,
             fig2,
             estacions_per_distrito,
-            "Anàlisi completada amb èxit."
+            estat
         )
     
     except Exception as e:
         error_message = f"Error durant l'anàlisi: {str(e)}"
         return (None, None, None, error_message)
 
+@disk_cached(FILE_TRANSPORT, FILE_AREES)
 def create_heatmap_distritos(dummy=None):
     """
     Funció que crea un mapa interactiu amb Folium on els distritos es resalten 
@@ -236,8 +497,11 @@ def create_heatmap_distritos(dummy=None):
         if df_metro.empty:
             return (None, "Error: No s'han trobat dades de metro")
         
-        # Contar estacions per districte
-        estaciones_per_distrito = df_metro.groupby('NOM_DISTRICTE').size().reset_index(name='Nombre_Estaciones')
+        # Contar estacions per districte (per ID canònic, amb el nom net del districte)
+        df_metro['ID_Districte'] = assign_area_ids(df_metro['NOM_DISTRICTE'], df_metro['DISTRICTE'], nivell='districte', font=FILE_TRANSPORT)
+        estaciones_per_distrito = df_metro.groupby('ID_Districte').size().reset_index(name='Nombre_Estaciones')
+        estaciones_per_distrito['NOM_DISTRICTE'] = estaciones_per_distrito['ID_Districte'].map(load_area_index()['districtes'])
+        coords_per_districte = {area_id(nom, 'districte'): coords for nom, coords in DISTRITOS_COORDS.items()}
         
         # Obtenir min i max per normalitzar colors
         min_estaciones = estaciones_per_distrito['Nombre_Estaciones'].min()
@@ -297,8 +561,8 @@ def create_heatmap_distritos(dummy=None):
             num_estaciones = row['Nombre_Estaciones']
             
             # Obtener coordenadas (usar las predefinidas o calcular)
-            if distrito in DISTRITOS_COORDS:
-                coords = DISTRITOS_COORDS[distrito]
+            if row['ID_Districte'] in coords_per_districte:
+                coords = coords_per_districte[row['ID_Districte']]
             else:
                 # Si no existe en el diccionario, intentar usar coordenadas de los datos
                 continue
@@ -360,8 +624,9 @@ def create_heatmap_distritos(dummy=None):
         
         mapa.get_root().html.add_child(folium.Element(legend_html))
         
-        # Guardar mapa a archivo HTML
-        mapa_file = "mapa_estaciones_distritos.html"
+        # Guardar mapa a archivo HTML (nom únic: les peticions i els workers no se'l trepitgen;
+        # el directori temporal del dashboard esborra els mapes antics)
+        mapa_file = scratch_file("mapa_estaciones_distritos_", ".html")
         mapa.save(mapa_file)
         
         return (mapa_file, "✅ Mapa creado correctamente")
@@ -370,6 +635,23 @@ def create_heatmap_distritos(dummy=None):
         error_message = f"Error durant la creació del mapa: {str(e)}"
         return (None, error_message)
 
+# --- 3. Punts d'entrada async per a Gradio ---
+# Executen l'anàlisi fora del bucle d'esdeveniments i fusionen els clics idèntics en curs
+analyze_data_async = coalesced(analyze_data, *FITXERS_METRO, lock=CHART_LOCK)
+analyze_estaciones_por_distrito_async = coalesced(analyze_estaciones_por_distrito, FILE_TRANSPORT, FILE_AREES,
+                                                  lock=CHART_LOCK)
+create_heatmap_distritos_async = coalesced(create_heatmap_distritos, FILE_TRANSPORT, FILE_AREES)
+show_aforaments_async = coalesced(show_aforaments, FILE_AFORAMENTS)
+start_scenarios_async = coalesced(start_scenarios, *FITXERS_METRO, lock=CHART_LOCK)
+add_stations_async = coalesced(add_stations, lock=CHART_LOCK)
+remove_stations_async = coalesced(remove_stations, lock=CHART_LOCK)
+create_scenario_async = coalesced(create_scenario, lock=CHART_LOCK)
+create_empty_scenario_async = coalesced(create_empty_scenario, lock=CHART_LOCK)
+select_scenario_async = coalesced(select_scenario, lock=CHART_LOCK)
+delete_scenario_async = coalesced(delete_scenario, lock=CHART_LOCK)
+reset_scenario_async = coalesced(reset_scenario, lock=CHART_LOCK)
+
+
 def build_cobertura_tab(parent_blocks=None):
     """
     Construeix la pestanya de cobertura de transport, integrada en el dashboard global.
@@ -411,35 +693,91 @@ def build_cobertura_tab(parent_blocks=None):
                     with gr.Tab("Barris amb Més Pressió de Demanda"):
                         gr.Markdown("Aquests barris tenen el ràtio més alt d'habitants per cada estació de metro. Són punts de potencial congestió.")
                         with gr.Row():
-                            plot_pressure = gr.Plot(label="Top 10 Barris: Més Població per Estació")
+                            plot_pressure = bar_plot("Top 10 Barris: Més Població per Estació", "Nom_Barri", "Poblacio_per_Estacio", sort="-y")
                             data_pressure = gr.DataFrame(label="Dades: Barris amb Més Pressió")
                     
                     # Barris amb dèficit de cobertura
                     with gr.Tab("Barris amb Dèficit de Cobertura (Sense Metro)"):
                         gr.Markdown("Aquests són els barris més poblats que actualment no tenen cap estació de metro.")
                         with gr.Row():
-                            plot_no_metro = gr.Plot(label="Top 10 Barris: Més Població SENSE Metro")
+                            plot_no_metro = bar_plot("Top 10 Barris: Més Població SENSE Metro", "Nom_Barri", "Població", sort="-y")
                             data_no_metro = gr.DataFrame(label="Dades: Barris Més Poblats Sense Metro")
                             
-                    # Descàrrega del dataset complet
+                    # Dataset complet: taula paginada al servidor i descàrrega
                     with gr.Tab("📥 Dataset Complet Resultant"):
-                        gr.Markdown("Aquí podeu descarregar el fitxer CSV complet amb les dades dels 73 barris i els KPIs calculats.")
-                        output_file = gr.File(label="Descarregar Dataset Complet (CSV)")
+                        gr.Markdown("Dades dels 73 barris i els KPIs calculats. La taula es pagina, s'ordena i es filtra al servidor; l'exportació (CSV, CSV gzip, XLSX o Parquet) es genera només quan la demaneu.")
+                        kpis_ref = paged_table("Dataset Complet: KPIs per Barri", api_name="metro_kpis")
+                        export_panel(kpis_ref, api_name="export_metro_kpis")
 
                 # Connectar el botó a la funció
                 btn_run.click(
-                    fn=analyze_data,
+                    fn=analyze_data_async,
                     inputs=dummy_input,
                     outputs=[
                         plot_pressure, 
                         data_pressure, 
                         plot_no_metro, 
                         data_no_metro, 
-                        output_file, 
+                        kpis_ref,
                         status_box
                     ]
                 )
             
+            # ===== PESTANYA: SIMULADOR D'ESCENARIS (WHAT-IF) =====
+            with gr.Tab("🧪 Simulador d'Escenaris") as tab_escenaris:
+                gr.Markdown(
+                    """
+                    ## Què passaria si...?
+                    Afegiu o traieu estacions de metro hipotètiques i vegeu com canvien els KPIs
+                    (`Poblacio_per_Estacio`, `Estacions_per_km2`) i els rànquings. Només es recalculen
+                    els barris i districtes afectats. Podeu mantenir diversos escenaris en paral·lel:
+                    un escenari nou parteix d'una còpia de l'actiu.
+                    """
+                )
+                sessio_escenaris = gr.State(None)
+                with gr.Row():
+                    escenari_actiu = gr.Dropdown([], label="Escenari actiu", scale=2)
+                    nom_escenari = gr.Textbox(label="Nom de l'escenari nou", placeholder="Escenari 2", scale=2)
+                    btn_nou = gr.Button("Nou (còpia de l'actiu)", scale=1)
+                    btn_buit = gr.Button("Nou (buit)", scale=1)
+                    btn_eliminar = gr.Button("Eliminar", variant="stop", scale=1)
+                with gr.Row():
+                    barri_escenari = gr.Dropdown([], label="Barri", scale=3)
+                    quantitat = gr.Number(value=1, precision=0, minimum=1, label="Estacions", scale=1)
+                    btn_afegir = gr.Button("➕ Afegir", variant="primary", scale=1)
+                    btn_treure = gr.Button("➖ Treure", scale=1)
+                    btn_restablir = gr.Button("↺ Restablir", scale=1)
+                status_escenari = gr.Textbox(label="Estat de l'Escenari", interactive=False)
+                with gr.Row():
+                    plot_pressure_esc = bar_plot("Top 10 Barris: Més Població per Estació", "Nom_Barri", "Poblacio_per_Estacio", sort="-y")
+                    data_pressure_esc = gr.DataFrame(label="Escenari: Barris amb Més Pressió")
+                with gr.Row():
+                    plot_no_metro_esc = bar_plot("Top 10 Barris: Més Població SENSE Metro", "Nom_Barri", "Població", sort="-y")
+                    data_no_metro_esc = gr.DataFrame(label="Escenari: Barris Més Poblats Sense Metro")
+                data_districtes_esc = gr.DataFrame(label="Escenari: KPIs per Districte")
+                data_canvis_esc = gr.DataFrame(label="Barris Modificats (base vs. escenari)")
+
+                sortides_escenari = [sessio_escenaris, escenari_actiu, plot_pressure_esc, data_pressure_esc,
+                                     plot_no_metro_esc, data_no_metro_esc, data_districtes_esc,
+                                     data_canvis_esc, status_escenari]
+                tab_escenaris.select(fn=start_scenarios_async, inputs=sessio_escenaris,
+                                     outputs=sortides_escenari + [barri_escenari], show_api=False,
+                                     api_name="scenario_start")
+                btn_afegir.click(fn=add_stations_async, inputs=[sessio_escenaris, barri_escenari, quantitat],
+                                 outputs=sortides_escenari, show_api=False, api_name="scenario_add")
+                btn_treure.click(fn=remove_stations_async, inputs=[sessio_escenaris, barri_escenari, quantitat],
+                                 outputs=sortides_escenari, show_api=False)
+                btn_nou.click(fn=create_scenario_async, inputs=[sessio_escenaris, nom_escenari],
+                              outputs=sortides_escenari, show_api=False)
+                btn_buit.click(fn=create_empty_scenario_async, inputs=[sessio_escenaris, nom_escenari],
+                               outputs=sortides_escenari, show_api=False)
+                escenari_actiu.input(fn=select_scenario_async, inputs=[sessio_escenaris, escenari_actiu],
+                                     outputs=sortides_escenari, show_api=False)
+                btn_eliminar.click(fn=delete_scenario_async, inputs=sessio_escenaris,
+                                   outputs=sortides_escenari, show_api=False)
+                btn_restablir.click(fn=reset_scenario_async, inputs=sessio_escenaris,
+                                    outputs=sortides_escenari, show_api=False, api_name="scenario_reset")
+
             # ===== PESTAÑA 2: ANÁLISIS POR DISTRITOS =====
             with gr.Tab("🏘️ Análisis por Distritos"):
                 gr.Markdown(
@@ -460,8 +798,9 @@ def build_cobertura_tab(parent_blocks=None):
                 
                 # Row with both charts
                 with gr.Row():
-                    chart_barras = gr.Plot(label="Gràfic de Barres: Estacions per Districte")
-                    chart_pie = gr.Plot(label="Gràfic Circular: Distribució per Districte")
+                    chart_barras = bar_plot("Gràfic de Barres: Estacions per Districte", "NOM_DISTRICTE", "Nombre_Estaciones", sort="-y")
+                    chart_pie = bar_plot("Distribució per Districte", "NOM_DISTRICTE", "Percentatge",
+                                         sort="-y", y_title="% d'estacions")
                 
                 # Dataframe with data
                 with gr.Row():
@@ -469,7 +808,7 @@ def build_cobertura_tab(parent_blocks=None):
                 
                 # Connect button to function
                 btn_run_dist.click(
-                    fn=analyze_estaciones_por_distrito,
+                    fn=analyze_estaciones_por_distrito_async,
                     inputs=dummy_input_dist,
                     outputs=[
                         chart_barras,
@@ -510,7 +849,7 @@ def build_cobertura_tab(parent_blocks=None):
                 
                 # Connect button to function
                 btn_run_map.click(
-                    fn=create_heatmap_distritos,
+                    fn=create_heatmap_distritos_async,
                     inputs=dummy_input_map,
                     outputs=[
                         map_output,
@@ -518,10 +857,45 @@ def build_cobertura_tab(parent_blocks=None):
                     ]
                 )
 
+            # ===== PESTANYA: EVOLUCIÓ ENTRE PERÍODES =====
+            with gr.Tab("📅 Evolució de la Població"):
+                gr.Markdown(
+                    """
+                    ## Població per barri entre períodes
+                    Compara la població i la densitat de cada barri entre els anys disponibles
+                    (un fitxer `Densitat Poblacio Barcelona AAAA.xlsx` per any). Cada fitxer es llegeix
+                    un sol cop i es desa al magatzem de períodes.
+                    """
+                )
+                period_comparison_panel({"Població per barri": "poblacio"}, "Població per Barri i Període",
+                                        api_name="compare_poblacio")
+
+            # ===== PESTANYA 4: AFORAMENTS (taula gran paginada) =====
+            with gr.Tab("🚗 Aforaments 2024"):
+                gr.Markdown(
+                    """
+                    ## Aforaments de Trànsit 2024
+                    Intensitat mitjana diària (IMD) per punt de mesura, mes i tipus de dia (~50.000 files).
+                    El navegador només rep la pàgina visible; l'ordre i els filtres (p. ex. `Mes = 3; Valor_IMD > 20000`)
+                    es resolen al servidor.
+                    """
+                )
+                dummy_input_afor = gr.State(value=0)
+                btn_afor = gr.Button("Carregar Aforaments", variant="primary", size="lg")
+                status_box_afor = gr.Textbox(label="Estat", interactive=False)
+                aforaments_ref = paged_table("Aforaments 2024")
+                export_panel(aforaments_ref)
+                btn_afor.click(
+                    fn=show_aforaments_async,
+                    inputs=dummy_input_afor,
+                    outputs=[aforaments_ref, status_box_afor]
+                )
+
 
 # --- 4. Definición de la Interfície de Gradio ---
 # Executar directament si aquest és l'script principal
 if __name__ == "__main__":
     with gr.Blocks(title="Anàlisi Transport BCN") as app:
         build_cobertura_tab()
-    app.launch(share=False, inbrowser=False)
\ No newline at end of file
+    app.queue(default_concurrency_limit=MAX_WORKERS)
+    app.launch(share=False, inbrowser=False, allowed_paths=[CACHE_DIR])
\ No newline at end of file
@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Execució en segon pla dels handlers de Gradio ---
+# Nombre màxim de càlculs bloquejants (lectura d'Excel, gràfics) en paral·lel per procés
+MAX_WORKERS = int(os.environ.get("DASHBOARD_MAX_WORKERS", "4"))
+# DASHBOARD_COALESCE=0 desactiva la fusió de peticions (útil per mesurar en proves de càrrega)
+COALESCE_ENABLED = os.environ.get("DASHBOARD_COALESCE", "1") != "0"
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="dashboard")
+
+# pyplot manté estat global (figura actual), així que els handlers que en fan servir
+# s'executen d'un en un dins del procés. Només protegeix aquest estat en memòria: els
+# fitxers que generen els handlers han de tenir un nom únic per petició (scratch_file),
+# perquè altres workers poden escriure alhora
+MATPLOTLIB_LOCK = threading.RLock()
+
+# Càlculs en curs: clau -> asyncio.Future compartit per totes les peticions idèntiques
+_EN_CURS = {}
+
+
+def dataset_version(*paths):
+    """
+    Versió de les dades d'entrada: (ruta, mtime, mida) de cada fitxer.
+    Si algun fitxer canvia, les peticions noves ja no es fusionen amb les antigues.
+    """
+    versio = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            versio.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            versio.append((path, None, None))
+    return tuple(versio)
+
+
+def _hashable(valor):
+    """
+    Forma hashable dels arguments típics de Gradio (llistes dels desplegables múltiples,
+    diccionaris de gr.State com les referències de taula), per poder-los fusionar.
+    Els valors que no es poden convertir (arrays, DataFrames) continuen donant TypeError.
+    """
+    if isinstance(valor, dict):
+        return ('dict', frozenset((k, _hashable(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return tuple(_hashable(v) for v in valor)
+    if isinstance(valor, set):
+        return frozenset(_hashable(v) for v in valor)
+    return valor
+
+
+def _run_locked(fn, lock, args, kwargs):
+    if lock is None:
+        return fn(*args, **kwargs)
+    with lock:
+        return fn(*args, **kwargs)
+
+
+def coalesced(fn, *paths, lock=None):
+    """
+    Converteix un handler síncron en un punt d'entrada async per a Gradio.
+
+    El treball bloquejant s'executa a EXECUTOR (limitat a MAX_WORKERS fils) i les peticions
+    idèntiques en curs (mateix handler, mateixos arguments i mateixa versió dels fitxers
+    'paths') comparteixen un únic càlcul, el resultat del qual es retorna a tots els que esperen.
+
+    Parameters:
+    -----------
+    fn : callable
+        Handler síncron original.
+    *paths : str
+        Fitxers de dades dels quals depèn el resultat.
+    lock : threading.Lock, optional
+        Bloqueig a mantenir durant el càlcul (p. ex. MATPLOTLIB_LOCK).
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            clau = (fn.__module__, fn.__qualname__, _hashable(args),
+                    _hashable(sorted(kwargs.items())), dataset_version(*paths))
+            hash(clau)
+        except TypeError:
+            # Arguments no hashables: no es poden fusionar, però igualment no bloquegen el bucle
+            clau = None
+
+        loop = asyncio.get_running_loop()
+        if clau is None or not COALESCE_ENABLED:
+            return await loop.run_in_executor(EXECUTOR, _run_locked, fn, lock, args, kwargs)
+
+        futur = _EN_CURS.get(clau)
+        if futur is None:
+            futur = loop.run_in_executor(EXECUTOR, _run_locked, fn, lock, args, kwargs)
+            _EN_CURS[clau] = futur
+            futur.add_done_callback(lambda _: _EN_CURS.pop(clau, None))
+
+        # shield: si un client es desconnecta, el càlcul compartit continua per als altres
+        return await asyncio.shield(futur)
+
+    return wrapper
@@ -0,0 +1,318 @@
+import datetime
+import json
+import os
+import re
+import shutil
+import tempfile
+from functools import lru_cache
+
+import gradio as gr
+import numpy as np
+import pandas as pd
+
+from artifact_cache import CACHE_DIR, file_digest, file_lock
+from concurrency import coalesced, dataset_version
+from paged_table import register_table_source, table_ref, paged_table
+from export_service import export_panel
+
+# --- Magatzem de dades per períodes ---
+# Cada fitxer de dades d'un període (p. ex. el semestre 2025-S1 de l'FMB o la població
+# de 2021) es parseja un sol cop i es desa com a instantània columnar: un .npy per
+# columna (els textos com a codis + categories), llegit amb mmap. L'índex de períodes
+# (index.json) apunta a la versió vigent de cada període i guarda l'historial de
+# versions anteriors; una nova entrega de dades afegeix un període en lloc de
+# substituir-lo. Les comparacions entre N períodes no tornen a llegir cap Excel.
+STORE_DIR = os.environ.get("DASHBOARD_STORE_DIR", os.path.join(CACHE_DIR, "store"))
+INDEX_FILE = os.path.join(STORE_DIR, "index.json")
+
+MODES = ["Interanual", "Semestre anterior", "Períodes seleccionats"]
+
+# tipus -> definició (directori, patró del nom de fitxer, parser, claus, mesures)
+_DATASETS = {}
+
+
+def register_dataset(kind, directory, pattern, parser, keys, measures):
+    """
+    Registra una família de fitxers per períodes.
+
+    Parameters:
+    -----------
+    kind : str
+        Nom del conjunt de dades (p. ex. 'fmb').
+    directory : str
+        Directori on es busquen els fitxers de cada període.
+    pattern : str
+        Expressió regular del nom del fitxer amb els grups 'any' i, opcionalment,
+        'semestre'. El període és 'AAAA' o 'AAAA-S1' / 'AAAA-S2'.
+    parser : callable
+        Rep la ruta del fitxer i retorna el DataFrame del període.
+    keys : list of str
+        Columnes que identifiquen cada element comparable (línia, barri...).
+    measures : dict
+        Mesura -> agregació per clau dins d'un període ('sum', 'mean'...).
+    """
+    _DATASETS[kind] = {'directory': directory, 'pattern': re.compile(pattern), 'parser': parser,
+                       'keys': list(keys), 'measures': dict(measures)}
+
+
+def _period(match):
+    semestre = match.groupdict().get('semestre')
+    return f"{match.group('any')}-S{semestre}" if semestre else match.group('any')
+
+
+def find_period_files(directory, pattern):
+    """{període: ruta} dels fitxers de 'directory' el nom dels quals segueix 'pattern'."""
+    pattern = re.compile(pattern)
+    try:
+        noms = sorted(os.listdir(directory))
+    except OSError:
+        return {}
+    fitxers = {}
+    for nom in noms:
+        m = pattern.search(nom)
+        if m:
+            fitxers[_period(m)] = os.path.join(directory, nom)
+    return fitxers
+
+
+def discover_files(kind):
+    """{període: ruta} dels fitxers del directori que segueixen el patró del conjunt."""
+    definicio = _DATASETS[kind]
+    return find_period_files(definicio['directory'], definicio['pattern'])
+
+
+def latest_period_file(kind, default=None):
+    """
+    (període, ruta) del fitxer més recent del conjunt, o (None, default) si no n'hi ha cap.
+    Només mira els noms del directori: no parseja res.
+    """
+    fitxers = discover_files(kind)
+    if not fitxers:
+        return None, default
+    periode = max(fitxers)
+    return periode, fitxers[periode]
+
+
+def _read_index():
+    try:
+        with open(INDEX_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _snapshot_dir(kind, period, versio):
+    return os.path.join(STORE_DIR, kind, period, versio)
+
+
+def _write_snapshot(df, desti):
+    """Escriu el DataFrame com a columnes .npy (els textos com a codis de categoria)."""
+    os.makedirs(os.path.dirname(desti), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(desti), prefix='.tmp')
+    try:
+        columnes = []
+        for i, col in enumerate(df.columns):
+            serie = df[col]
+            info = {'name': col, 'file': f'{i}.npy'}
+            if pd.api.types.is_numeric_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+                valors = serie.to_numpy()
+            else:
+                cat = serie.astype(str).astype('category')
+                info['categories'] = list(cat.cat.categories)
+                valors = cat.cat.codes.to_numpy()
+            np.save(os.path.join(tmp, info['file']), valors, allow_pickle=False)
+            columnes.append(info)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'rows': len(df), 'columns': columnes}, f, ensure_ascii=False)
+        if os.path.exists(desti):
+            shutil.rmtree(desti)
+        os.replace(tmp, desti)
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+
+
+def refresh_store(kind):
+    """
+    Incorpora a l'índex els períodes nous o modificats del conjunt 'kind'. Només es
+    parseja el fitxer d'un període quan el seu contingut no té encara instantània.
+    """
+    fitxers = discover_files(kind)
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with file_lock(INDEX_FILE + '.lock'):
+        index = _read_index()
+        periodes = index.setdefault(kind, {})
+        canvis = False
+        for periode, path in fitxers.items():
+            versio = file_digest(path)[:16]
+            entrada = periodes.get(periode)
+            if entrada and entrada['version'] == versio and os.path.isdir(_snapshot_dir(kind, periode, versio)):
+                continue
+            df = _DATASETS[kind]['parser'](path)
+            _write_snapshot(df, _snapshot_dir(kind, periode, versio))
+            historial = (entrada or {}).get('history', [])
+            if entrada and entrada['version'] != versio:
+                historial = historial + [{k: entrada[k] for k in ('version', 'file', 'created')}]
+            periodes[periode] = {'version': versio, 'file': path, 'rows': len(df),
+                                 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                                 'history': historial}
+            canvis = True
+        if canvis:
+            fd, tmp = tempfile.mkstemp(dir=STORE_DIR, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, INDEX_FILE)
+    return index[kind]
+
+
+@lru_cache(maxsize=32)
+def _period_index(kind, versio_fitxers):
+    return refresh_store(kind)
+
+
+def period_index(kind):
+    """Índex {període: entrada} del conjunt, actualitzat si hi ha fitxers nous o canviats."""
+    fitxers = discover_files(kind)
+    return _period_index(kind, dataset_version(*fitxers.values()))
+
+
+def periods(kind):
+    """Períodes disponibles, ordenats del més antic al més recent."""
+    return sorted(period_index(kind))
+
+
+@lru_cache(maxsize=64)
+def _load_snapshot(kind, period, versio):
+    directori = _snapshot_dir(kind, period, versio)
+    with open(os.path.join(directori, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    dades = {}
+    for info in meta['columns']:
+        valors = np.load(os.path.join(directori, info['file']), mmap_mode='r')
+        if 'categories' in info:
+            valors = pd.Categorical.from_codes(valors, info['categories'])
+        dades[info['name']] = valors
+    return pd.DataFrame(dades)
+
+
+def load_snapshot(kind, period):
+    """DataFrame d'un període (de la instantània columnar, sense llegir l'Excel)."""
+    entrada = period_index(kind).get(period)
+    if entrada is None:
+        raise ValueError(f"No hi ha dades del període {period} ({kind}). Disponibles: {', '.join(periods(kind)) or 'cap'}")
+    return _load_snapshot(kind, period, entrada['version'])
+
+
+def previous_period(period, mode):
+    """Període de comparació: el mateix de l'any anterior o el semestre anterior."""
+    any_, _, semestre = period.partition('-S')
+    if mode == MODES[0]:
+        return f"{int(any_) - 1}-S{semestre}" if semestre else str(int(any_) - 1)
+    if not semestre:
+        raise ValueError(f"El període {period} és anual: no té semestre anterior")
+    return f"{any_}-S1" if semestre == '2' else f"{int(any_) - 1}-S2"
+
+
+def compare_periods(kind, periodes, mesura):
+    """
+    Taula d'una mesura per element (claus del conjunt) i període, amb la variació
+    absoluta i percentual de cada període respecte a l'anterior de la llista.
+    """
+    index = period_index(kind)
+    versions = tuple(index[p]['version'] if p in index else None for p in periodes)
+    return _compare(kind, tuple(periodes), mesura, versions).copy()
+
+
+@lru_cache(maxsize=64)
+def _compare(kind, periodes, mesura, versions):
+    definicio = _DATASETS[kind]
+    columnes = []
+    for periode in periodes:
+        df = load_snapshot(kind, periode)
+        agregat = df.groupby(definicio['keys'], observed=True)[mesura].agg(definicio['measures'][mesura])
+        columnes.append(agregat.rename(f"{mesura} {periode}"))
+    taula = pd.concat(columnes, axis=1)
+    for anterior, actual in zip(periodes, periodes[1:]):
+        diferencia = taula[f"{mesura} {actual}"] - taula[f"{mesura} {anterior}"]
+        taula[f"Δ {actual} vs {anterior}"] = diferencia.round(2)
+        taula[f"Δ% {actual} vs {anterior}"] = (100 * diferencia / taula[f"{mesura} {anterior}"]).round(2)
+    return taula.reset_index()
+
+
+register_table_source('comparativa', compare_periods, INDEX_FILE)
+
+
+def run_comparison(kind, mesura, mode, seleccionats=None):
+    """
+    Resol els períodes segons el mode (l'últim disponible contra el seu període anterior,
+    o la selecció de l'usuari) i retorna (opcions de períodes, referència de la taula, estat).
+    """
+    try:
+        disponibles = periods(kind)
+        if not disponibles:
+            return (gr.update(choices=[]), None, f"Error: No s'ha trobat cap fitxer de períodes per a {kind}")
+        if mode == MODES[2]:
+            periodes = sorted(seleccionats or [])
+            if not periodes:
+                return (gr.update(choices=disponibles), None, "Seleccioneu almenys un període")
+        else:
+            actual = disponibles[-1]
+            anterior = previous_period(actual, mode)
+            periodes = [anterior, actual] if anterior in disponibles else [actual]
+        estat = f"Períodes disponibles: {', '.join(disponibles)}. "
+        if len(periodes) == 1:
+            estat += f"Només hi ha dades de {periodes[0]}: es mostra sense comparació."
+        else:
+            estat += f"Comparació de {mesura}: {' → '.join(periodes)}."
+        return (gr.update(choices=disponibles), table_ref('comparativa', kind, tuple(periodes), mesura), estat)
+    except Exception as e:
+        return (gr.update(), None, f"Error durant la comparació: {str(e)}")
+
+
+def measure_choices(kind):
+    """Opcions de mesura d'un tipus de dades (i selecció de períodes buidada)."""
+    mesures = list(_DATASETS[kind]['measures'])
+    return gr.update(choices=mesures, value=mesures[0]), gr.update(choices=[], value=[])
+
+
+run_comparison_async = coalesced(run_comparison)
+measure_choices_async = coalesced(measure_choices)
+
+
+def period_comparison_panel(datasets, label="Comparació entre períodes", api_name=None):
+    """
+    Controls de comparació entre períodes i taula paginada (i exportable) del resultat.
+
+    Parameters:
+    -----------
+    datasets : dict
+        Etiqueta visible -> tipus registrat amb register_dataset.
+    label : str
+        Etiqueta de la taula.
+    api_name : str, optional
+        Nom de l'API de la comparació (conjunt, mesura, mode, períodes); la taula resultant
+        es pagina amb '/<api_name>_page'.
+    """
+    tipus_inicial = next(iter(datasets.values()))
+    with gr.Row():
+        conjunt = gr.Dropdown(list(datasets), value=next(iter(datasets)), label="Dades", scale=1,
+                              visible=len(datasets) > 1)
+        mesura = gr.Dropdown(list(_DATASETS[tipus_inicial]['measures']),
+                             value=next(iter(_DATASETS[tipus_inicial]['measures'])), label="Mesura", scale=1)
+        mode = gr.Radio(MODES, value=MODES[0], label="Comparació", scale=2)
+        seleccionats = gr.Dropdown([], value=[], multiselect=True, label="Períodes", scale=2)
+        btn = gr.Button("Comparar", variant="primary", scale=1)
+    estat = gr.Markdown()
+    ref = paged_table(label, api_name=api_name)
+    export_panel(ref)
+
+    async def canvi_conjunt(etiqueta):
+        return await measure_choices_async(datasets[etiqueta])
+
+    async def comparar(etiqueta, nom_mesura, nom_mode, periodes):
+        return await run_comparison_async(datasets[etiqueta], nom_mesura, nom_mode, periodes)
+
+    conjunt.change(fn=canvi_conjunt, inputs=conjunt, outputs=[mesura, seleccionats], show_api=False)
+    btn.click(fn=comparar, inputs=[conjunt, mesura, mode, seleccionats],
+              outputs=[seleccionats, ref, estat], show_api=False, api_name=api_name)
+    return ref
@@ -3,138 +3,90 @@ import gradio as gr
 import pandas as pd
 import matplotlib.pyplot as plt
 import io
+import os
 import numpy as np
+from concurrency import coalesced, MATPLOTLIB_LOCK, MAX_WORKERS
+from charts import CHART_MODE, CHART_LOCK, CLIENT_CHARTS, bar_plot, line_plot, SORT_BAR_PLOT_JS
+from artifact_cache import disk_cached, versioned_lru_cache, scratch_file, CACHE_DIR
+from paged_table import register_table_source, table_ref, paged_table
+from export_service import export_panel
+from forecast import parse_fmb_monthly, parse_tb_monthly, line_month_table, fit_models, predict, month_dates
+from dataset_store import register_dataset, discover_files, load_snapshot, period_comparison_panel
 
+DIR_DADES = "dataset/Datasets Barcelona"
 
-def parse_data_from_content():
-    """Robust parser: detecta bloques por título, localiza la fila de encabezado y la columna
-    'ACUMULAT', y obtiene el total de cada bloque (última fila numérica).
+# --- Almacén de periodos ---
+# Cada entrega semestral ("... FMB 2025_1er Semestre.xlsx") es un periodo nuevo del almacén
+def fmb_period_table(path):
+    return line_month_table(*parse_fmb_monthly(path))
+
+
+def tb_period_table(path):
+    return line_month_table(*parse_tb_monthly(path))
+
+
+MESURES_LINIES = {'Viatgers': 'sum', 'Viatgers_dia_feiner': 'mean'}
+register_dataset('fmb', DIR_DADES, r'viatgers FMB (?P<any>\d{4})_(?P<semestre>[12])\D* Semestre\.xlsx$',
+                 fmb_period_table, ['Línia'], MESURES_LINIES)
+register_dataset('tb', DIR_DADES, r'viatgers TB (?P<any>\d{4})_(?P<semestre>[12])\D* Semestre\.xlsx$',
+                 tb_period_table, ['Línia'], MESURES_LINIES)
+
+SEMESTRES = {'1': ("1er Semestre", "Enero - Junio"), '2': ("2º Semestre", "Julio - Diciembre")}
+
+
+def _periodo_actual():
     """
+    Periodo más reciente con entrega de metro (FMB) y de bus (TB) en el almacén, con sus
+    ficheros. Se resuelve al arrancar: una entrega nueva se analiza tras reiniciar.
+    """
+    fmb, tb = discover_files('fmb'), discover_files('tb')
+    comunes = sorted(set(fmb) & set(tb))
+    if not comunes:
+        return ("2025-S1",
+                os.path.join(DIR_DADES, "Resum dades mensuals i diàries de viatgers FMB 2025_1er Semestre.xlsx"),
+                os.path.join(DIR_DADES, "Resum dades mensuals i diàries de viatgers TB 2025_1er Semestre.xlsx"))
+    return comunes[-1], fmb[comunes[-1]], tb[comunes[-1]]
 
-    file_path = "dataset/Datasets Barcelona/Resum dades mensuals i diàries de viatgers FMB 2025_1er Semestre.xlsx"
-    import os
-    try:
-        print(f"Intentando abrir el archivo: {file_path}")
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(file_path)
-
-        # Leer la hoja sin headers
-        df = pd.read_excel(file_path, sheet_name='Mensuals', header=None)
-        print(f"Archivo leído. Dimensiones: {df.shape}")
-
-        # Localizar filas título que marcan bloques
-        title_rows = []
-        for idx, row in df.iterrows():
-            for cell in row:
-                if isinstance(cell, str) and 'VIATGERS REALS LÍNIA' in cell.upper():
-                    title_rows.append(idx)
-                    break
-                if isinstance(cell, str) and 'FUNICULAR' == cell.strip().upper():
-                    # Funicular puede estar tratado como bloque independiente
-                    title_rows.append(idx)
-                    break
-
-        if not title_rows:
-            print("No se encontraron bloques de línea en la hoja 'Mensuals'")
-            raise ValueError("No hay bloques detectados")
-
-        lines_data = {}
-
-        # función auxiliar para buscar encabezado y columna ACUMULAT
-        def find_header_and_acumulat(start_idx, look_ahead=12):
-            end = min(start_idx + look_ahead, len(df))
-            for r in range(start_idx, end):
-                row = df.iloc[r]
-                row_text = ' '.join([str(x) for x in row if pd.notna(x)])
-                up = row_text.upper()
-                if 'LÍNIA' in up or 'LINIA' in up:
-                    if 'ACUMULAT' in up:
-                        # localizar índice exacto de ACUMULAT
-                        for col_idx, val in enumerate(row):
-                            if pd.notna(val) and isinstance(val, str) and 'ACUMULAT' in val.upper():
-                                return r, col_idx
-            return None, None
-
-        for i, t_idx in enumerate(title_rows):
-            header_idx, acumulat_col = find_header_and_acumulat(t_idx + 1)
-            block_start = header_idx + 1 if header_idx is not None else t_idx + 1
-            block_end = title_rows[i+1] if i+1 < len(title_rows) else len(df)
-
-            # obtener título original
-            title_cell = df.iloc[t_idx].dropna().values
-            title_text = str(title_cell[0]) if len(title_cell) > 0 else f"LÍNIA_{i+1}"
-            # extraer nombre de línea (desde 'LÍNIA' hasta '(' si existe)
-            up = title_text.upper()
-            if 'LÍNIA' in up:
-                pos = up.find('LÍNIA')
-                line_name = title_text[pos:].split('(')[0].strip()
-            elif 'FUNICULAR' in up:
-                line_name = 'FUNICULAR'
-            else:
-                line_name = title_text
-
-            print(f"\nProcesando bloque '{line_name}': filas {block_start}..{block_end-1}")
-
-            if header_idx is None or acumulat_col is None:
-                print(f"  No se encontró encabezado/columna ACUMULAT para {line_name}; saltando")
-                continue
-
-            print(f"  Encabezado en fila {header_idx}, columna ACUMULAT={acumulat_col}")
-
-            # obtener el total del bloque (última fila con valor numérico en ACUMULAT)
-            total = None
-            total_row = None
-            # buscar de abajo hacia arriba para encontrar el total
-            for ridx in range(block_end - 1, block_start - 1, -1):
-                if ridx >= len(df):
-                    continue
-                raw_val = df.iloc[ridx, acumulat_col] if acumulat_col < len(df.columns) else None
-                if pd.notna(raw_val):
-                    val = pd.to_numeric(raw_val, errors='coerce')
-                    if pd.notna(val):
-                        total = float(val)
-                        total_row = ridx
-                        print(f"  Total encontrado en fila {ridx+1}: {total:,.2f}")
-                        break
-
-            if total is None:
-                print(f"  No se encontró total para {line_name}")
-                continue
-
-            # para debug: mostrar contexto alrededor del total
-            print(f"\n  Contexto alrededor del total (filas {max(total_row-1, 0)+1}..{min(total_row+2, len(df))})")
-            for r in range(max(total_row-1, 0), min(total_row+2, len(df))):
-                row_vals = [str(x) for x in df.iloc[r, max(0, acumulat_col-1):acumulat_col+1] if pd.notna(x)]
-                if row_vals:
-                    print(f"  Fila {r+1}: {' | '.join(row_vals)}")
-
-            print(f"  Total validado para {line_name}: {total:,.2f}")
-            if total > 0:
-                lines_data[line_name] = total
-
-        if lines_data:
-            print("\nTotales detectados por línea:")
-            for k, v in lines_data.items():
-                print(f"  {k}: {v:,.2f}")
-            return lines_data
-
-        print("No se extrajeron totales")
-        return {}
 
-    except Exception as e:
-        print(f"Error procesando Excel: {e}")
-        return {}
+PERIODO_DATOS, FILE_FMB, FILE_TB = _periodo_actual()
+ANY_DADES = int(PERIODO_DATOS[:4])
+_semestre, _meses = SEMESTRES[PERIODO_DATOS.partition('-S')[2]]
+ETIQUETA_PERIODO = f"{_semestre} {ANY_DADES}"
+MESES_PERIODO = f"{_meses} {ANY_DADES}"
+
+
+def line_totals():
+    """
+    Viajeros acumulados por línea del periodo analizado, desde la instantánea del almacén
+    de periodos (suma de los meses; coincide con la columna ACUMULAT del Excel).
+    """
+    df = load_snapshot('fmb', PERIODO_DATOS)
+    totales = df.groupby('Línia', observed=True)['Viatgers'].sum()
+    return {linea: float(total) for linea, total in totales.items() if total > 0}
+
+def get_line_table(sort_order="Descendente"):
+    """Tabla agregada Línea/Viajeros: es todo lo que necesita el gráfico del navegador"""
+    data = line_totals()
+    df = pd.DataFrame(list(data.items()), columns=['Línea', 'Viajeros'])
+    return df.sort_values('Viajeros', ascending=(sort_order == "Ascendente")).reset_index(drop=True)
+
+def _temp_png():
+    """
+    Archivo PNG con nombre único (peticiones simultáneas y workers no se pisan el gráfico)
+    en el directorio temporal del dashboard, que borra los ficheros antiguos
+    """
+    return scratch_file("chart_", ".png")
 
 def create_bar_chart(sort_order="Descendente"):
-    """Create a bar chart of lines by passenger volume"""
+    """Create a bar chart of lines by passenger volume (matplotlib: modo servidor y exportación)"""
     try:
-        data = parse_data_from_content()
+        data = line_totals()
         
         print("Datos para el gráfico:", data)  # Debug
         
         # Check if data is empty
         if not data:
-            temp_file = "temp_chart.png"
+            temp_file = _temp_png()
             plt.figure(figsize=(10, 6))
             plt.text(0.5, 0.5, 'No hay datos disponibles para mostrar', ha='center', va='center', 
                     transform=plt.gca().transAxes, fontsize=14, color='red')
@@ -158,7 +110,7 @@ def create_bar_chart(sort_order="Descendente"):
         bars = plt.bar(df['Línea'], df['Viajeros'], color=colors, edgecolor='black', alpha=0.8)
         
         # Customize the plot
-        plt.title('Líneas de Metro por Número de Viajeros - 1er Semestre 2025', 
+        plt.title(f'Líneas de Metro por Número de Viajeros - {ETIQUETA_PERIODO}', 
                  fontsize=16, fontweight='bold', pad=20)
         plt.xlabel('Líneas', fontsize=12, fontweight='bold')
         plt.ylabel('Total de Viajeros Acumulados', fontsize=12, fontweight='bold')
@@ -179,7 +131,7 @@ def create_bar_chart(sort_order="Descendente"):
         plt.tight_layout()
         
         # Save plot to a temporary file
-        temp_file = "temp_chart.png"
+        temp_file = _temp_png()
         plt.savefig(temp_file, format='png', dpi=100, bbox_inches='tight')
         plt.close()
         
@@ -188,7 +140,7 @@ def create_bar_chart(sort_order="Descendente"):
     except Exception as e:
         print(f"Error creating chart: {e}")
         # Save error message as image
-        temp_file = "temp_chart.png"
+        temp_file = _temp_png()
         plt.figure(figsize=(10, 6))
         plt.text(0.5, 0.5, f'Error: {e}', ha='center', va='center', transform=plt.gca().transAxes, fontsize=12)
         plt.axis('off')
@@ -199,7 +151,7 @@ def create_bar_chart(sort_order="Descendente"):
 def generate_analysis():
     """Generate analysis text based on real data"""
     try:
-        data = parse_data_from_content()
+        data = line_totals()
         
         # Check if data is empty
         if not data:
@@ -218,7 +170,7 @@ def generate_analysis():
         third_line = df_sorted.iloc[2]
         
         analysis = f"""
-# 📊 ANÁLISIS DE DEMANDA POR LÍNEA - 1er Semestre 2025
+# 📊 ANÁLISIS DE DEMANDA POR LÍNEA - {ETIQUETA_PERIODO}
 
 ## Resumen General
 **Total de viajeros en todas las líneas:** {total_passengers:,.0f}
@@ -256,18 +208,127 @@ def generate_analysis():
     except Exception as e:
         return f"**Error en el análisis:** {str(e)}"
 
+@disk_cached(FILE_FMB, version=f"{CHART_MODE}-{PERIODO_DATOS}")
 def update_dashboard(sort_order):
     """Update the dashboard with new sort order"""
     print(f"Actualizando dashboard con orden: {sort_order}")  # Debug
-    chart = create_bar_chart(sort_order)
+    # En modo cliente solo se envía la tabla; el navegador dibuja y ordena el gráfico
+    chart = get_line_table(sort_order) if CLIENT_CHARTS else create_bar_chart(sort_order)
     analysis = generate_analysis()
     return chart, analysis
 
+# --- Previsión de demanda (metro FMB + bus TB) ---
+@versioned_lru_cache(FILE_FMB, FILE_TB)
+@disk_cached(FILE_FMB, FILE_TB, version=PERIODO_DATOS)
+def forecast_models():
+    """
+    Parámetros ajustados de todas las líneas de metro y bus a la vez (forecast.py).
+    Se calculan una vez por versión de los ficheros; la previsión sale de aquí en milisegundos.
+    """
+    noms_fmb, M_fmb, D_fmb = parse_fmb_monthly(FILE_FMB)
+    noms_tb, M_tb, D_tb = parse_tb_monthly(FILE_TB)
+    params = fit_models(np.vstack([M_fmb, M_tb]), np.vstack([D_fmb, D_tb]), ANY_DADES)
+    params['noms'] = np.array(noms_fmb + noms_tb)
+    params['xarxa'] = np.array(['Metro'] * len(noms_fmb) + ['Bus'] * len(noms_tb))
+    return params
+
+
+@versioned_lru_cache(FILE_FMB, FILE_TB, maxsize=16)
+def forecast_table(horitzo=6):
+    """Previsión mensual de todas las líneas activas (una fila por línea y mes)."""
+    params = forecast_models()
+    mesos, previsio, minim, maxim, diari = predict(params, horitzo)
+    actiu = params['actiu']
+    L = int(actiu.sum())
+    return pd.DataFrame({
+        'Red': np.repeat(params['xarxa'][actiu], horitzo),
+        'Línea': np.repeat(params['noms'][actiu], horitzo),
+        'Mes': np.tile(month_dates(ANY_DADES, mesos).strftime('%Y-%m'), L),
+        'Viajeros_previstos': previsio[actiu].round().ravel(),
+        'Mínimo_95': minim[actiu].round().ravel(),
+        'Máximo_95': maxim[actiu].round().ravel(),
+        'Viajeros_día_laborable': diari[actiu].round().ravel(),
+    })
+
+
+register_table_source('forecast', forecast_table, FILE_FMB, FILE_TB)
+
+
+def forecast_line_chart(linia, horitzo=6):
+    """Serie real y previsión (con el intervalo del 95%) de una línea."""
+    params = forecast_models()
+    i = int(np.flatnonzero(params['noms'] == linia)[0])
+    mesos, previsio, minim, maxim, _ = predict(params, horitzo)
+    observats = np.flatnonzero(np.isfinite(params['M'][i]))
+    series = [
+        ('Real', observats, params['M'][i, observats]),
+        ('Previsión', mesos, previsio[i]),
+        ('Mínimo (95%)', mesos, minim[i]),
+        ('Máximo (95%)', mesos, maxim[i]),
+    ]
+    df = pd.concat([pd.DataFrame({'Mes': month_dates(ANY_DADES, m), 'Viajeros': v.round(), 'Serie': nom})
+                    for nom, m, v in series], ignore_index=True)
+    if CLIENT_CHARTS:
+        return df
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(month_dates(ANY_DADES, observats), params['M'][i, observats], marker='o', label='Real')
+    ax.plot(month_dates(ANY_DADES, mesos), previsio[i], marker='o', linestyle='--', label='Previsión')
+    ax.fill_between(month_dates(ANY_DADES, mesos), minim[i], maxim[i], alpha=0.2, label='Intervalo 95%')
+    ax.set_title(f'Previsión de viajeros mensuales - {linia}', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Viajeros')
+    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}'))
+    ax.grid(alpha=0.3, linestyle='--')
+    ax.legend()
+    plt.tight_layout()
+    return fig
+
+
+def update_forecast(linia=None, horitzo=6):
+    """Gráfico de la línea seleccionada y referencia a la tabla de previsión de todas las líneas."""
+    try:
+        params = forecast_models()
+        horitzo = int(horitzo or 6)
+        actives = list(params['noms'][params['actiu']])
+        if linia not in actives:
+            linia = actives[0]
+        inactives = int((~params['actiu']).sum())
+        estat = (f"Previsión de {len(actives)} líneas para los próximos {horitzo} meses "
+                 f"(intervalos de predicción del 95%).")
+        if inactives:
+            estat += f" {inactives} líneas sin previsión: sin servicio el último mes o con menos de 3 meses de datos."
+        return (gr.update(choices=actives, value=linia), forecast_line_chart(linia, horitzo),
+                table_ref('forecast', horitzo), estat)
+    except Exception as e:
+        return (gr.update(), None, None, f"**Error en la previsión:** {str(e)}")
+
+
+# Punt d'entrada async: el càlcul es fa en un fil i les peticions idèntiques en curs es fusionen
+update_dashboard_async = coalesced(update_dashboard, FILE_FMB, lock=CHART_LOCK)
+update_forecast_async = coalesced(update_forecast, FILE_FMB, FILE_TB, lock=CHART_LOCK)
+# Exportació del gràfic com a PNG amb matplotlib (informe estàtic)
+export_bar_chart_async = coalesced(create_bar_chart, FILE_FMB, lock=MATPLOTLIB_LOCK)
+
+
+def connect_sort(sort_dropdown, chart_output, analysis_output):
+    """
+    Canvi d'ordre: en mode client s'executa al navegador (només JavaScript, sense petició);
+    amb matplotlib torna a generar la imatge al servidor.
+    """
+    if CLIENT_CHARTS:
+        sort_dropdown.change(fn=None, inputs=sort_dropdown, outputs=chart_output, js=SORT_BAR_PLOT_JS)
+    else:
+        sort_dropdown.change(
+            fn=update_dashboard_async,
+            inputs=sort_dropdown,
+            outputs=[chart_output, analysis_output]
+        )
+
 # Create the Gradio interface
 with gr.Blocks(title="Dashboard de Análisis de Demanda - Metro Barcelona", theme=gr.themes.Soft()) as dashboard:
-    gr.Markdown("""
+    gr.Markdown(f"""
     # 🚇 Dashboard de Análisis de Demanda - Metro Barcelona
-    ### Visualización de líneas por volumen de viajeros - 1er Semestre 2025
+    ### Visualización de líneas por volumen de viajeros - {ETIQUETA_PERIODO}
     *Datos reales extraídos del archivo Excel proporcionado*
     """)
     
@@ -281,7 +342,7 @@ with gr.Blocks(title="Dashboard de Análisis de Demanda - Metro Barcelona", them
             )
             
             gr.Markdown("### 📋 Líneas Analizadas")
-            gr.Markdown("""
+            gr.Markdown(f"""
             - Línea 1
             - Línea 2  
             - Línea 3
@@ -292,52 +353,41 @@ with gr.Blocks(title="Dashboard de Análisis de Demanda - Metro Barcelona", them
             - Línea 11
             - Funicular
             
-            **Período:** Enero - Junio 2025
+            **Período:** {MESES_PERIODO}
             **Fuente:** Datos mensuales acumulados
             """)
             
         with gr.Column(scale=2):
             with gr.Row():
-                chart_output = gr.Image(label="📊 Gráfico de Líneas por Demanda", height=500)
+                chart_output = bar_plot("📊 Gráfico de Líneas por Demanda", "Línea", "Viajeros", sort="-y", height=500,
+                                        y_title="Total de Viajeros Acumulados",
+                                        fallback=gr.Image, fallback_kwargs={"height": 500})
             
             with gr.Row():
                 analysis_output = gr.Markdown(label="📈 Análisis Detallado")
     
     # Set up the interaction
-    sort_dropdown.change(
-        fn=update_dashboard,
-        inputs=sort_dropdown,
-        outputs=[chart_output, analysis_output]
-    )
+    connect_sort(sort_dropdown, chart_output, analysis_output)
     
     # Initial load
     dashboard.load(
-        fn=lambda: update_dashboard("Descendente"),
-        outputs=[chart_output, analysis_output]
+        fn=update_dashboard_async,
+        inputs=sort_dropdown,
+        outputs=[chart_output, analysis_output],
+        api_name="initial_load"
     )
 
 # Launch the dashboard
 if __name__ == "__main__":
-    # Test data parsing
-    print("=== INICIO DEBUG ===")
-    data = parse_data_from_content()
-    print("\nDatos parseados:")
-    for line, passengers in data.items():
-        print(f"  {line}: {passengers:,.2f} viajeros")
-    
-    if data:
-        total = sum(data.values())
-        print(f"\nTotal viajeros: {total:,.2f}")
-    print("=== FIN DEBUG ===")
-    
-    dashboard.launch(share=False)
+    dashboard.queue(default_concurrency_limit=MAX_WORKERS)
+    dashboard.launch(share=False, allowed_paths=[CACHE_DIR])
 
 def build_demanda_tab(parent_blocks=None):
     """Devuelve el bloque (tab) de análisis de demanda."""
     with gr.Tab("🚇 Demanda Metro Barcelona"):
-        gr.Markdown("""
+        gr.Markdown(f"""
         # 🚇 Dashboard de Análisis de Demanda - Metro Barcelona
-        ### Visualización de líneas por volumen de viajeros - 1er Semestre 2025
+        ### Visualización de líneas por volumen de viajeros - {ETIQUETA_PERIODO}
         *Datos reales extraídos del archivo Excel proporcionado*
         """)
         
@@ -351,7 +401,7 @@ def build_demanda_tab(parent_blocks=None):
                 )
                 
                 gr.Markdown("### 📋 Líneas Analizadas")
-                gr.Markdown("""
+                gr.Markdown(f"""
                 - Línea 1
                 - Línea 2  
                 - Línea 3
@@ -362,33 +412,72 @@ def build_demanda_tab(parent_blocks=None):
                 - Línea 11
                 - Funicular
                 
-                **Período:** Enero - Junio 2025  
+                **Período:** {MESES_PERIODO}  
                 **Fuente:** Datos mensuales acumulados
                 """)
+
+                # Informe estático del gráfico (matplotlib), solo necesario en modo cliente
+                if CLIENT_CHARTS:
+                    export_button = gr.Button("📥 Exportar gráfico (PNG)")
+                    export_file = gr.File(label="Gráfico exportado")
                 
             with gr.Column(scale=2):
                 with gr.Row():
-                    chart_output = gr.Image(label="📊 Gráfico de Líneas por Demanda", height=500)
+                    chart_output = bar_plot("📊 Gráfico de Líneas por Demanda", "Línea", "Viajeros", sort="-y", height=500,
+                                            y_title="Total de Viajeros Acumulados",
+                                            fallback=gr.Image, fallback_kwargs={"height": 500})
                 
                 with gr.Row():
                     analysis_output = gr.Markdown(label="📈 Análisis Detallado")
         
+        # Previsión de demanda de todas las líneas (metro y bus)
+        gr.Markdown("""
+        ## 🔮 Previsión de demanda por línea
+        Modelo estacional ajustado a la vez para todas las líneas de metro (FMB) y bus (TB): tendencia de los
+        viajeros por día laborable y calendario de laborables, fines de semana y festivos de cada mes.
+        """)
+        with gr.Row():
+            forecast_line = gr.Dropdown([], label="Línea", scale=2)
+            forecast_horizon = gr.Slider(1, 12, value=6, step=1, label="Meses a prever", scale=2)
+            forecast_button = gr.Button("Calcular previsión", variant="primary", scale=1)
+        forecast_status = gr.Markdown()
+        forecast_chart = line_plot("📈 Viajeros mensuales: real y previsión", "Mes", "Viajeros", color="Serie",
+                                   height=400)
+        forecast_ref = paged_table("Previsión por línea y mes")
+        export_panel(forecast_ref)
+
+        # Comparativa entre periodos (semestres de cada entrega de datos)
+        gr.Markdown("""
+        ## 📅 Comparativa entre periodos
+        Interanual (mismo semestre del año anterior), semestre anterior o los periodos que elijas. Cada
+        fichero semestral se lee una sola vez y se guarda en el almacén de periodos.
+        """)
+        period_comparison_panel({"Metro (FMB)": "fmb", "Bus (TB)": "tb"}, "Comparativa por línea",
+                                api_name="compare_demanda")
+
         # Interacciones
-        sort_dropdown.change(
-            fn=update_dashboard,
-            inputs=sort_dropdown,
-            outputs=[chart_output, analysis_output]
-        )
+        connect_sort(sort_dropdown, chart_output, analysis_output)
+        forecast_outputs = [forecast_line, forecast_chart, forecast_ref, forecast_status]
+        forecast_button.click(fn=update_forecast_async, inputs=[forecast_line, forecast_horizon],
+                              outputs=forecast_outputs, api_name="forecast")
+        forecast_line.input(fn=update_forecast_async, inputs=[forecast_line, forecast_horizon],
+                            outputs=forecast_outputs, show_api=False)
+        if CLIENT_CHARTS:
+            export_button.click(fn=export_bar_chart_async, inputs=sort_dropdown, outputs=export_file,
+                                api_name="export_bar_chart")
         
         # Carga inicial
         if parent_blocks:
             parent_blocks.load(
-                fn=lambda: update_dashboard("Descendente"),
-                outputs=[chart_output, analysis_output]
+                fn=update_dashboard_async,
+                inputs=sort_dropdown,
+                outputs=[chart_output, analysis_output],
+                api_name="initial_load"
             )
 
 # Solo lanza el dashboard si este script se ejecuta directamente
 if __name__ == "__main__":
     with gr.Blocks(theme=gr.themes.Soft(), title="Dashboard de Análisis de Demanda") as dashboard:
         build_demanda_tab()
-    dashboard.launch(share=False)
\ No newline at end of file
+    dashboard.queue(default_concurrency_limit=MAX_WORKERS)
+    dashboard.launch(share=False, allowed_paths=[CACHE_DIR])
\ No newline at end of file
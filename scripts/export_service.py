@@ -0,0 +1,208 @@
+import gzip
+import os
+import tempfile
+
+import gradio as gr
+import numpy as np
+import openpyxl
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet és opcional
+    pa = pq = None
+
+from artifact_cache import CACHE_DIR, CACHE_ENABLED, artifact_key, evict_files, file_lock
+from concurrency import coalesced
+from paged_table import load_table, table_paths
+
+# --- Servei d'exportació ---
+# Els fitxers es generen només quan algú demana la descàrrega, a partir de la mateixa
+# referència de taula que la taula paginada. La taula d'origen és la que ja és a la caché
+# de la font (la mateixa que pagina la taula); l'exportació no en fa cap còpia sencera:
+# les columnes i el rang es tallen bloc a bloc de CHUNK_ROWS files mentre s'escriu, i el
+# fitxer de sortida (text CSV, files d'XLSX) tampoc es construeix sencer en memòria.
+# Es desen per versió de dades, format, columnes i rang: una segona descàrrega igual ja
+# no recalcula res. El directori s'esborra per edat i per mida total (els més antics primer).
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+EXPORT_MAX_AGE = int(os.environ.get("DASHBOARD_EXPORT_MAX_AGE", str(24 * 3600)))
+EXPORT_MAX_BYTES = int(float(os.environ.get("DASHBOARD_EXPORT_MAX_MB", "500")) * 1024 ** 2)
+CHUNK_ROWS = 10_000
+XLSX_MAX_ROWS = 1_048_575  # límit d'Excel, sense la capçalera
+
+FORMATS = {
+    "CSV": ".csv",
+    "CSV (gzip)": ".csv.gz",
+    "XLSX": ".xlsx",
+}
+if pq is not None:
+    FORMATS["Parquet"] = ".parquet"
+
+
+class Selection:
+    """
+    Columnes i rang de files d'una taula, sense copiar-la: 'chunks()' en talla un bloc
+    de CHUNK_ROWS files cada vegada.
+    """
+
+    def __init__(self, df, columns, start, stop):
+        self.df = df
+        self.columns = list(columns)
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def chunks(self):
+        for inici in range(self.start, self.stop, CHUNK_ROWS):
+            yield self.df.iloc[inici:min(inici + CHUNK_ROWS, self.stop)][self.columns]
+
+    def empty(self):
+        """DataFrame buit amb les columnes i tipus de la selecció (per a la capçalera)."""
+        return self.df.iloc[:0][self.columns]
+
+
+def _write_csv(sel, f):
+    sel.empty().to_csv(f, index=False)
+    for bloc in sel.chunks():
+        bloc.to_csv(f, index=False, header=False)
+
+
+def write_csv(sel, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        _write_csv(sel, f)
+
+
+def write_csv_gzip(sel, path):
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        _write_csv(sel, f)
+
+
+def write_xlsx(sel, path):
+    if len(sel) > XLSX_MAX_ROWS:
+        raise ValueError(f"XLSX admet com a màxim {XLSX_MAX_ROWS:,} files; seleccioneu un rang més petit")
+    # Mode 'write_only': les files van directament al fitxer, sense construir el full en memòria
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title="Dades")
+    ws.append([str(c) for c in sel.columns])
+    for bloc in sel.chunks():
+        bloc = bloc.replace([np.inf, -np.inf], np.nan).astype(object)
+        for fila in bloc.where(bloc.notna(), None).itertuples(index=False, name=None):
+            ws.append(fila)
+    wb.save(path)
+
+
+def write_parquet(sel, path):
+    writer = None
+    try:
+        for bloc in sel.chunks() if len(sel) else [sel.empty()]:
+            taula = pa.Table.from_pandas(bloc, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, taula.schema)
+            writer.write_table(taula)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {
+    "CSV": write_csv,
+    "CSV (gzip)": write_csv_gzip,
+    "XLSX": write_xlsx,
+    "Parquet": write_parquet,
+}
+
+
+def select_rows(df, columns, row_from, row_to):
+    """
+    Selecció de columnes (totes si no se n'indica cap) i rang de files 1-based inclusiu.
+    Un rang que comença després de l'última fila o que és buit és un error; el final
+    es limita a l'última fila.
+    """
+    desconegudes = [c for c in columns if c not in df.columns]
+    if desconegudes:
+        raise ValueError(f"Columnes desconegudes: {', '.join(desconegudes)}")
+    inici = int(row_from or 1)
+    final = min(int(row_to), len(df)) if row_to else len(df)
+    if inici < 1:
+        raise ValueError("La primera fila és la 1")
+    if inici > len(df):
+        raise ValueError(f"La fila inicial ({inici:,}) és posterior a l'última fila de la taula ({len(df):,})")
+    if final < inici:
+        raise ValueError("El rang de files és buit")
+    return Selection(df, columns or df.columns, inici - 1, final)
+
+
+def export_table(ref, fmt="CSV", columns=None, row_from=None, row_to=None):
+    """
+    Genera (o reutilitza) l'exportació d'una taula i retorna (ruta del fitxer, estat).
+
+    Treballa sobre el DataFrame de load_table (en caché) i n'escriu la selecció per blocs
+    de CHUNK_ROWS files. Cada exportació nova esborra les antigues que superen
+    EXPORT_MAX_AGE o EXPORT_MAX_BYTES.
+    """
+    if not ref:
+        return (None, "Error: Primer executeu l'anàlisi")
+    if fmt not in FORMATS:
+        if fmt == "Parquet":
+            return (None, "Error: Per exportar a Parquet cal instal·lar pyarrow (pip install pyarrow)")
+        return (None, f"Error: Format desconegut: {fmt}")
+
+    columns = tuple(columns or ())
+    rang = (int(row_from) if row_from else None, int(row_to) if row_to else None)
+    key = artifact_key(f"export.{ref['source']}", (ref['args'], fmt, columns, rang), {}, table_paths(ref))
+    path = os.path.join(EXPORT_DIR, f"{ref['source']}_{key[:16]}{FORMATS[fmt]}")
+
+    try:
+        with file_lock(path + '.lock'):
+            if CACHE_ENABLED and os.path.exists(path):
+                # Es marca com a usat perquè l'esborrat per mida comença pels més antics
+                os.utime(path)
+                return (path, f"Exportació {fmt} servida des de la caché.")
+            sel = select_rows(load_table(ref), columns, *rang)
+            fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, suffix='.tmp')
+            os.close(fd)
+            try:
+                WRITERS[fmt](sel, tmp)
+                # Es fa lloc per al fitxer nou (els '.tmp' en curs d'altres peticions no es toquen)
+                evict_files(EXPORT_DIR, EXPORT_MAX_AGE, max(EXPORT_MAX_BYTES - os.path.getsize(tmp), 0),
+                            skip=('.lock', '.tmp'))
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+    except Exception as e:
+        return (None, f"Error durant l'exportació: {str(e)}")
+    return (path, f"Exportades {len(sel):,} files i {len(sel.columns)} columnes en format {fmt}.")
+
+
+def export_columns(ref):
+    """Opcions del selector de columnes per a la taula de la referència."""
+    return gr.update(choices=list(load_table(ref).columns) if ref else [], value=[])
+
+
+export_table_async = coalesced(export_table)
+export_columns_async = coalesced(export_columns)
+
+
+def export_panel(ref, api_name=None):
+    """
+    Controls d'exportació (format, columnes i rang de files) per a la taula de la
+    referència 'ref' (el gr.State que retorna paged_table). Amb 'api_name' l'exportació
+    es pot cridar per l'API amb (format, columnes, des de, fins a).
+    """
+    with gr.Accordion("📥 Exportar dades", open=False):
+        with gr.Row():
+            fmt = gr.Dropdown(list(FORMATS), value="CSV", label="Format", scale=1)
+            columns = gr.Dropdown([], value=[], multiselect=True, label="Columnes (totes si és buit)", scale=3)
+        with gr.Row():
+            row_from = gr.Number(value=None, precision=0, minimum=1, label="Des de la fila")
+            row_to = gr.Number(value=None, precision=0, minimum=1, label="Fins a la fila")
+            btn_export = gr.Button("Exportar", variant="secondary")
+        export_file = gr.File(label="Fitxer exportat")
+        status = gr.Markdown()
+
+    ref.change(fn=export_columns_async, inputs=ref, outputs=columns, show_api=False)
+    btn_export.click(fn=export_table_async, inputs=[ref, fmt, columns, row_from, row_to],
+                     outputs=[export_file, status], show_api=False, api_name=api_name)
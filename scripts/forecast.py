@@ -0,0 +1,197 @@
+import datetime
+import re
+
+import numpy as np
+import pandas as pd
+
+# --- Previsió de demanda per línia ---
+# Model estacional senzill, ajustat alhora per a totes les línies sobre una matriu
+# línies × mesos (NaN on no hi ha dada):
+#   viatgers/dia feiner:  log D[l, t] = a_l + b_l·t  (tendència de cada línia)
+#   viatgers del mes:     M[l, t] = D[l, t] · (feiners_t + w_l · no_feiners_t)
+# L'estacionalitat ve del calendari (feiners, caps de setmana i festius de cada mes) i
+# w_l és el pes d'un dia no feiner respecte a un feiner per a cada línia. Amb un sol
+# semestre de dades no es poden estimar factors anuals per mes.
+MESOS = ['GENER', 'FEBRER', 'MARÇ', 'ABRIL', 'MAIG', 'JUNY',
+         'JULIOL', 'AGOST', 'SETEMBRE', 'OCTUBRE', 'NOVEMBRE', 'DESEMBRE']
+
+# Festius de data fixa a Barcelona (mes, dia); Divendres Sant, Dilluns de Pasqua i la
+# Segona Pasqua depenen de Pasqua
+FESTIUS_FIXOS = [(1, 1), (1, 6), (5, 1), (6, 24), (8, 15), (9, 11), (9, 24),
+                 (10, 12), (11, 1), (12, 6), (12, 8), (12, 25), (12, 26)]
+
+MIN_MESOS = 3  # mesos amb dades necessaris per ajustar la tendència d'una línia
+
+# Quantil 0.975 de la t de Student per graus de llibertat (1..10); a partir d'aquí ~normal
+T_975 = np.array([np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228])
+
+
+def _pasqua(any_):
+    """Diumenge de Pasqua (algorisme gregorià anònim)."""
+    a, b, c = any_ % 19, any_ // 100, any_ % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(any_, mes, dia + 1)
+
+
+def festius(any_):
+    """Festius laborables de Barcelona d'un any (com a np.datetime64[D])."""
+    pasqua = _pasqua(any_)
+    dies = [datetime.date(any_, mes, dia) for mes, dia in FESTIUS_FIXOS]
+    dies += [pasqua + datetime.timedelta(days=d) for d in (-2, 1, 50)]
+    return np.array(sorted(dies), dtype='datetime64[D]')
+
+
+def calendar_days(any_inicial, mesos):
+    """
+    (feiners, no feiners) de cada mes; 'mesos' són índexs des del gener de 'any_inicial'
+    (12 és el gener de l'any següent).
+    """
+    mesos = np.asarray(mesos)
+    anys = any_inicial + mesos // 12
+    inicis = np.array([f'{a}-{m + 1:02d}' for a, m in zip(anys, mesos % 12)], dtype='datetime64[M]')
+    inicis_d = inicis.astype('datetime64[D]')
+    finals_d = (inicis + 1).astype('datetime64[D]')
+    hol = np.concatenate([festius(a) for a in np.unique(anys)])
+    feiners = np.busday_count(inicis_d, finals_d, holidays=hol)
+    totals = (finals_d - inicis_d).astype(int)
+    return feiners.astype(float), (totals - feiners).astype(float)
+
+
+def _to_float(valors):
+    valors = pd.to_numeric(pd.Series(valors), errors='coerce').to_numpy(dtype=float)
+    # Els mesos encara no publicats surten com a 0 o buits
+    valors[~(valors > 0)] = np.nan
+    return valors
+
+
+def _fmb_totals(df):
+    """Fila TOTAL de cada bloc de línia d'un full de l'FMB: {línia: 12 valors}."""
+    totals, linia = {}, None
+    for fila in df.itertuples(index=False):
+        etiqueta = fila[1]
+        if isinstance(etiqueta, str) and isinstance(fila[3], str) and fila[3].strip().upper() == MESOS[0]:
+            linia = re.sub(r'\s+', ' ', etiqueta).strip().upper()
+        elif isinstance(etiqueta, str) and etiqueta.strip().upper() == 'TOTAL' and linia:
+            totals[linia] = _to_float(fila[3:15])
+            linia = None
+    return totals
+
+
+def parse_fmb_monthly(path):
+    """
+    Viatgers mensuals i viatgers/dia feiner de cada línia de metro (i funicular) de l'FMB.
+    Retorna (noms, M, D) amb M i D de forma (línies, 12).
+    """
+    mensuals = _fmb_totals(pd.read_excel(path, sheet_name='Mensuals', header=None))
+    feiners = _fmb_totals(pd.read_excel(path, sheet_name='Feiners', header=None))
+    noms = [nom for nom in mensuals if nom in feiners]
+    return (noms, np.array([mensuals[n] for n in noms]).reshape(-1, 12),
+            np.array([feiners[n] for n in noms]).reshape(-1, 12))
+
+
+def parse_tb_monthly(path):
+    """
+    Viatgers mensuals i viatgers/dia feiner de cada línia de bus de TB.
+    El full té, per a cada mes, les columnes 'TOTAL MENSUAL' i 'V/D FEINERS'.
+    """
+    df = pd.read_excel(path, header=None)
+    capcalera = df.index[df[1].astype(str).str.strip().str.upper() == 'LÍNIES'][0]
+    files = df.iloc[capcalera + 1:]
+    files = files[files[1].notna() & (files[1].astype(str).str.strip().str.upper() != 'TOTAL')]
+    noms = ['BUS ' + str(v).strip() for v in files[1]]
+    M = np.array([_to_float(fila) for fila in files.iloc[:, 2:26:2].to_numpy()]).reshape(-1, 12)
+    D = np.array([_to_float(fila) for fila in files.iloc[:, 3:27:2].to_numpy()]).reshape(-1, 12)
+    return noms, M, D
+
+
+def line_month_table(noms, M, D):
+    """Format llarg (una fila per línia i mes amb dades) de les matrius de parse_*_monthly."""
+    linies, mesos = np.nonzero(np.isfinite(M))
+    return pd.DataFrame({
+        'Línia': np.asarray(noms)[linies],
+        'Mes': (mesos + 1).astype('int8'),
+        'Viatgers': M[linies, mesos],
+        'Viatgers_dia_feiner': D[linies, mesos],
+    })
+
+
+def fit_models(M, D, any_dades):
+    """
+    Ajusta el model de totes les línies alhora (operacions vectoritzades sobre la matriu
+    línies × mesos, sense cap bucle per línia).
+
+    Retorna un diccionari amb els paràmetres per línia (a, b, sigma, w), les estadístiques
+    necessàries per als intervals i 'actiu' (línies amb prou dades i servei l'últim mes).
+    Si cap línia no té cap mes observat, 'ultim_mes' és -1 i cap línia no és activa.
+    """
+    L, T = M.shape
+    t = np.arange(T, dtype=float)
+    obs = np.isfinite(M) & np.isfinite(D)
+    m = obs.astype(float)
+    n = m.sum(axis=1)
+    y = np.where(obs, np.log(np.where(obs, D, 1.0)), 0.0)
+
+    # Mínims quadrats amb màscara: log D = a + b·t
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mitja = (m * t).sum(axis=1) / n
+        dt = (t - t_mitja[:, None]) * m
+        sxx = (dt ** 2).sum(axis=1)
+        y_mitja = (m * y).sum(axis=1) / n
+        b = np.where(sxx > 0, (dt * (y - y_mitja[:, None])).sum(axis=1) / sxx, 0.0)
+        a = y_mitja - b * t_mitja
+        residus = (y - a[:, None] - b[:, None] * t) * m
+        sigma = np.sqrt((residus ** 2).sum(axis=1) / (n - 2))
+
+        # Pes dels dies no feiners: M/D - feiners = w · no_feiners
+        feiners, no_feiners = calendar_days(any_dades, t.astype(int))
+        r = np.where(obs, M / np.where(obs, D, 1.0) - feiners, 0.0)
+        w = (r * no_feiners * m).sum(axis=1) / (no_feiners ** 2 * m).sum(axis=1)
+
+    mesos_observats = obs.any(axis=0).nonzero()[0]
+    if len(mesos_observats):
+        ultim = mesos_observats.max()
+        actiu = (n >= MIN_MESOS) & obs[:, ultim]
+    else:
+        # Fitxer sense cap valor mensual (p. ex. un període acabat de publicar)
+        ultim = -1
+        actiu = np.zeros(L, dtype=bool)
+    return {
+        'any': any_dades, 'ultim_mes': int(ultim), 'a': a, 'b': b, 'sigma': sigma,
+        'w': np.clip(np.nan_to_num(w), 0.0, 1.5), 'n': n, 't_mitja': t_mitja, 'sxx': sxx,
+        'actiu': actiu, 'M': M,
+    }
+
+
+def predict(params, horitzo=6):
+    """
+    Previsió dels 'horitzo' mesos següents a l'últim mes amb dades, per a totes les línies.
+    Retorna (mesos, previsió, mínim, màxim, viatgers/dia feiner) amb forma (línies, horitzo);
+    els intervals són de predicció al 95%.
+    """
+    mesos = params['ultim_mes'] + 1 + np.arange(horitzo)
+    feiners, no_feiners = calendar_days(params['any'], mesos)
+    n = params['n'][:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_d = params['a'][:, None] + params['b'][:, None] * mesos
+        error = params['sigma'][:, None] * np.sqrt(
+            1 + 1 / n + (mesos - params['t_mitja'][:, None]) ** 2 / params['sxx'][:, None])
+    graus = np.clip(params['n'] - 2, 0, len(T_975) - 1).astype(int)
+    quantil = np.where(params['n'] - 2 >= len(T_975), 1.96, T_975[graus])[:, None]
+
+    dies = feiners + params['w'][:, None] * no_feiners
+    diari = np.exp(log_d)
+    previsio = diari * dies
+    minim = np.exp(log_d - quantil * error) * dies
+    maxim = np.exp(log_d + quantil * error) * dies
+    return mesos, previsio, minim, maxim, diari
+
+
+def month_dates(any_inicial, mesos):
+    """Primer dia de cada mes (índexs des del gener de 'any_inicial') com a Timestamps."""
+    return pd.to_datetime([f'{any_inicial + m // 12}-{m % 12 + 1:02d}-01' for m in np.asarray(mesos)])
@@ -1,15 +1,27 @@
 import gradio as gr
 from demanda_dashboard import build_demanda_tab
 from cobertura_dashboard import build_cobertura_tab
+from catalunya_dashboard import build_catalunya_tab
+from bus_dashboard import build_bus_tab
+from concurrency import MAX_WORKERS
+from artifact_cache import CACHE_DIR, SCRATCH_MAX_AGE
 # from otra_pestaña import build_otra_tab  # si quieres más pestañas
 
-with gr.Blocks(title="📊 Dashboard Global", theme=gr.themes.Soft()) as main_dashboard:
+# delete_cache: Gradio també esborra les còpies que fa dels fitxers retornats (PNG, mapes,
+# exportacions) amb la mateixa edat màxima que el directori temporal del dashboard
+with gr.Blocks(title="📊 Dashboard Global", theme=gr.themes.Soft(),
+               delete_cache=(SCRATCH_MAX_AGE, SCRATCH_MAX_AGE)) as main_dashboard:
     gr.Markdown("# 🧠 Dashboard Global de Análisis de Datos")
     gr.Markdown("Selecciona una pestaña para explorar los diferentes módulos de visualización:")
 
     with gr.Tabs():
         build_demanda_tab(main_dashboard)          # Pestaña 1: Demanda Metro Barcelona
         build_cobertura_tab(main_dashboard)        # Pestaña 2: Cobertura de Transport
+        build_catalunya_tab(main_dashboard)        # Pestaña 3: Demanda Catalunya (FGC + bus interurbà)
+        build_bus_tab(main_dashboard)              # Pestaña 4: Cobertura de Bus (join espacial)
         #build_otra_tab()
 
-main_dashboard.launch()
+# La cua de Gradio limita per defecte cada event a 1 execució simultània;
+# l'alineem amb el pool de fils perquè els handlers async puguin solapar-se
+main_dashboard.queue(default_concurrency_limit=MAX_WORKERS)
+main_dashboard.launch(allowed_paths=[CACHE_DIR])
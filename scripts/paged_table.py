@@ -0,0 +1,197 @@
+import re
+from functools import lru_cache
+
+import gradio as gr
+import numpy as np
+import pandas as pd
+
+from concurrency import coalesced, dataset_version
+
+# --- Taules paginades al servidor ---
+# Els handlers no envien el DataFrame complet al navegador: retornen una referència
+# (font registrada + arguments) que es guarda a la sessió. Cada canvi de pàgina, ordre o
+# filtre es resol aquí sobre el resultat en caché i només viatja la part visible.
+PAGE_SIZE = 25
+
+ORDRES = ["Descendent", "Ascendent"]
+
+# nom -> (funció que retorna el DataFrame complet, fitxers de dades dels quals depèn)
+_SOURCES = {}
+
+# "columna operador valor", separats per ';' (p. ex. "Població > 20000; Nom_Districte ~ eixample")
+FILTRE_RE = re.compile(r'^\s*(.+?)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$')
+
+
+def register_table_source(name, fn, *paths):
+    """
+    Registra una font de taula paginada.
+
+    Parameters:
+    -----------
+    name : str
+        Nom de la font (el que es guarda a la referència).
+    fn : callable
+        Retorna el DataFrame complet; ha d'estar en caché (versioned_lru_cache /
+        disk_cached), perquè es crida a cada pàgina, i la caché ha de seguir la versió
+        dels fitxers 'paths'.
+    *paths : str
+        Fitxers de dades de la font: la seva versió invalida els índexs d'ordre i filtre.
+    """
+    _SOURCES[name] = (fn, paths)
+
+
+def table_ref(name, *args):
+    """Referència a una taula registrada: és el que retornen els handlers en lloc del DataFrame."""
+    return {'source': name, 'args': tuple(args)}
+
+
+def _load(ref):
+    fn, paths = _SOURCES[ref['source']]
+    return fn(*ref['args']), dataset_version(*paths)
+
+
+def load_table(ref):
+    """DataFrame complet (en caché) d'una referència."""
+    return _load(ref)[0]
+
+
+def table_paths(ref):
+    """Fitxers de dades dels quals depèn la taula d'una referència."""
+    return _SOURCES[ref['source']][1]
+
+
+def parse_filters(text, columns):
+    """Converteix el text de filtres en una tupla de (columna, operador, valor)."""
+    per_nom = {c.lower(): c for c in columns}
+    filtres = []
+    for part in (text or '').split(';'):
+        if not part.strip():
+            continue
+        m = FILTRE_RE.match(part)
+        if not m or m.group(1).lower() not in per_nom:
+            raise ValueError(f"Filtre no vàlid: '{part.strip()}'. Columnes: {', '.join(columns)}")
+        filtres.append((per_nom[m.group(1).lower()], m.group(2), m.group(3)))
+    return tuple(filtres)
+
+
+def _mask(col, op, valor):
+    if op != '~' and pd.api.types.is_numeric_dtype(col):
+        try:
+            num = float(valor.replace(',', '.'))
+        except ValueError:
+            raise ValueError(f"'{valor}' no és un número (columna {col.name})")
+        comparacions = {'=': col == num, '!=': col != num, '>': col > num,
+                        '>=': col >= num, '<': col < num, '<=': col <= num}
+        return comparacions[op].to_numpy(dtype=bool)
+
+    text = col.astype(str).str.lower()
+    valor = valor.lower()
+    if op == '~':
+        return text.str.contains(valor, regex=False).to_numpy(dtype=bool)
+    comparacions = {'=': text == valor, '!=': text != valor, '>': text > valor,
+                    '>=': text >= valor, '<': text < valor, '<=': text <= valor}
+    return comparacions[op].to_numpy(dtype=bool)
+
+
+@lru_cache(maxsize=128)
+def _view(source, args, version, sort_col, ascending, filtres):
+    """
+    Posicions de les files visibles (filtrades i ordenades). Es calcula un cop per
+    combinació d'ordre i filtres; canviar de pàgina només talla aquest array.
+    """
+    df, _ = _load({'source': source, 'args': args})
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, valor in filtres:
+        mask &= _mask(df[col], op, valor)
+    pos = np.flatnonzero(mask)
+    if sort_col in df.columns:
+        valors = df[sort_col].iloc[pos].reset_index(drop=True)
+        ordre = valors.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+        pos = pos[ordre]
+    pos.setflags(write=False)
+    return pos
+
+
+def fetch_page(ref, page=1, sort_col=None, order=ORDRES[0], filters_text="", page_size=PAGE_SIZE):
+    """
+    Retorna (pàgina del DataFrame, número de pàgina efectiu, text informatiu).
+    """
+    if not ref:
+        return pd.DataFrame(), 1, ""
+    try:
+        df, version = _load(ref)
+        filtres = parse_filters(filters_text, list(df.columns))
+        pos = _view(ref['source'], ref['args'], version, sort_col, order == "Ascendent", filtres)
+    except Exception as e:
+        return pd.DataFrame(), 1, f"**Error:** {e}"
+
+    pagines = max(1, -(-len(pos) // page_size))
+    page = min(max(1, int(page or 1)), pagines)
+    inici = (page - 1) * page_size
+    visible = df.iloc[pos[inici:inici + page_size]]
+    # 'inf' (p. ex. barris sense parades) no és JSON vàlid: es mostra buit
+    visible = visible.replace([np.inf, -np.inf], np.nan)
+    info = (f"Files {inici + 1 if len(pos) else 0}–{inici + len(visible)} de {len(pos):,}"
+            f"{f' (filtrades de {len(df):,})' if len(pos) != len(df) else ''} · pàgina {page}/{pagines}")
+    return visible, page, info
+
+
+def reset_page(ref, page_size=PAGE_SIZE):
+    """Primera pàgina d'una referència nova, amb les columnes per ordenar i els filtres buidats."""
+    visible, page, text = fetch_page(ref, page_size=page_size)
+    columnes = [] if not ref else list(load_table(ref).columns)
+    return visible, page, text, gr.update(choices=columnes, value=None), ""
+
+
+# Com la resta de handlers: fora del bucle d'esdeveniments i amb les peticions idèntiques fusionades
+fetch_page_async = coalesced(fetch_page)
+reset_page_async = coalesced(reset_page)
+
+
+def paged_table(label, page_size=PAGE_SIZE, api_name=None):
+    """
+    Crea una taula paginada (filtres, ordre i navegació resolts al servidor) dins del
+    bloc actual i retorna el gr.State on els handlers han d'escriure la referència
+    (table_ref). Quan la referència canvia, la taula torna a la primera pàgina.
+    Amb 'api_name', l'anada a una pàgina (amb ordre i filtres) es pot cridar per l'API
+    com a '/<api_name>_page' (la referència és la de la sessió del client).
+    """
+    ref = gr.State(None)
+    with gr.Group():
+        with gr.Row():
+            filtre = gr.Textbox(label="Filtres", scale=3,
+                                placeholder="columna operador valor; ... (operadors: = != > >= < <= ~)")
+            sort_col = gr.Dropdown(label="Ordenar per", choices=[], value=None, scale=2)
+            order = gr.Radio(ORDRES, value=ORDRES[0], label="Ordre", scale=1)
+        taula = gr.DataFrame(label=label, interactive=False)
+        with gr.Row():
+            btn_prev = gr.Button("◀ Anterior", size="sm", scale=1)
+            pagina = gr.Number(value=1, precision=0, minimum=1, label="Pàgina", scale=1)
+            btn_next = gr.Button("Següent ▶", size="sm", scale=1)
+            info = gr.Markdown()
+
+    async def reset(ref_value):
+        return await reset_page_async(ref_value, page_size)
+
+    async def goto(ref_value, page, col, ordre, filtres):
+        return await fetch_page_async(ref_value, page or 1, col, ordre, filtres, page_size)
+
+    async def first(ref_value, page, col, ordre, filtres):
+        return await goto(ref_value, 1, col, ordre, filtres)
+
+    async def prev(ref_value, page, col, ordre, filtres):
+        return await goto(ref_value, (page or 1) - 1, col, ordre, filtres)
+
+    async def next_(ref_value, page, col, ordre, filtres):
+        return await goto(ref_value, (page or 1) + 1, col, ordre, filtres)
+
+    controls = [ref, pagina, sort_col, order, filtre]
+    sortides = [taula, pagina, info]
+    ref.change(fn=reset, inputs=ref, outputs=[taula, pagina, info, sort_col, filtre], show_api=False)
+    for event in (filtre.submit, sort_col.change, order.change):
+        event(fn=first, inputs=controls, outputs=sortides, show_api=False)
+    pagina.submit(fn=goto, inputs=controls, outputs=sortides, show_api=False,
+                  api_name=f"{api_name}_page" if api_name else None)
+    btn_prev.click(fn=prev, inputs=controls, outputs=sortides, show_api=False)
+    btn_next.click(fn=next_, inputs=controls, outputs=sortides, show_api=False)
+    return ref
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Prova de càrrega del dashboard: simula usuaris concurrents contra l'API de Gradio.
+
+Cada usuari virtual obre la pàgina, rep l'event inicial 'load' de la pestanya de Demanda
+i després repeteix el recorregut típic (canvis d'ordenació, previsió, comparativa entre
+períodes, cada botó de Cobertura amb la paginació i l'exportació dels KPIs, el simulador
+d'escenaris, Bus i Catalunya amb el drill-down) amb un temps de reflexió entre accions,
+fins que s'acaba la durada de la prova.
+
+Per defecte arrenca un servidor local amb 'serve_workers.py'; amb --url es pot fer servir
+un servidor ja engegat. Amb diversos valors a --workers es mesura com escala el throughput.
+
+Ús:
+    python scripts/run_load_test.py --users 10 --duration 60 --think-time 2
+    python scripts/run_load_test.py --workers 1,2,4 --users 16 --duration 30 --think-time 0 --no-cache
+    python scripts/run_load_test.py --url http://127.0.0.1:7860/ --endpoints /initial_load,/analyze_data
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+from gradio_client import Client
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVE_SCRIPT = os.path.join(SCRIPT_DIR, "serve_workers.py")
+
+PAGE = "GET /"
+
+# Recorregut d'un usuari: (endpoint, arguments). Els gr.State no formen part de l'API però el
+# servidor els guarda per sessió del client: la paginació i l'exportació fan servir la taula
+# de l'anàlisi anterior i els canvis d'escenari, la sessió que obre '/scenario_start'.
+# SESSION_START és l'obertura de la pàgina; SESSION_LOOP es repeteix fins al final de la prova.
+# Amb els gràfics al navegador (DASHBOARD_CHARTS=client) el canvi d'ordre no arriba al servidor,
+# així que la Demanda es torna a demanar amb '/initial_load', que existeix en tots dos modes.
+SESSION_START = [
+    (PAGE, None),
+    ("/initial_load", ("Descendente",)),
+]
+SESSION_LOOP = [
+    ("/initial_load", ("Ascendente",)),
+    ("/initial_load", ("Descendente",)),
+    ("/forecast", (None, 6)),
+    ("/compare_demanda", ("Metro (FMB)", "Viatgers", "Interanual", [])),
+    ("/compare_demanda_page", (1, None, "Descendent", "")),
+    ("/analyze_data", ()),
+    ("/metro_kpis_page", (2, None, "Descendent", "Població > 20000")),
+    ("/export_metro_kpis", ("CSV", [], None, None)),
+    ("/scenario_start", ()),
+    ("/scenario_add", ("el Raval", 1)),
+    ("/scenario_reset", ()),
+    ("/analyze_estaciones_por_distrito", ()),
+    ("/create_heatmap_distritos", ()),
+    ("/compare_poblacio", ("Població per barri", "Població", "Interanual", [])),
+    ("/analyze_bus", ("Parades Bus",)),
+    ("/analyze_catalunya", (None,)),
+    ("/drill_comarca", (2023, "Barcelonès")),
+]
+ENDPOINTS = [PAGE] + sorted({nom for nom, _ in SESSION_START + SESSION_LOOP if nom != PAGE})
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def start_server(n_workers, port, no_cache):
+    """Arrenca el balancejador amb n workers i espera que respongui."""
+    env = os.environ.copy()
+    if no_cache:
+        # Sense caché a disc ni fusió de peticions: es mesura el càlcul real
+        env["DASHBOARD_DISK_CACHE"] = "0"
+        env["DASHBOARD_COALESCE"] = "0"
+    proc = subprocess.Popen(
+        [sys.executable, SERVE_SCRIPT, "--workers", str(n_workers), "--port", str(port),
+         "--base-worker-port", str(port + 10)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    limit = time.time() + 240
+    while time.time() < limit:
+        if proc.poll() is not None:
+            raise RuntimeError(f"El servidor s'ha aturat (codi {proc.returncode})")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/config", timeout=2).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    proc.terminate()
+    raise RuntimeError("El servidor no ha arrencat a temps")
+
+
+class Metrics:
+    """Latències i errors per endpoint, compartides entre els fils dels usuaris."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+
+    def record(self, endpoint, segons, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies[endpoint].append(segons)
+            else:
+                self.errors[endpoint] += 1
+                self.error_samples.setdefault(endpoint, str(error)[:200])
+
+
+def _call(metrics, client, http, url, endpoint, args):
+    inici = time.perf_counter()
+    try:
+        if endpoint == PAGE:
+            http.get(url).raise_for_status()
+        else:
+            client.predict(*args, api_name=endpoint)
+    except Exception as e:
+        metrics.record(endpoint, time.perf_counter() - inici, error=e)
+    else:
+        metrics.record(endpoint, time.perf_counter() - inici)
+
+
+def _think(think_time):
+    # Temps de reflexió exponencial amb mitjana 'think_time' (0 = sense pausa)
+    if think_time > 0:
+        time.sleep(random.expovariate(1 / think_time))
+
+
+def virtual_user(url, metrics, deadline, think_time, endpoints):
+    """Un usuari: obre la pàgina i repeteix el recorregut fins a 'deadline'."""
+    start = [(e, a) for e, a in SESSION_START if e in endpoints]
+    loop = [(e, a) for e, a in SESSION_LOOP if e in endpoints]
+    with httpx.Client(timeout=120) as http:
+        try:
+            client = Client(url, verbose=False)
+        except Exception as e:
+            metrics.record("connexió", 0, error=e)
+            return
+        for endpoint, args in start:
+            _call(metrics, client, http, url, endpoint, args)
+            _think(think_time)
+        while loop and time.time() < deadline:
+            for endpoint, args in loop:
+                if time.time() >= deadline:
+                    break
+                _call(metrics, client, http, url, endpoint, args)
+                _think(think_time)
+        client.close()
+
+
+def run_load(url, users, duration, think_time, endpoints, ramp_up):
+    """Llança 'users' usuaris (escalonats en 'ramp_up' segons) durant 'duration' segons."""
+    metrics = Metrics()
+    inici = time.time()
+    deadline = inici + duration
+    fils = []
+    for i in range(users):
+        fil = threading.Thread(target=virtual_user, args=(url, metrics, deadline, think_time, endpoints))
+        fil.start()
+        fils.append(fil)
+        if ramp_up > 0 and i < users - 1:
+            time.sleep(ramp_up / users)
+    for fil in fils:
+        fil.join()
+    return metrics, time.time() - inici
+
+
+def report(metrics, elapsed):
+    """Taula per endpoint: peticions, errors, throughput i percentils de latència (ms)."""
+    capcalera = (f"{'Endpoint':<34} {'OK':>6} {'Err':>5} {'%Err':>6} {'Pet./s':>7} "
+                 + " ".join(f"{'p' + str(p):>7}" for p in PERCENTILES) + f" {'màx':>7}")
+    print(capcalera)
+    print("-" * len(capcalera))
+    totals_ok, totals_err = 0, 0
+    noms = [e for e in ENDPOINTS if e in metrics.latencies or e in metrics.errors]
+    noms += sorted((set(metrics.latencies) | set(metrics.errors)) - set(noms))
+    for endpoint in noms:
+        lat = np.array(metrics.latencies.get(endpoint, [])) * 1000
+        ok, err = len(lat), metrics.errors.get(endpoint, 0)
+        totals_ok += ok
+        totals_err += err
+        percentils = np.percentile(lat, PERCENTILES) if ok else [np.nan] * len(PERCENTILES)
+        print(f"{endpoint:<34} {ok:>6} {err:>5} {100 * err / max(ok + err, 1):>5.1f}% {ok / elapsed:>7.2f} "
+              + " ".join(f"{v:>7.0f}" for v in percentils) + f" {(lat.max() if ok else np.nan):>7.0f}")
+    print("-" * len(capcalera))
+    print(f"{'TOTAL':<34} {totals_ok:>6} {totals_err:>5} "
+          f"{100 * totals_err / max(totals_ok + totals_err, 1):>5.1f}% {totals_ok / elapsed:>7.2f}")
+    for endpoint, missatge in metrics.error_samples.items():
+        print(f"  Exemple d'error a {endpoint}: {missatge}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prova de càrrega del dashboard amb usuaris concurrents")
+    parser.add_argument("--url", help="Servidor ja engegat (si no, se n'arrenca un de local)")
+    parser.add_argument("--workers", default="1", help="Workers del servidor local; llista per comparar (p. ex. 1,2,4)")
+    parser.add_argument("--users", type=int, default=8, help="Usuaris concurrents")
+    parser.add_argument("--duration", type=float, default=30, help="Durada de cada prova (segons)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Temps de reflexió mitjà entre accions (segons)")
+    parser.add_argument("--ramp-up", type=float, default=0, help="Segons per arrencar tots els usuaris")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help=f"Endpoints a incloure al recorregut (per defecte: {','.join(ENDPOINTS)})")
+    parser.add_argument("--port", type=int, default=7900, help="Port del servidor local")
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la caché a disc i la fusió de peticions")
+    parser.add_argument("--seed", type=int, default=None, help="Llavor dels temps de reflexió")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    endpoints = set(args.endpoints.split(","))
+    desconeguts = endpoints - set(ENDPOINTS)
+    if desconeguts:
+        parser.error(f"Endpoints desconeguts: {', '.join(sorted(desconeguts))}")
+
+    print(f"{args.users} usuaris, {args.duration:.0f} s, temps de reflexió {args.think_time} s"
+          f"{' (sense caché)' if args.no_cache else ''}")
+
+    if args.url:
+        metrics, elapsed = run_load(args.url, args.users, args.duration, args.think_time, endpoints, args.ramp_up)
+        print(f"\n=== {args.url} ({elapsed:.1f} s) ===")
+        report(metrics, elapsed)
+        return
+
+    for n in [int(x) for x in args.workers.split(",")]:
+        proc = start_server(n, args.port, args.no_cache)
+        try:
+            url = f"http://127.0.0.1:{args.port}/"
+            metrics, elapsed = run_load(url, args.users, args.duration, args.think_time, endpoints, args.ramp_up)
+            print(f"\n=== {n} worker(s) ({elapsed:.1f} s) ===")
+            report(metrics, elapsed)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
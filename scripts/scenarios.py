@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+# --- Simulador d'escenaris (what-if) de cobertura ---
+# La base (dades reals) es calcula un cop i es comparteix, en només lectura, entre tots els
+# escenaris de totes les sessions. Un escenari només guarda les files que ha modificat
+# (barris i districtes tocats); la resta es llegeix de la base. Cada canvi retorna un
+# escenari nou que copia només aquestes files (còpia en escriptura), així que els
+# escenaris d'una sessió poden compartir-les sense interferir entre ells.
+TOP_N = 10
+
+
+def _json_safe(taula):
+    """'inf' (districtes o barris sense parades) no és JSON vàlid: es mostra buit, com a la taula paginada."""
+    return taula.replace([np.inf, -np.inf], np.nan)
+
+
+def _readonly(valors, dtype=None):
+    arr = np.array(valors, dtype=dtype)
+    arr.setflags(write=False)
+    return arr
+
+
+def _kpis_barri(poblacio, km2, recompte):
+    """KPIs d'un barri amb 'recompte' parades, amb els mateixos criteris que coverage_kpis."""
+    per_habitant = float(np.round(poblacio / recompte)) if recompte > 0 else np.inf
+    per_km2 = recompte / km2 if km2 > 0 else 0.0
+    return per_habitant, per_km2
+
+
+def build_baseline(df_final, col_recompte, col_per_habitant, col_per_km2):
+    """
+    Base compartida dels escenaris a partir de la taula de KPIs per barri (coverage_kpis).
+
+    Retorna un diccionari d'arrays de només lectura (una posició per barri), els agregats
+    per districte i els rànquings de la base, que els escenaris només retoquen.
+    """
+    codis, districtes = pd.factorize(df_final['Nom_Districte'], sort=True)
+    poblacio = df_final['Població'].to_numpy(dtype=float)
+    km2 = df_final['Superfície (ha)'].to_numpy(dtype=float) / 100
+    recompte = df_final[col_recompte].to_numpy(dtype=int)
+    per_habitant = df_final[col_per_habitant].to_numpy(dtype=float)
+
+    # Rànquings de la base: pressió (sense els barris sense parades) i barris sense parades
+    amb_parades = np.flatnonzero(np.isfinite(per_habitant))
+    sense = np.flatnonzero(recompte == 0)
+    return {
+        'cols': (col_recompte, col_per_habitant, col_per_km2),
+        'barris': _readonly(df_final['Nom_Barri'].to_numpy()),
+        'pos': {nom: i for i, nom in enumerate(df_final['Nom_Barri'])},
+        'districte': _readonly(codis),
+        'districtes': _readonly(np.asarray(districtes)),
+        'poblacio': _readonly(poblacio),
+        'km2': _readonly(km2),
+        'recompte': _readonly(recompte),
+        'per_habitant': _readonly(per_habitant),
+        'per_km2': _readonly(df_final[col_per_km2].to_numpy(dtype=float)),
+        'ordre_pressio': _readonly(amb_parades[np.argsort(-per_habitant[amb_parades], kind='stable')]),
+        'ordre_sense': _readonly(sense[np.argsort(-poblacio[sense], kind='stable')]),
+        'dist_poblacio': _readonly(np.bincount(codis, weights=poblacio, minlength=len(districtes))),
+        'dist_km2': _readonly(np.bincount(codis, weights=km2, minlength=len(districtes))),
+        'dist_recompte': _readonly(np.bincount(codis, weights=recompte, minlength=len(districtes)), dtype=int),
+    }
+
+
+def new_scenario():
+    """Escenari sense cap canvi: tot es llegeix de la base."""
+    return {'barris': {}, 'districtes': {}}
+
+
+def fork_scenario(escenari):
+    """Còpia d'un escenari: només es copien les files modificades, no la base."""
+    return {'barris': dict(escenari['barris']), 'districtes': dict(escenari['districtes'])}
+
+
+def barri_values(base, escenari, i):
+    """(recompte, per_habitant, per_km2) del barri de posició 'i' dins de l'escenari."""
+    if i in escenari['barris']:
+        return escenari['barris'][i]
+    return base['recompte'][i], base['per_habitant'][i], base['per_km2'][i]
+
+
+def apply_change(base, escenari, nom_barri, delta):
+    """
+    Afegeix (delta > 0) o treu (delta < 0) parades hipotètiques a un barri.
+
+    Només es recalculen els KPIs del barri i el recompte del seu districte; retorna un
+    escenari nou i deixa intacte l'original.
+    """
+    if nom_barri not in base['pos']:
+        raise ValueError(f"Barri desconegut: {nom_barri}")
+    i = base['pos'][nom_barri]
+    actual = barri_values(base, escenari, i)[0]
+    nou_recompte = actual + int(delta)
+    if nou_recompte < 0:
+        raise ValueError(f"{nom_barri} només té {actual} parades en aquest escenari")
+
+    nou = fork_scenario(escenari)
+    if nou_recompte == base['recompte'][i]:
+        # Torna a la base: la fila deixa de ser pròpia de l'escenari
+        nou['barris'].pop(i, None)
+    else:
+        nou['barris'][i] = (nou_recompte, *_kpis_barri(base['poblacio'][i], base['km2'][i], nou_recompte))
+
+    d = base['districte'][i]
+    recompte_districte = nou['districtes'].get(d, base['dist_recompte'][d]) + (nou_recompte - actual)
+    if recompte_districte == base['dist_recompte'][d]:
+        nou['districtes'].pop(d, None)
+    else:
+        nou['districtes'][d] = recompte_districte
+    return nou
+
+
+def _top(base, escenari, ordre_base, inclou, clau, n):
+    """
+    Top 'n' de l'escenari: els primers barris no modificats del rànquing de la base més els
+    barris modificats que hi entren, reordenats. Només es miren n + (barris modificats) files.
+    """
+    tocats = escenari['barris']
+    candidats = [i for i in ordre_base[:n + len(tocats)] if i not in tocats]
+    candidats += [i for i in tocats if inclou(barri_values(base, escenari, i))]
+    candidats.sort(key=lambda i: clau(barri_values(base, escenari, i), i), reverse=True)
+    return candidats[:n]
+
+
+def _taula_barris(base, escenari, posicions, amb_pressio=True):
+    col_recompte, col_per_habitant, _ = base['cols']
+    valors = [barri_values(base, escenari, i) for i in posicions]
+    taula = pd.DataFrame({
+        'Nom_Barri': base['barris'][posicions] if posicions else [],
+        'Població': base['poblacio'][posicions].astype(int) if posicions else [],
+        col_recompte: [v[0] for v in valors],
+    })
+    if amb_pressio:
+        taula[col_per_habitant] = [v[1] for v in valors]
+    return taula
+
+
+def top_pressure(base, escenari, n=TOP_N):
+    """Top 'n' de barris amb més població per parada (excloent els que no en tenen)."""
+    posicions = _top(base, escenari, base['ordre_pressio'], lambda v: np.isfinite(v[1]),
+                     lambda v, i: v[1], n)
+    return _taula_barris(base, escenari, posicions)
+
+
+def top_without_stops(base, escenari, n=TOP_N):
+    """Top 'n' de barris més poblats sense cap parada."""
+    posicions = _top(base, escenari, base['ordre_sense'], lambda v: v[0] == 0,
+                     lambda v, i: base['poblacio'][i], n)
+    return _taula_barris(base, escenari, posicions, amb_pressio=False)
+
+
+def district_table(base, escenari):
+    """KPIs per districte de l'escenari, amb la variació de parades respecte a la base."""
+    col_recompte, col_per_habitant, col_per_km2 = base['cols']
+    recompte = base['dist_recompte'].copy()
+    for d, valor in escenari['districtes'].items():
+        recompte[d] = valor
+    with np.errstate(divide='ignore'):
+        per_habitant = np.where(recompte > 0, np.round(base['dist_poblacio'] / recompte), np.inf)
+    return _json_safe(pd.DataFrame({
+        'Nom_Districte': base['districtes'],
+        'Població': base['dist_poblacio'].astype(int),
+        col_recompte: recompte,
+        'Variació': recompte - base['dist_recompte'],
+        col_per_habitant: per_habitant,
+        col_per_km2: (recompte / base['dist_km2']).round(2),
+    }))
+
+
+def changes_table(base, escenari):
+    """Barris modificats per l'escenari: valors de la base i de l'escenari."""
+    col_recompte, col_per_habitant, col_per_km2 = base['cols']
+    files = []
+    for i, (recompte, per_habitant, per_km2) in sorted(escenari['barris'].items()):
+        files.append({
+            'Nom_Barri': base['barris'][i],
+            'Nom_Districte': base['districtes'][base['districte'][i]],
+            f'{col_recompte} (base)': base['recompte'][i],
+            col_recompte: recompte,
+            f'{col_per_habitant} (base)': base['per_habitant'][i],
+            col_per_habitant: per_habitant,
+            f'{col_per_km2} (base)': round(base['per_km2'][i], 2),
+            col_per_km2: round(per_km2, 2),
+        })
+    return _json_safe(pd.DataFrame(files))
+
+
+def scenario_delta(base, escenari):
+    """Parades afegides menys parades tretes respecte a la base."""
+    return int(sum(v[0] - base['recompte'][i] for i, v in escenari['barris'].items()))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Mode de desplegament multi-procés del dashboard.
+
+Arrenca N processos de 'main_dashboard.py' (un per port) que comparteixen la caché
+d'artefactes a disc (DASHBOARD_CACHE_DIR) i posa davant un balancejador local.
+
+Les crides a la cua de Gradio (join / data / heartbeat) d'una mateixa sessió han d'anar
+sempre al mateix worker, així que s'enruten pel 'session_hash'. La resta de peticions
+(pàgina, estàtics, fitxers de la caché compartida) es reparteixen en round-robin.
+
+Ús:
+    python scripts/serve_workers.py --workers 4 --port 7860
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(SCRIPT_DIR, "main_dashboard.py")
+
+# Capçaleres que no s'han de reenviar tal qual (hop-by-hop)
+HOP_BY_HOP = {'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade',
+              'proxy-authorization', 'proxy-authenticate'}
+
+
+def start_workers(n_workers, base_port, env_extra=None):
+    """Arrenca els processos worker i retorna la llista de (procés, url)."""
+    env = os.environ.copy()
+    env.setdefault("DASHBOARD_CACHE_DIR", os.path.abspath(".dashboard_cache"))
+    # Directori temporal de Gradio compartit: qualsevol worker pot servir els fitxers d'un altre
+    env.setdefault("GRADIO_TEMP_DIR", os.path.join(env["DASHBOARD_CACHE_DIR"], "gradio"))
+    env["GRADIO_SERVER_NAME"] = "127.0.0.1"
+    env["GRADIO_ANALYTICS_ENABLED"] = "False"
+    env.update(env_extra or {})
+
+    workers = []
+    for i in range(n_workers):
+        port = base_port + i
+        env_worker = dict(env, GRADIO_SERVER_PORT=str(port))
+        proc = subprocess.Popen([sys.executable, MAIN_SCRIPT], env=env_worker)
+        workers.append((proc, f"http://127.0.0.1:{port}"))
+    return workers
+
+
+def wait_for_workers(workers, timeout=180):
+    """Espera que tots els workers responguin a '/config'."""
+    limit = time.time() + timeout
+    pendents = [url for _, url in workers]
+    while pendents and time.time() < limit:
+        for proc, url in workers:
+            if proc.poll() is not None:
+                raise RuntimeError(f"El worker {url} s'ha aturat (codi {proc.returncode})")
+        for url in list(pendents):
+            try:
+                if httpx.get(f"{url}/config", timeout=2).status_code == 200:
+                    pendents.remove(url)
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.5)
+    if pendents:
+        raise RuntimeError(f"Els workers no han arrencat a temps: {pendents}")
+
+
+def stop_workers(workers):
+    for proc, _ in workers:
+        if proc.poll() is None:
+            proc.terminate()
+    for proc, _ in workers:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _session_hash(request, body):
+    """'session_hash' de la petició: query string, ruta de heartbeat o cos JSON del join."""
+    if 'session_hash' in request.query_params:
+        return request.query_params['session_hash']
+    parts = request.url.path.rstrip('/').split('/')
+    if len(parts) >= 2 and parts[-2] == 'heartbeat':
+        return parts[-1]
+    if body and request.headers.get('content-type', '').startswith('application/json'):
+        try:
+            dades = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(dades, dict):
+            return dades.get('session_hash')
+    return None
+
+
+def build_proxy(urls):
+    """App ASGI que reenvia les peticions als workers amb afinitat per sessió."""
+    client = httpx.AsyncClient(timeout=None)
+    round_robin = itertools.cycle(urls)
+
+    async def proxy(request: Request):
+        body = await request.body()
+        sessio = _session_hash(request, body)
+        if sessio:
+            idx = int(hashlib.md5(sessio.encode()).hexdigest(), 16) % len(urls)
+            desti = urls[idx]
+        else:
+            desti = next(round_robin)
+
+        headers = [(k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP]
+        upstream = client.build_request(
+            request.method,
+            desti + request.url.path,
+            params=request.query_params,
+            headers=headers,
+            content=body,
+        )
+        resposta = await client.send(upstream, stream=True)
+        headers_resp = {k: v for k, v in resposta.headers.items() if k.lower() not in HOP_BY_HOP}
+        # Els events de la cua (SSE) es reenvien a mesura que arriben
+        return StreamingResponse(
+            resposta.aiter_raw(),
+            status_code=resposta.status_code,
+            headers=headers_resp,
+            background=BackgroundTask(resposta.aclose),
+        )
+
+    metodes = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS', 'HEAD']
+    return Starlette(
+        routes=[Route('/{path:path}', proxy, methods=metodes)],
+        on_shutdown=[client.aclose],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard amb múltiples workers i caché compartida")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Nombre de processos worker")
+    parser.add_argument("--port", type=int, default=7860, help="Port del balancejador")
+    parser.add_argument("--base-worker-port", type=int, default=7870, help="Port del primer worker")
+    args = parser.parse_args()
+
+    workers = start_workers(args.workers, args.base_worker_port)
+    # SIGTERM -> atura també els workers
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        wait_for_workers(workers)
+        urls = [url for _, url in workers]
+        print(f"{len(urls)} workers a punt: {', '.join(urls)}")
+        print(f"Balancejador escoltant a http://127.0.0.1:{args.port}")
+        uvicorn.run(build_proxy(urls), host="127.0.0.1", port=args.port, log_level="warning",
+                    timeout_graceful_shutdown=5)
+    finally:
+        stop_workers(workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+# Els mòduls del dashboard són a scripts/ i les rutes dels datasets són relatives a
+# l'arrel del repositori. La caché de disc de les proves va a un directori temporal.
+ARREL = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ARREL, "scripts"))
+os.chdir(ARREL)
+os.environ.setdefault("DASHBOARD_CACHE_DIR", tempfile.mkdtemp(prefix="dashboard_cache_"))
+
+
+def _acumulats_fmb(path):
+    """
+    Total de la columna ACUMULAT de cada bloc 'VIATGERS REALS LÍNIA ...' del full
+    'Mensuals' (l'última fila numèrica del bloc). Referència independent del parser.
+    El bloc del funicular només marca el final de l'anterior.
+    """
+    df = pd.read_excel(path, sheet_name='Mensuals', header=None)
+    text = df.apply(lambda fila: ' '.join(str(x) for x in fila if pd.notna(x)).upper(), axis=1)
+    funicular = df.apply(lambda fila: any(str(x).strip().upper() == 'FUNICULAR' for x in fila), axis=1)
+    titols = text.index[text.str.contains('VIATGERS REALS LÍNIA')].tolist()
+    limits = sorted(titols + text.index[funicular].tolist()) + [len(df)]
+    totals = {}
+    for inici in titols:
+        final = next(l for l in limits if l > inici)
+        titol = str(df.iloc[inici].dropna().iloc[0])
+        linia = titol[titol.upper().find('LÍNIA'):].split('(')[0].strip()
+        capcalera = next(r for r in range(inici + 1, final) if 'ACUMULAT' in text[r])
+        col = next(c for c, v in enumerate(df.iloc[capcalera]) if isinstance(v, str) and 'ACUMULAT' in v.upper())
+        valors = pd.to_numeric(df.iloc[capcalera + 1:final, col], errors='coerce').dropna()
+        if len(valors) and valors.iloc[-1] > 0:
+            totals[linia] = float(valors.iloc[-1])
+    return totals
+
+
+@pytest.fixture
+def acumulats_fmb():
+    return _acumulats_fmb
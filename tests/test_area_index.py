@@ -0,0 +1,61 @@
+import pandas as pd
+
+from area_index import assign_area_ids, normalize_area_name, report_unmatched_areas, unmatched_areas
+
+
+def _font(tmp_path, nom, contingut):
+    path = tmp_path / nom
+    path.write_text(contingut, encoding="utf-8")
+    return str(path)
+
+
+def test_normalize_area_name_unifica_variants():
+    assert normalize_area_name("Sarrià\xa0-Sant Gervasi") == normalize_area_name("Sarrià-Sant Gervasi")
+
+
+def test_assign_area_ids_codi_te_prioritat_sobre_el_nom():
+    ids = assign_area_ids(pd.Series(["el Raval", "Nom inventat"]), pd.Series([1, 2]))
+    assert ids.tolist() == [1, 2]
+
+
+def test_noms_sense_assignar_per_font(tmp_path):
+    font_a = _font(tmp_path, "a.csv", "a")
+    font_b = _font(tmp_path, "b.csv", "b")
+    assign_area_ids(pd.Series(["el Raval", "Barri Fantasma"]), font=font_a)
+    assign_area_ids(pd.Series(["Gràcia", "Districte X"]), nivell="districte", font=font_b)
+
+    assert unmatched_areas(font_a) == ["Barri Fantasma"]
+    assert unmatched_areas(font_b, "districte") == ["Districte X"]
+    assert report_unmatched_areas(font_a) == "Noms de barri sense assignar a 'a.csv': Barri Fantasma."
+    assert "Districte X" not in report_unmatched_areas(font_a)
+    assert "Districte X" in report_unmatched_areas(font_a, font_b)
+
+
+def test_el_registre_es_substitueix_i_segueix_el_contingut(tmp_path):
+    font = _font(tmp_path, "a.csv", "v1")
+    assign_area_ids(pd.Series(["Barri Fantasma"]), font=font)
+    assign_area_ids(pd.Series(["el Raval"]), font=font)
+    assert unmatched_areas(font) == []
+    assert report_unmatched_areas(font) == ""
+
+    # Una versió nova del fitxer encara no processada no hereta l'avís de l'anterior
+    assign_area_ids(pd.Series(["Barri Fantasma"]), font=font)
+    _font(tmp_path, "a.csv", "v2 amb més contingut")
+    assert unmatched_areas(font) is None
+
+
+def test_els_noms_sense_assignar_van_al_log(tmp_path, caplog, capsys):
+    font = _font(tmp_path, "a.csv", "a")
+    with caplog.at_level("WARNING", logger="area_index"):
+        assign_area_ids(pd.Series(["Barri Fantasma"]), font=font)
+    assert "Barri Fantasma" in caplog.text
+    assert capsys.readouterr().out == ""
+
+
+def test_index_i_poblacio_del_mateix_any_del_magatzem():
+    import area_index
+    import cobertura_dashboard as cob
+    from dataset_store import latest_period_file
+
+    assert latest_period_file('poblacio') == (area_index.ANY_AREES, area_index.FILE_AREES)
+    assert cob.FILE_POBLACIO == area_index.FILE_AREES
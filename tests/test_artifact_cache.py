@@ -0,0 +1,123 @@
+import os
+import time
+
+import artifact_cache
+from artifact_cache import disk_cached, evict_entries, evict_files, scratch_file, versioned_lru_cache
+
+
+def _escriu(path, text, mtime_ns):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_versioned_lru_cache_segueix_els_canvis_del_fitxer(tmp_path):
+    font = str(tmp_path / "dades.txt")
+    _escriu(font, "29629", 1_000_000_000)
+    crides = []
+
+    @versioned_lru_cache(font)
+    @disk_cached(font)
+    def llegeix():
+        crides.append(1)
+        with open(font, encoding="utf-8") as f:
+            return f.read()
+
+    assert llegeix() == "29629"
+    assert llegeix() == "29629"
+    assert len(crides) == 1
+
+    _escriu(font, "30000", 2_000_000_000)
+    assert llegeix() == "30000"
+    assert len(crides) == 2
+
+
+def test_disk_cached_no_desa_dades_antigues_sota_la_clau_nova(tmp_path):
+    font = str(tmp_path / "dades.txt")
+    _escriu(font, "antic", 1_000_000_000)
+
+    @versioned_lru_cache(font)
+    def carrega():
+        with open(font, encoding="utf-8") as f:
+            return f.read()
+
+    @disk_cached(font)
+    def analitza():
+        return carrega().upper()
+
+    assert analitza() == "ANTIC"
+    _escriu(font, "nou", 2_000_000_000)
+    assert analitza() == "NOU"
+
+
+def test_evict_files_nomes_esborra_els_antics(tmp_path):
+    antic, recent = tmp_path / "antic.png", tmp_path / "recent.png"
+    _escriu(str(antic), "a", int((time.time() - 7200) * 1e9))
+    _escriu(str(recent), "r", time.time_ns())
+    evict_files(str(tmp_path), 3600)
+    assert not antic.exists()
+    assert recent.exists()
+
+
+def test_scratch_file_es_unic_i_neteja_el_directori(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache, "SCRATCH_DIR", str(tmp_path))
+    antic = tmp_path / "chart_antic.png"
+    _escriu(str(antic), "a", int((time.time() - 2 * artifact_cache.SCRATCH_MAX_AGE) * 1e9))
+
+    rutes = {scratch_file("chart_", ".png") for _ in range(5)}
+    assert len(rutes) == 5
+    assert all(os.path.dirname(r) == str(tmp_path) and r.endswith(".png") for r in rutes)
+    assert not antic.exists()
+
+
+def _entrades(cache_dir):
+    return sorted(p.name for p in cache_dir.glob("??/*") if p.is_dir())
+
+
+def test_evict_entries_esborra_les_entrades_antigues_i_els_bloquejos(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(artifact_cache, "CACHE_DIR", str(cache_dir))
+    font = str(tmp_path / "dades.txt")
+    _escriu(font, "v1", 1_000_000_000)
+
+    @disk_cached(font)
+    def llegeix():
+        with open(font, encoding="utf-8") as f:
+            return f.read()
+
+    assert llegeix() == "v1"
+    antiga = _entrades(cache_dir)
+    assert len(antiga) == 1
+    pkl = next(cache_dir.glob("??/*/result.pkl"))
+    vell = int((time.time() - 2 * artifact_cache.CACHE_MAX_AGE) * 1e9)
+    os.utime(pkl, ns=(vell, vell))
+
+    # Una versió nova de les dades desa una entrada nova i esborra l'antiga amb el seu '.lock'
+    _escriu(font, "v2", 2_000_000_000)
+    assert llegeix() == "v2"
+    assert len(_entrades(cache_dir)) == 1 and _entrades(cache_dir) != antiga
+    assert not list(cache_dir.glob(f"??/{antiga[0]}.lock"))
+    # Els subdirectoris que no són entrades (exportacions, fitxers temporals) no es toquen
+    (cache_dir / "exports").mkdir()
+    (cache_dir / "exports" / "x.csv").write_text("x")
+    evict_entries(0, 0)
+    assert _entrades(cache_dir) == [] and (cache_dir / "exports" / "x.csv").exists()
+
+
+def test_evict_entries_per_mida_comenca_per_les_menys_usades(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(artifact_cache, "CACHE_DIR", str(cache_dir))
+
+    @disk_cached()
+    def doble(x):
+        return "x" * 1000 * x
+
+    for x, mtime in ((1, 1), (2, 2), (3, 3)):
+        doble(x)
+        pkl = max(cache_dir.glob("??/*/result.pkl"), key=os.path.getmtime)
+        os.utime(pkl, (time.time() - 100 + mtime, time.time() - 100 + mtime))
+    # La lectura de la primera la marca com a usada
+    doble(1)
+    evict_entries(None, 2 * 1000 + 3 * 1000)
+    restants = [artifact_cache._load(str(p)) for p in cache_dir.glob("??/*") if p.is_dir()]
+    assert sorted(map(len, restants)) == [1000, 3000]
@@ -0,0 +1,57 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from bus_dashboard import (CRS, MAX_DISTANCIA_ETIQUETA, assign_barris, assign_barris_coincidents, bus_kpi_table,
+                           load_bus_store, load_estacions_bus, load_parades_bus)
+
+
+@pytest.fixture(scope="module")
+def store():
+    return load_bus_store()
+
+
+def _punts(xs, ys, **columnes):
+    return gpd.GeoDataFrame(columnes, geometry=gpd.points_from_xy(xs, ys), crs=CRS)
+
+
+def test_join_espacial_quadra_amb_les_etiquetes():
+    # Quatre barris quadrats de 100 m i punts etiquetats repartits per dins
+    rng = np.random.default_rng(0)
+    caixes = {1: (0, 0), 2: (100, 0), 3: (0, 100), 4: (100, 100)}
+    barris = gpd.GeoDataFrame(geometry=[shapely.box(x, y, x + 100, y + 100) for x, y in caixes.values()],
+                              index=pd.Index(list(caixes), dtype='int16', name='ID_Barri'), crs=CRS)
+    etiquetes = rng.choice(list(caixes), 500)
+    origen = np.array([caixes[e] for e in etiquetes])
+    punts = _punts(origen[:, 0] + rng.uniform(1, 99, 500), origen[:, 1] + rng.uniform(1, 99, 500))
+
+    ids, per_proximitat = assign_barris(punts, barris)
+    assert per_proximitat == 0
+    assert ids.value_counts().sort_index().to_dict() == pd.Series(etiquetes).value_counts().sort_index().to_dict()
+
+
+def test_coincidents_prenen_l_etiqueta_nomes_al_mateix_lloc():
+    etiquetats = _punts([0, 1000], [0, 0], BARRI_Etiquetat=pd.array([7, 8], dtype='Int16'))
+    punts = _punts([MAX_DISTANCIA_ETIQUETA / 2, 1000, 500], [0, 0, 0])
+    assert assign_barris_coincidents(punts, etiquetats).tolist() == [7, 8, pd.NA]
+
+
+def test_recompte_per_barri_igual_a_les_etiquetes(store):
+    # Estacions Bus: el recompte per barri és exactament el de la columna BARRI del fitxer
+    etiquetes = load_estacions_bus()['BARRI_Etiquetat'].value_counts().sort_index()
+    parades = store["Estacions Bus"]['parades']
+    assert parades['ID_Barri'].value_counts().sort_index().to_dict() == etiquetes.to_dict()
+
+    kpis = bus_kpi_table("Estacions Bus")
+    assert kpis['Nombre_Parades_Bus'].sum() == etiquetes.sum()
+
+
+def test_parades_sense_estacio_coincident_queden_sense_barri(store):
+    parades = load_parades_bus()
+    estacions = load_estacions_bus()
+    _, distancia = estacions.sindex.nearest(parades.geometry, return_all=False, return_distance=True)
+    ids = store["Parades Bus"]['parades']['ID_Barri']
+    assert ids.notna().sum() == (distancia <= MAX_DISTANCIA_ETIQUETA).sum()
+    assert store["Parades Bus"]['estadistiques']['sense_barri'] == ids.isna().sum()
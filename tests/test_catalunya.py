@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from catalunya_dashboard import (analyze_catalunya, drill_comarca, drill_municipi, load_bus_interurba,
+                                 load_catalunya_store)
+
+
+@pytest.fixture(scope="module")
+def store():
+    return load_catalunya_store()
+
+
+def test_passatgers_sense_dades_queden_com_a_nan():
+    df_bus = load_bus_interurba()
+    # El fitxer té 168 registres sense passatgers: no es poden convertir en zeros
+    assert df_bus['Passatgers'].isna().sum() == 168
+    assert (df_bus['Passatgers'].dropna() >= 0).all()
+
+
+def test_agregat_per_comarca_quadra_amb_les_taules_base(store):
+    per_comarca = store['per_comarca']
+    assert per_comarca.groupby('Any')['Viatges_FGC'].sum().sum() == store['fgc'].loc[
+        store['fgc']['Codi_Municipi'] >= 0, 'Viatges'].sum()
+
+    bus = store['bus'].join(store['municipis'][['Comarca']], on='Codi_Municipi')
+    esperat = bus.groupby(['Any', 'Comarca'], observed=True)['Passatgers'].sum(min_count=1)
+    obtingut = per_comarca.set_index(['Any', 'Comarca'])['Passatgers_Bus'].reindex(esperat.index)
+    np.testing.assert_array_equal(obtingut.to_numpy(), esperat.to_numpy())
+
+
+def test_analisi_informa_dels_registres_sense_passatgers(store):
+    df, _, comarques, estat = analyze_catalunya()
+    assert estat.startswith("Anàlisi completada")
+    assert "sense passatgers (no compten als totals): 168" in estat
+    assert set(df['Comarca'].astype(str)) == set(comarques['choices'])
+
+
+def test_drill_down_de_comarca_a_estacio(store):
+    df_mun, municipis, estat = drill_comarca(2023, "Barcelonès")
+    assert "Barcelona" in municipis['choices']
+    assert estat == f"Barcelonès (2023): {len(df_mun)} municipis."
+
+    df_est, estat = drill_municipi(2023, "Barcelona")
+    esperat = store['fgc'][(store['fgc']['Any'] == 2023) & (store['fgc']['Codi_Municipi'] == 80193)]
+    assert df_est['Viatges'].sum() == esperat['Viatges'].sum()
+    assert set(df_est['Estació']) == set(esperat['Estació'])
+    assert estat == f"Barcelona (2023): {len(df_est)} estacions FGC."
+
+
+def test_drill_down_retorna_els_errors_a_l_estat():
+    df, municipis, estat = drill_comarca("no és un any", "Barcelonès")
+    assert df is None and municipis['choices'] == []
+    assert estat.startswith("Error en el drill-down de comarca")
+
+    df, estat = drill_municipi("no és un any", "Barcelona")
+    assert df is None
+    assert estat.startswith("Error en el drill-down de municipi")
+
+    df, estat = drill_municipi(2023, "Municipi inexistent")
+    assert df is None and "sense estacions FGC" in estat
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from concurrency import coalesced
+
+
+def _comptador():
+    crides = []
+    allibera = threading.Event()
+
+    def handler(ref, columnes, fmt="CSV"):
+        crides.append((ref['source'], tuple(columnes), fmt))
+        allibera.wait(5)
+        return len(crides)
+
+    return handler, crides, allibera
+
+
+async def _dues_peticions(fn, *args, **kwargs):
+    tasques = [asyncio.ensure_future(fn(*args, **kwargs)) for _ in range(2)]
+    await asyncio.sleep(0.1)
+    return tasques
+
+
+def test_fusiona_peticions_amb_llistes_i_diccionaris():
+    handler, crides, allibera = _comptador()
+    handler_async = coalesced(handler)
+
+    async def prova():
+        tasques = await _dues_peticions(handler_async, {'source': 'metro_kpis', 'args': ()},
+                                        ['Nom_Barri', 'Població'], fmt="XLSX")
+        allibera.set()
+        return await asyncio.gather(*tasques)
+
+    assert asyncio.run(prova()) == [1, 1]
+    assert crides == [('metro_kpis', ('Nom_Barri', 'Població'), "XLSX")]
+
+
+def test_arguments_diferents_no_es_fusionen():
+    handler, crides, allibera = _comptador()
+    handler_async = coalesced(handler)
+
+    async def prova():
+        a = asyncio.ensure_future(handler_async({'source': 'a', 'args': ()}, ['x']))
+        b = asyncio.ensure_future(handler_async({'source': 'a', 'args': ()}, ['y']))
+        await asyncio.sleep(0.1)
+        allibera.set()
+        return await asyncio.gather(a, b)
+
+    asyncio.run(prova())
+    assert sorted(c[1] for c in crides) == [('x',), ('y',)]
+
+
+def test_arguments_no_hashables_s_executen_sense_fusionar():
+    crides = []
+
+    def handler(valors):
+        crides.append(1)
+        return float(valors.sum())
+
+    async def prova():
+        return await asyncio.gather(*(coalesced(handler)(np.arange(3)) for _ in range(2)))
+
+    assert asyncio.run(prova()) == [3.0, 3.0]
+    assert len(crides) == 2
@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+import pytest
+
+from dataset_store import (compare_periods, discover_files, latest_period_file, load_snapshot, periods,
+                           previous_period, register_dataset)
+
+
+def _llegeix(path):
+    return pd.read_csv(path)
+
+
+@pytest.fixture
+def vendes(tmp_path):
+    for nom, valors in [("vendes 2024_1er Semestre.csv", (10, 20)), ("vendes 2024_2on Semestre.csv", (15, 20)),
+                        ("vendes 2025_1er Semestre.csv", (30, 10)), ("altres.csv", (0, 0))]:
+        pd.DataFrame({'Línia': ['A', 'B'], 'Viatgers': valors}).to_csv(tmp_path / nom, index=False)
+    register_dataset('vendes', str(tmp_path), r'vendes (?P<any>\d{4})_(?P<semestre>[12])\D* Semestre\.csv$',
+                     _llegeix, ['Línia'], {'Viatgers': 'sum'})
+    return tmp_path
+
+
+def test_descobreix_els_periodes_pel_nom(vendes):
+    assert sorted(discover_files('vendes')) == ['2024-S1', '2024-S2', '2025-S1']
+    assert periods('vendes') == ['2024-S1', '2024-S2', '2025-S1']
+
+
+def test_periode_mes_recent(vendes):
+    periode, path = latest_period_file('vendes')
+    assert periode == '2025-S1'
+    assert path.endswith("vendes 2025_1er Semestre.csv")
+
+
+def test_sense_fitxers_retorna_el_valor_per_defecte(tmp_path):
+    register_dataset('buit', str(tmp_path), r'res (?P<any>\d{4})\.csv$', _llegeix, ['Línia'], {'Viatgers': 'sum'})
+    assert latest_period_file('buit', default="per_defecte.csv") == (None, "per_defecte.csv")
+
+
+def test_comparacio_i_periode_anterior(vendes):
+    assert previous_period('2025-S1', "Interanual") == '2024-S1'
+    assert previous_period('2025-S1', "Semestre anterior") == '2024-S2'
+    taula = compare_periods('vendes', ['2024-S1', '2025-S1'], 'Viatgers').set_index('Línia')
+    assert taula['Δ 2025-S1 vs 2024-S1'].to_dict() == {'A': 20, 'B': -10}
+    assert taula['Δ% 2025-S1 vs 2024-S1'].to_dict() == {'A': 200.0, 'B': -50.0}
+
+
+def test_una_nova_versio_del_fitxer_substitueix_la_instantania(vendes):
+    assert load_snapshot('vendes', '2025-S1')['Viatgers'].tolist() == [30, 10]
+    path = vendes / "vendes 2025_1er Semestre.csv"
+    pd.DataFrame({'Línia': ['A', 'B'], 'Viatgers': (31, 11)}).to_csv(path, index=False)
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2)
+    assert load_snapshot('vendes', '2025-S1')['Viatgers'].tolist() == [31, 11]
+
+
+def test_totals_de_linia_de_la_pestanya_demanda(acumulats_fmb):
+    from demanda_dashboard import FILE_FMB, PERIODO_DATOS, line_totals
+
+    totals = line_totals()
+    assert PERIODO_DATOS == periods('fmb')[-1]
+    # Mateixos totals que la columna ACUMULAT de l'Excel (que no detecta el funicular)
+    acumulats = acumulats_fmb(FILE_FMB)
+    assert acumulats
+    for linia, total in acumulats.items():
+        assert totals[linia] == pytest.approx(total, rel=1e-9)
+    assert 'FUNICULAR' in totals
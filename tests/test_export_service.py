@@ -0,0 +1,103 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export_service
+from export_service import export_table
+from paged_table import register_table_source, table_ref
+
+N_FILES = 95
+
+
+def _taula():
+    return pd.DataFrame({
+        'Nom': [f"Barri {i:02d}" for i in range(N_FILES)],
+        'Població': np.arange(N_FILES, dtype=np.int64) * 1000,
+        'Ràtio': [np.inf if i == 5 else i / 2 for i in range(N_FILES)],
+    })
+
+
+register_table_source('prova_export', _taula)
+REF = table_ref('prova_export')
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    # Blocs petits perquè cada exportació travessi diversos blocs
+    monkeypatch.setattr(export_service, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_service, "CHUNK_ROWS", 10)
+    return tmp_path
+
+
+def _llegeix(path, fmt):
+    if fmt == "XLSX":
+        return pd.read_excel(path)
+    if fmt == "Parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+@pytest.mark.parametrize("fmt", ["CSV", "CSV (gzip)", "XLSX", "Parquet"])
+def test_anada_i_tornada_per_format(fmt):
+    if fmt not in export_service.FORMATS:
+        pytest.skip("pyarrow no instal·lat")
+    path, estat = export_table(REF, fmt)
+    assert estat == f"Exportades {N_FILES} files i 3 columnes en format {fmt}."
+    esperat = _taula()
+    if fmt == "XLSX":
+        # XLSX no té infinit: la cel·la queda buida
+        esperat['Ràtio'] = esperat['Ràtio'].replace(np.inf, np.nan)
+    pd.testing.assert_frame_equal(_llegeix(path, fmt), esperat, check_dtype=False)
+
+
+def test_columnes_i_rang():
+    path, estat = export_table(REF, "CSV", ['Població', 'Nom'], 11, 35)
+    df = pd.read_csv(path)
+    assert list(df.columns) == ['Població', 'Nom']
+    assert df['Nom'].tolist() == [f"Barri {i:02d}" for i in range(10, 35)]
+    assert estat.startswith("Exportades 25 files i 2 columnes")
+
+    # El final es limita a l'última fila
+    path, _ = export_table(REF, "CSV", None, 90, 1000)
+    assert len(pd.read_csv(path)) == N_FILES - 89
+
+
+def test_rangs_no_valids_son_errors(export_dir):
+    path, estat = export_table(REF, "CSV", None, N_FILES + 1, None)
+    assert path is None
+    assert "posterior a l'última fila" in estat
+    path, estat = export_table(REF, "CSV", None, 20, 10)
+    assert path is None and "buit" in estat
+    path, estat = export_table(REF, "CSV", ['No existeix'])
+    assert path is None and "Columnes desconegudes" in estat
+    assert not [f for f in os.listdir(export_dir) if not f.endswith('.lock')]
+
+
+def test_segona_exportacio_igual_surt_de_la_cache():
+    path, _ = export_table(REF, "CSV", ['Nom'], 1, 10)
+    mtime = os.stat(path).st_mtime_ns
+    path_2, estat = export_table(REF, "CSV", ['Nom'], 1, 10)
+    assert path_2 == path
+    assert estat == "Exportació CSV servida des de la caché."
+    assert os.stat(path).st_mtime_ns >= mtime
+
+    path_3, _ = export_table(REF, "CSV", ['Nom'], 1, 11)
+    assert path_3 != path
+
+
+def test_esborra_les_exportacions_antigues_i_les_que_passen_de_mida(export_dir, monkeypatch):
+    antic, _ = export_table(REF, "CSV", ['Nom'])
+    fa_dos_dies = time.time() - 2 * 24 * 3600
+    os.utime(antic, (fa_dos_dies, fa_dos_dies))
+    nou, _ = export_table(REF, "CSV", ['Població'])
+    assert not os.path.exists(antic)
+    assert os.path.exists(nou)
+
+    # Amb un límit de mida per sota de dos fitxers, només queda el més recent
+    monkeypatch.setattr(export_service, "EXPORT_MAX_BYTES", os.path.getsize(nou) + 1)
+    recent, _ = export_table(REF, "CSV (gzip)", ['Població'])
+    assert os.path.exists(recent)
+    assert not os.path.exists(nou)
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from forecast import (MIN_MESOS, calendar_days, festius, fit_models, line_month_table, parse_fmb_monthly,
+                      predict)
+
+ANY = 2025
+
+
+def _sintetiques(a, b, w, mascara):
+    """Matrius M i D que segueixen exactament el model, amb NaN on 'mascara' és False."""
+    t = np.arange(mascara.shape[1])
+    feiners, no_feiners = calendar_days(ANY, t)
+    D = np.exp(a[:, None] + b[:, None] * t)
+    M = D * (feiners + w[:, None] * no_feiners)
+    return np.where(mascara, M, np.nan), np.where(mascara, D, np.nan)
+
+
+def test_calendari_laboral_2025():
+    feiners, no_feiners = calendar_days(ANY, np.arange(6))
+    assert feiners.tolist() == [21, 20, 21, 20, 21, 19]
+    assert (feiners + no_feiners).tolist() == [31, 28, 31, 30, 31, 30]
+    # Divendres Sant i Dilluns de Pasqua de 2025
+    assert np.datetime64('2025-04-18') in festius(ANY) and np.datetime64('2025-04-21') in festius(ANY)
+
+
+def test_calendari_continua_a_l_any_seguent():
+    feiners, no_feiners = calendar_days(ANY, np.array([12]))
+    assert (feiners + no_feiners).tolist() == [31]
+    assert feiners.tolist() == [20]  # gener de 2026: 22 dies laborables menys l'1 i el 6
+
+
+def test_ajust_amb_mascara_recupera_els_parametres():
+    a = np.array([13.0, 11.5, 9.0, 12.0])
+    b = np.array([0.02, -0.01, 0.0, 0.05])
+    w = np.array([0.6, 0.4, 0.9, 0.5])
+    mascara = np.ones((4, 12), dtype=bool)
+    mascara[:, 6:] = False          # semestre publicat
+    mascara[0, 2] = False           # un mes sense dada enmig
+    mascara[1, :3] = False          # línia nova a partir de l'abril
+    M, D = _sintetiques(a, b, w, mascara)
+
+    params = fit_models(M, D, ANY)
+
+    np.testing.assert_allclose(params['a'], a, atol=1e-9)
+    np.testing.assert_allclose(params['b'], b, atol=1e-9)
+    np.testing.assert_allclose(params['w'], w, atol=1e-9)
+    np.testing.assert_allclose(params['sigma'], 0, atol=1e-9)
+    assert params['n'].tolist() == [5, 3, 6, 6]
+    assert params['ultim_mes'] == 5
+    assert params['actiu'].all()
+
+
+def test_ajust_amb_soroll_igual_que_minims_quadrats_per_linia():
+    rng = np.random.default_rng(7)
+    L, T = 30, 12
+    mascara = rng.random((L, T)) > 0.3
+    D = np.exp(10 + rng.normal(0, 0.05, (L, T)) + 0.01 * np.arange(T))
+    M = D * 25
+    M[~mascara] = np.nan
+
+    params = fit_models(M, D, ANY)
+
+    for l in range(L):
+        t = np.flatnonzero(np.isfinite(M[l]))
+        if len(t) < 2:
+            continue
+        b, a = np.polyfit(t, np.log(D[l, t]), 1)
+        assert params['a'][l] == pytest.approx(a, abs=1e-9)
+        assert params['b'][l] == pytest.approx(b, abs=1e-9)
+        if len(t) > 2:
+            residus = np.log(D[l, t]) - (a + b * t)
+            assert params['sigma'][l] == pytest.approx(np.sqrt((residus ** 2).sum() / (len(t) - 2)))
+
+
+def test_linies_sense_prou_dades_o_sense_servei_no_son_actives():
+    a, b, w = np.full(3, 10.0), np.zeros(3), np.full(3, 0.5)
+    mascara = np.zeros((3, 12), dtype=bool)
+    mascara[0, :6] = True
+    mascara[1, 4:6] = True              # només 2 mesos
+    mascara[2, :4] = True               # sense servei l'últim mes
+    M, D = _sintetiques(a, b, w, mascara)
+
+    params = fit_models(M, D, ANY)
+
+    assert MIN_MESOS == 3
+    assert params['actiu'].tolist() == [True, False, False]
+
+
+def test_sense_cap_mes_observat_no_hi_ha_linies_actives():
+    M = D = np.full((3, 12), np.nan)
+
+    params = fit_models(M, D, ANY)
+
+    assert params['ultim_mes'] == -1
+    assert params['actiu'].tolist() == [False, False, False]
+
+
+def test_prediccio_i_intervals():
+    rng = np.random.default_rng(1)
+    mascara = np.zeros((2, 12), dtype=bool)
+    mascara[:, :6] = True
+    M, D = _sintetiques(np.array([12.0, 10.0]), np.array([0.01, 0.0]), np.array([0.5, 0.7]), mascara)
+    M = M * rng.uniform(0.97, 1.03, M.shape)
+    D = D * rng.uniform(0.97, 1.03, D.shape)
+
+    mesos, previsio, minim, maxim, diari = predict(fit_models(M, D, ANY), horitzo=6)
+
+    assert mesos.tolist() == [6, 7, 8, 9, 10, 11]
+    assert previsio.shape == minim.shape == maxim.shape == diari.shape == (2, 6)
+    assert (minim < previsio).all() and (previsio < maxim).all()
+    # L'interval s'eixampla com més lluny de les dades
+    amplada = maxim / minim
+    assert (np.diff(amplada, axis=1) > 0).all()
+
+
+def test_els_mesos_sumen_el_total_acumulat_del_semestre(acumulats_fmb):
+    from demanda_dashboard import FILE_FMB
+
+    noms, M, D = parse_fmb_monthly(FILE_FMB)
+    mensuals = dict(zip(noms, np.nansum(M, axis=1)))
+    acumulats = acumulats_fmb(FILE_FMB)
+
+    assert acumulats
+    for linia, total in acumulats.items():
+        assert mensuals[linia] == pytest.approx(total, rel=1e-9), linia
+    # Només hi ha dades del primer semestre
+    assert np.isnan(M[:, 6:]).all()
+    assert np.isfinite(M[:, :6]).any(axis=1).all()
+
+
+def test_format_llarg_nomes_te_els_mesos_amb_dades():
+    M = np.array([[1.0, np.nan, 3.0], [np.nan, np.nan, 5.0]])
+    taula = line_month_table(['A', 'B'], M, M / 10)
+    assert taula['Línia'].tolist() == ['A', 'A', 'B']
+    assert taula['Mes'].tolist() == [1, 3, 3]
+    assert taula['Viatgers_dia_feiner'].tolist() == [0.1, 0.3, 0.5]
@@ -0,0 +1,108 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from paged_table import (fetch_page, fetch_page_async, parse_filters, register_table_source, reset_page_async,
+                         table_ref)
+
+N_FILES = 60
+
+
+def _taula():
+    return pd.DataFrame({
+        'Nom': [f"Barri {i:02d}" for i in range(N_FILES)],
+        'Districte': ['Eixample' if i % 3 == 0 else 'Gràcia' for i in range(N_FILES)],
+        'Població': np.arange(N_FILES) * 1000,
+        'Ràtio': [np.inf if i == 5 else float(i) for i in range(N_FILES)],
+    })
+
+
+register_table_source('prova', _taula)
+REF = table_ref('prova')
+
+
+def test_primera_pagina_i_informacio():
+    visible, page, info = fetch_page(REF, page_size=25)
+    assert page == 1
+    assert visible['Nom'].tolist() == [f"Barri {i:02d}" for i in range(25)]
+    assert info == "Files 1–25 de 60 · pàgina 1/3"
+
+
+def test_ultima_pagina_parcial_i_pagina_fora_de_rang():
+    visible, page, info = fetch_page(REF, page=99, page_size=25)
+    assert page == 3
+    assert len(visible) == 10
+    assert info.startswith("Files 51–60 de 60")
+    assert fetch_page(REF, page=0, page_size=25)[1] == 1
+
+
+def test_ordre_descendent_i_ascendent():
+    visible, _, _ = fetch_page(REF, sort_col='Població', order="Descendent", page_size=5)
+    assert visible['Població'].tolist() == [59000, 58000, 57000, 56000, 55000]
+    visible, _, _ = fetch_page(REF, page=2, sort_col='Població', order="Ascendent", page_size=5)
+    assert visible['Població'].tolist() == [5000, 6000, 7000, 8000, 9000]
+
+
+def test_filtres_numerics_i_de_text_combinats():
+    visible, page, info = fetch_page(REF, filters_text="districte ~ EIXAM; Població >= 30000", page_size=100)
+    esperat = [i * 1000 for i in range(30, N_FILES) if i % 3 == 0]
+    assert visible['Població'].tolist() == esperat
+    assert info == f"Files 1–{len(esperat)} de {len(esperat)} (filtrades de 60) · pàgina 1/1"
+
+
+def test_filtre_sense_resultats():
+    visible, page, info = fetch_page(REF, filters_text="Població > 1e9")
+    assert visible.empty and page == 1
+    assert info.startswith("Files 0–0 de 0")
+
+
+def test_paginacio_sobre_el_resultat_filtrat():
+    visible, page, _ = fetch_page(REF, page=2, sort_col='Població', order="Ascendent",
+                                  filters_text="Districte = gràcia", page_size=10)
+    esperat = [i * 1000 for i in range(N_FILES) if i % 3 != 0][10:20]
+    assert page == 2
+    assert visible['Població'].tolist() == esperat
+
+
+def test_infinit_es_mostra_buit():
+    visible, _, _ = fetch_page(REF, filters_text="Nom = barri 05")
+    assert np.isnan(visible['Ràtio'].iloc[0])
+
+
+@pytest.mark.parametrize("filtre", ["Columna = 3", "Població > deu", "Població 3"])
+def test_filtres_no_valids_retornen_error(filtre):
+    visible, page, info = fetch_page(REF, filters_text=filtre)
+    assert visible.empty and page == 1
+    assert info.startswith("**Error:**")
+
+
+def test_parse_filters_ignora_majuscules_i_parts_buides():
+    assert parse_filters("població>=10; ;nom~b", ['Nom', 'Població']) == (
+        ('Població', '>=', '10'), ('Nom', '~', 'b'))
+
+
+def test_sense_referencia():
+    visible, page, info = fetch_page(None)
+    assert visible.empty and page == 1 and info == ""
+
+
+def test_taula_de_kpis_de_metro():
+    from cobertura_dashboard import metro_kpi_table
+
+    visible, _, info = fetch_page(table_ref('metro_kpis'), sort_col='Nom_Barri', order="Ascendent",
+                                  filters_text="Nom_Districte ~ eixample")
+    assert len(visible) == 6
+    assert visible['Nom_Barri'].is_monotonic_increasing
+    assert info.endswith("(filtrades de 73) · pàgina 1/1")
+    assert len(metro_kpi_table()) == 73
+
+
+def test_reset_page_i_punts_async():
+    visible, page, info, columnes, filtre = asyncio.run(reset_page_async(REF, 10))
+    assert (len(visible), page, filtre) == (10, 1, "")
+    assert columnes['choices'] == ['Nom', 'Districte', 'Població', 'Ràtio']
+
+    visible, page, _ = asyncio.run(fetch_page_async(REF, 2, 'Població', "Ascendent", "", 10))
+    assert page == 2 and visible['Població'].tolist()[0] == 10000
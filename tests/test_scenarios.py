@@ -0,0 +1,151 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cobertura_dashboard import coverage_kpis
+from scenarios import (apply_change, build_baseline, changes_table, district_table, fork_scenario,
+                       new_scenario, scenario_delta, top_pressure, top_without_stops)
+
+COLS = ('Nombre_Estacions', 'Poblacio_per_Estacio', 'Estacions_per_km2')
+N_BARRIS = 40
+
+
+def _poblacio(rng):
+    return pd.DataFrame({
+        'ID_Barri': np.arange(1, N_BARRIS + 1, dtype=np.int16),
+        'Nom_Districte': [f"Districte {i % 6}" for i in range(N_BARRIS)],
+        'Nom_Barri': [f"Barri {i:02d}" for i in range(N_BARRIS)],
+        'Població': rng.choice(np.arange(5_000, 60_000), N_BARRIS, replace=False),
+        'Superfície (ha)': rng.uniform(20, 500, N_BARRIS).round(1),
+    })
+
+
+def _recalcul_complet(poblacio, recomptes):
+    """Referència: KPIs recalculats des de zero, com fa l'anàlisi de metro."""
+    recompte = pd.Series(recomptes, index=poblacio['ID_Barri'], name=COLS[0])
+    return coverage_kpis(poblacio, recompte[recompte > 0], COLS[1], COLS[2])
+
+
+def _comprova_top(taula, referencia, clau):
+    # Els valors del rànquing han de coincidir en ordre; entre empats l'ordre és lliure
+    assert taula[clau].tolist() == referencia[clau].tolist()
+    llindar = referencia[clau].iloc[-1] if len(referencia) else None
+    noms = lambda df: set(df.loc[df[clau] != llindar, 'Nom_Barri'])
+    assert noms(taula) == noms(referencia)
+
+
+def _comprova_escenari(base, escenari, poblacio, recomptes):
+    df = _recalcul_complet(poblacio, recomptes)
+    ref_pressio = df[np.isfinite(df[COLS[1]])].sort_values(COLS[1], ascending=False).head(10)
+    ref_sense = df[df[COLS[0]] == 0].sort_values('Població', ascending=False).head(10)
+    _comprova_top(top_pressure(base, escenari), ref_pressio, COLS[1])
+    _comprova_top(top_without_stops(base, escenari), ref_sense, 'Població')
+
+    districtes = district_table(base, escenari).set_index('Nom_Districte')
+    ref = df.groupby('Nom_Districte').agg(poblacio=('Població', 'sum'), recompte=(COLS[0], 'sum'))
+    assert districtes[COLS[0]].tolist() == ref['recompte'].tolist()
+    with np.errstate(divide='ignore'):
+        esperat = np.where(ref['recompte'] > 0, np.round(ref['poblacio'] / ref['recompte']), np.nan)
+    np.testing.assert_array_equal(districtes[COLS[1]].to_numpy(), esperat)
+
+    canvis = changes_table(base, escenari)
+    modificats = df.set_index('Nom_Barri').loc[canvis['Nom_Barri']] if len(canvis) else df.iloc[:0]
+    assert canvis.get(COLS[0], pd.Series(dtype=int)).tolist() == modificats[COLS[0]].tolist()
+    np.testing.assert_array_equal(canvis.get(COLS[1], pd.Series(dtype=float)).to_numpy(),
+                                  modificats[COLS[1]].replace(np.inf, np.nan).to_numpy())
+
+
+@pytest.mark.parametrize("llavor", range(20))
+def test_recalcul_incremental_igual_que_el_complet(llavor):
+    rng = np.random.default_rng(llavor)
+    poblacio = _poblacio(rng)
+    recomptes = rng.choice([0, 0, 0, 1, 2, 3, 5], N_BARRIS)
+    base = build_baseline(_recalcul_complet(poblacio, recomptes), *COLS)
+    noms = poblacio['Nom_Barri'].tolist()
+
+    # Diversos escenaris que es bifurquen entre ells (còpia en escriptura)
+    escenaris = [(new_scenario(), recomptes.copy())]
+    for _ in range(60):
+        idx = rng.integers(len(escenaris))
+        escenari, actuals = escenaris[idx]
+        if rng.random() < 0.15 and len(escenaris) < 5:
+            escenaris.append((fork_scenario(escenari), actuals.copy()))
+            continue
+        i = int(rng.integers(N_BARRIS))
+        delta = int(rng.integers(-3, 4))
+        if actuals[i] + delta < 0:
+            with pytest.raises(ValueError):
+                apply_change(base, escenari, noms[i], delta)
+            continue
+        nou = apply_change(base, escenari, noms[i], delta)
+        nous = actuals.copy()
+        nous[i] += delta
+        escenaris[idx] = (nou, nous)
+        _comprova_escenari(base, nou, poblacio, nous)
+        assert scenario_delta(base, nou) == int((nous - recomptes).sum())
+
+    # Cap canvi ha modificat l'escenari original ni la resta d'escenaris
+    for escenari, actuals in escenaris:
+        _comprova_escenari(base, escenari, poblacio, actuals)
+
+
+def test_tornar_al_valor_base_elimina_la_fila():
+    rng = np.random.default_rng(0)
+    poblacio = _poblacio(rng)
+    base = build_baseline(_recalcul_complet(poblacio, np.ones(N_BARRIS, dtype=int)), *COLS)
+    escenari = apply_change(base, new_scenario(), "Barri 03", 2)
+    escenari = apply_change(base, escenari, "Barri 03", -2)
+    assert escenari == new_scenario()
+
+
+def test_barri_desconegut():
+    rng = np.random.default_rng(0)
+    base = build_baseline(_recalcul_complet(_poblacio(rng), np.ones(N_BARRIS, dtype=int)), *COLS)
+    with pytest.raises(ValueError, match="Barri desconegut"):
+        apply_change(base, new_scenario(), "No existeix", 1)
+
+
+def test_taules_sense_infinits():
+    # Un barri i un districte sense parades: la ràtio queda buida (NaN), no 'inf'
+    rng = np.random.default_rng(0)
+    poblacio = _poblacio(rng)
+    recomptes = np.where(poblacio['Nom_Districte'] == "Districte 0", 0, 1)
+    base = build_baseline(_recalcul_complet(poblacio, recomptes), *COLS)
+    escenari = apply_change(base, new_scenario(), "Barri 01", -1)
+
+    for taula in (district_table(base, escenari), changes_table(base, escenari)):
+        valors = taula.select_dtypes('number').to_numpy(dtype=float)
+        assert not np.isinf(valors).any()
+        assert taula[COLS[1]].isna().any()
+        json.dumps(taula.astype(object).where(taula.notna(), None).to_dict('records'))
+
+
+def test_limit_d_escenaris_per_sessio():
+    import cobertura_dashboard as cob
+
+    sessio = cob.start_scenarios()[0]
+    for i in range(2, cob.MAX_ESCENARIS + 1):
+        sessio, *_, estat = cob.create_scenario(sessio, f"Prova {i}")
+        assert not estat.startswith("Error"), estat
+    assert len(sessio['escenaris']) == cob.MAX_ESCENARIS
+
+    resultat = cob.create_scenario(sessio, "Un de més")
+    assert resultat[0] is sessio
+    assert resultat[-1] == f"Error: Com a màxim hi pot haver {cob.MAX_ESCENARIS} escenaris per sessió"
+
+    # En eliminar-ne un, se'n pot tornar a crear
+    sessio = cob.delete_scenario(sessio)[0]
+    assert not cob.create_empty_scenario(sessio, "Un de més")[-1].startswith("Error")
+
+
+def test_sessio_d_una_altra_versio_de_les_dades():
+    import cobertura_dashboard as cob
+
+    sessio = cob.start_scenarios()[0]
+    antiga = {**sessio, 'versio': (('altre fitxer', 0, 0),)}
+    assert cob.add_stations(antiga, "el Raval", 1)[-1].startswith("Error: Les dades reals han canviat")
+    nova = cob.start_scenarios(antiga)
+    assert nova[0]['versio'] == sessio['versio']
+    assert "restablerts" in nova[-2]